@@ -1,69 +1,31 @@
 from database import get_db_connection, dict_from_row, json_dumps
 from auth import verify_token
+from media_store import save_image_from_base64, is_inline_image
+from upload_sessions import finalize_upload
+from image_derivatives import get_image_variants, schedule_derivatives
+from catalog_events import publish, ARTWORK, CREATED, UPDATED, DELETED
 import json
 import os
-import base64
-import time
 from decimal import Decimal
 
-# Create the uploads directory if it doesn't exist
-def ensure_uploads_directory():
-    """Create the uploads directory if it doesn't exist"""
-    uploads_dir = os.path.join(os.path.dirname(__file__), "static", "uploads")
-    if not os.path.exists(uploads_dir):
-        os.makedirs(uploads_dir)
-        print(f"Created directory: {uploads_dir}")
+# Image used when an uploaded image cannot be decoded
+PLACEHOLDER_IMAGE = "/static/uploads/placeholder.jpg"
 
-# Call this function to ensure directory exists
-ensure_uploads_directory()
-
-# Function to handle image storage
-def save_image_from_base64(base64_str, name_prefix="artwork"):
-    """Save a base64 image to the uploads directory and return the path"""
-    if not base64_str:
-        return None
-        
-    # If it's already a URL path (not base64), return it as is
-    if base64_str.startswith('/static/'):
-        return base64_str
-    
-    try:
-        # Extract the image data from the base64 string
-        if "," in base64_str:
-            # For format like "data:image/jpeg;base64,/9j/4AAQSk..."
-            image_format, base64_data = base64_str.split(",", 1)
-            if ';base64' not in image_format:
-                print("Warning: Not a valid base64 image format")
-                return None
-        else:
-            # Assume it's just the base64 data
-            base64_data = base64_str
-        
-        try:
-            # Decode the base64 data
-            image_data = base64.b64decode(base64_data)
-        except Exception as e:
-            print(f"Failed to decode base64 data: {e}")
-            return "/static/uploads/placeholder.jpg"
-        
-        # Generate a unique filename based on timestamp
-        timestamp = time.strftime("%Y%m%d%H%M%S")
-        filename = f"{name_prefix}_{timestamp}.jpg"
-        
-        # Save to the uploads directory
-        uploads_dir = os.path.join(os.path.dirname(__file__), "static", "uploads")
-        if not os.path.exists(uploads_dir):
-            os.makedirs(uploads_dir)
-            
-        file_path = os.path.join(uploads_dir, filename)
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-        
-        # Return the URL path to the image (ALWAYS use the standard format)
-        return f"/static/uploads/{filename}"
-    except Exception as e:
-        print(f"Error saving image: {e}")
-        return None
+def format_artwork(artwork):
+    """Shape an artworks row the way the API returns it"""
+    # Convert id to string to match frontend expectations
+    artwork['id'] = str(artwork['id'])
+    
+    # Format image URL if needed - ALWAYS ensure it has the correct prefix.
+    # Inline base64 images are passed through as they are; migrate_images.py
+    # moves them to files, so reads never write.
+    if artwork['image_url'] and not is_inline_image(artwork['image_url']):
+        if not artwork['image_url'].startswith('/static/'):
+            artwork['image_url'] = f"/static/uploads/{os.path.basename(artwork['image_url'])}"
+    
+    # Resized WebP variants and blur placeholder, once generated
+    artwork['image_variants'] = get_image_variants(artwork['image_url'])
+    return artwork
 
 def get_all_artworks():
     connection = get_db_connection()
@@ -75,7 +37,7 @@ def get_all_artworks():
     try:
         query = """
         SELECT id, title, artist, description, price, image_url, 
-               dimensions, medium, year, status
+               dimensions, medium, year, status, artist_id
         FROM artworks
         ORDER BY created_at DESC
         """
@@ -84,29 +46,7 @@ def get_all_artworks():
         
         artworks = []
         for row in rows:
-            artwork = dict_from_row(row, cursor)
-            
-            # Convert id to string to match frontend expectations
-            artwork['id'] = str(artwork['id'])
-            
-            # Format image URL if needed - ALWAYS ensure it has the correct prefix
-            if artwork['image_url']:
-                # Handle base64 images
-                if artwork['image_url'].startswith('data:') or 'base64' in artwork['image_url']:
-                    # Save the base64 image to a file and get its path
-                    saved_path = save_image_from_base64(artwork['image_url'])
-                    if saved_path:
-                        # Update the database with the new path
-                        update_artwork_image(artwork['id'], saved_path)
-                        artwork['image_url'] = saved_path
-                        print(f"Converted base64 image to file: {saved_path}")
-                elif not artwork['image_url'].startswith('/static/'):
-                    artwork['image_url'] = f"/static/uploads/{os.path.basename(artwork['image_url'])}"
-                
-                # Log the final image URL for debugging
-                print(f"Final image URL for {artwork['title']}: {artwork['image_url']}")
-                
-            artworks.append(artwork)
+            artworks.append(format_artwork(dict_from_row(row, cursor)))
         
         return {"artworks": artworks}
     except Exception as e:
@@ -117,31 +57,44 @@ def get_all_artworks():
             cursor.close()
             connection.close()
 
-def update_artwork_image(artwork_id, image_path):
+def get_artwork(artwork_id):
     connection = get_db_connection()
     if connection is None:
-        return False
+        return {"error": "Database connection failed"}
     
     cursor = connection.cursor()
     
     try:
         query = """
-        UPDATE artworks
-        SET image_url = %s
+        SELECT id, title, artist, description, price, image_url, 
+               dimensions, medium, year, status, artist_id
+        FROM artworks
         WHERE id = %s
         """
-        cursor.execute(query, (image_path, artwork_id))
-        connection.commit()
-        return True
+        cursor.execute(query, (artwork_id,))
+        row = cursor.fetchone()
+        
+        if not row:
+            return {"error": "Artwork not found"}
+        
+        return format_artwork(dict_from_row(row, cursor))
     except Exception as e:
-        print(f"Error updating artwork image: {e}")
-        return False
+        print(f"Error getting artwork: {e}")
+        return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-def get_artwork(artwork_id):
+def get_artworks_by_ids(artwork_ids):
+    """Get several artworks in one query, in the order of artwork_ids
+
+    Ids that no longer exist are skipped.
+    """
+    artwork_ids = [int(artwork_id) for artwork_id in artwork_ids]
+    if not artwork_ids:
+        return {"artworks": []}
+    
     connection = get_db_connection()
     if connection is None:
         return {"error": "Database connection failed"}
@@ -149,39 +102,21 @@ def get_artwork(artwork_id):
     cursor = connection.cursor()
     
     try:
-        query = """
+        placeholders = ", ".join(["%s"] * len(artwork_ids))
+        query = f"""
         SELECT id, title, artist, description, price, image_url, 
-               dimensions, medium, year, status
+               dimensions, medium, year, status, artist_id
         FROM artworks
-        WHERE id = %s
+        WHERE id IN ({placeholders})
         """
-        cursor.execute(query, (artwork_id,))
-        row = cursor.fetchone()
+        cursor.execute(query, artwork_ids)
+        by_id = {row[0]: row for row in cursor.fetchall()}
         
-        if not row:
-            return {"error": "Artwork not found"}
-        
-        artwork = dict_from_row(row, cursor)
-        # Convert id to string to match frontend expectations
-        artwork['id'] = str(artwork['id'])
-        
-        # Format image URL if needed
-        if artwork['image_url']:
-            # Handle base64 images
-            if artwork['image_url'].startswith('data:') or artwork['image_url'].startswith('base64,'):
-                # Save the base64 image to a file and get the file path
-                saved_path = save_image_from_base64(artwork['image_url'])
-                if saved_path:
-                    # Update the database with the new path
-                    update_artwork_image(artwork['id'], saved_path)
-                    artwork['image_url'] = saved_path
-                    print(f"Converted base64 image to file: {saved_path}")
-            elif not artwork['image_url'].startswith('/static/'):
-                artwork['image_url'] = f"/static/uploads/{os.path.basename(artwork['image_url'])}"
-        
-        return artwork
+        artworks = [format_artwork(dict_from_row(by_id[artwork_id], cursor))
+                    for artwork_id in artwork_ids if artwork_id in by_id]
+        return {"artworks": artworks}
     except Exception as e:
-        print(f"Error getting artwork: {e}")
+        print(f"Error getting artworks by id: {e}")
         return {"error": str(e)}
     finally:
         if connection.is_connected():
@@ -249,9 +184,15 @@ def create_artwork(auth_header, artwork_data):
         
         # Handle the image - convert base64 to file if needed
         image_url = artwork_data.get("imageUrl")
-        if image_url and (image_url.startswith('data:') or image_url.startswith('base64,')):
+        if artwork_data.get("uploadId"):
+            # Image sent through a resumable upload; finalize it if the client hasn't
+            upload = finalize_upload(artwork_data["uploadId"], payload.get("sub"), is_admin)
+            if "error" in upload:
+                return {"error": upload["error"]}
+            image_url = upload["url"]
+        elif image_url and (image_url.startswith('data:') or image_url.startswith('base64,')):
             # Save the image and get the file path
-            saved_image_path = save_image_from_base64(image_url)
+            saved_image_path = save_image_from_base64(image_url, PLACEHOLDER_IMAGE)
             if saved_image_path:
                 image_url = saved_image_path
                 print(f"Image saved to: {saved_image_path}")
@@ -286,10 +227,16 @@ def create_artwork(auth_header, artwork_data):
         ))
         connection.commit()
         
+        # Resize off the request path so the first catalog view has the variants
+        schedule_derivatives(image_url)
+        
         # Return the newly created artwork
         new_artwork_id = cursor.lastrowid
         print(f"Artwork created successfully with ID: {new_artwork_id}")
-        return get_artwork(new_artwork_id)
+        artwork = get_artwork(new_artwork_id)
+        if "error" not in artwork:
+            publish(ARTWORK, CREATED, new_artwork_id, artwork)
+        return artwork
     except Exception as e:
         print(f"ERROR creating artwork: {e}")
         return {"error": str(e)}
@@ -350,9 +297,15 @@ def update_artwork(auth_header, artwork_id, artwork_data):
             
         # Handle the image - convert base64 to file if needed
         image_url = artwork_data.get("imageUrl")
-        if image_url and (image_url.startswith('data:') or image_url.startswith('base64,')):
+        if artwork_data.get("uploadId"):
+            # Image sent through a resumable upload; finalize it if the client hasn't
+            upload = finalize_upload(artwork_data["uploadId"], payload.get("sub"), is_admin)
+            if "error" in upload:
+                return {"error": upload["error"]}
+            image_url = upload["url"]
+        elif image_url and (image_url.startswith('data:') or image_url.startswith('base64,')):
             # Save the image and get the file path
-            saved_image_path = save_image_from_base64(image_url)
+            saved_image_path = save_image_from_base64(image_url, PLACEHOLDER_IMAGE)
             if saved_image_path:
                 image_url = saved_image_path
                 print(f"Image saved to: {saved_image_path}")
@@ -390,8 +343,13 @@ def update_artwork(auth_header, artwork_id, artwork_data):
         if cursor.rowcount == 0:
             return {"error": "Artwork not found"}
         
+        schedule_derivatives(image_url)
+        
         # Return the updated artwork
-        return get_artwork(artwork_id)
+        artwork = get_artwork(artwork_id)
+        if "error" not in artwork:
+            publish(ARTWORK, UPDATED, artwork_id, artwork)
+        return artwork
     except Exception as e:
         print(f"Error updating artwork: {e}")
         return {"error": str(e)}
@@ -456,6 +414,7 @@ def delete_artwork(auth_header, artwork_id):
         if cursor.rowcount == 0:
             return {"error": "Artwork not found"}
         
+        publish(ARTWORK, DELETED, artwork_id)
         return {"success": True, "message": "Artwork deleted successfully"}
     except Exception as e:
         print(f"Error deleting artwork: {e}")
@@ -0,0 +1,73 @@
+try:
+    import numpy as np
+except ImportError:
+    # recommendations.py and similar_artworks.py warn and disable themselves
+    np = None
+
+# Contribution of each attribute to the similarity of two artworks
+ATTRIBUTE_WEIGHTS = {
+    "artist": 0.4,
+    "medium": 0.2,
+    "price": 0.15,
+    "year": 0.1,
+}
+
+# Upper edges (KES) of the price bands; adjacent bands count half
+PRICE_BANDS = (5000, 10000, 25000, 50000, 100000, 250000, 500000)
+
+# Years apart at which year similarity has dropped to 1/e
+YEAR_SCALE = 10.0
+
+def price_band(price):
+    price = float(price or 0)
+    for band, edge in enumerate(PRICE_BANDS):
+        if price <= edge:
+            return band
+    return len(PRICE_BANDS)
+
+def encode_attributes(artwork, artists, mediums):
+    """(artist code, medium code, price band, year) of an artwork row or API record
+
+    artists and mediums map keys to codes; unseen keys are added. Artists
+    without an account are told apart by name. A missing medium is -1 and a
+    missing year 0, which match nothing.
+    """
+    artist_id = artwork.get("artist_id")
+    artist = artist_id if artist_id is not None else (artwork.get("artist") or "").strip().lower()
+    medium = (artwork.get("medium") or "").strip().lower()
+    return (
+        artists.setdefault(artist, len(artists)),
+        mediums.setdefault(medium, len(mediums)) if medium else -1,
+        price_band(artwork.get("price")),
+        artwork.get("year") or 0,
+    )
+
+def attribute_arrays(encoded):
+    """Columns (artist, medium, band, year) as arrays from encode_attributes tuples"""
+    columns = list(zip(*encoded)) or [(), (), (), ()]
+    return (
+        np.array(columns[0], dtype=np.int32),
+        np.array(columns[1], dtype=np.int32),
+        np.array(columns[2], dtype=np.int32),
+        np.array(columns[3], dtype=np.float32),
+    )
+
+def attribute_similarity(a, b):
+    """Similarity of artworks a and b from their (artist, medium, band, year)
+
+    a and b are attribute columns that broadcast against each other: one
+    artwork against the catalog, or a block of rows against every column.
+    """
+    weights = ATTRIBUTE_WEIGHTS
+    artist_a, medium_a, band_a, year_a = (np.asarray(column) for column in a)
+    artist_b, medium_b, band_b, year_b = (np.asarray(column) for column in b)
+
+    sims = weights["artist"] * (artist_a == artist_b).astype(np.float32)
+    sims += weights["medium"] * ((medium_a == medium_b) & (medium_a >= 0))
+
+    band_gap = np.abs(band_a - band_b)
+    sims += weights["price"] * np.where(band_gap == 0, 1.0, np.where(band_gap == 1, 0.5, 0.0)).astype(np.float32)
+
+    year_sims = np.exp(-np.abs(year_a - year_b) / YEAR_SCALE)
+    sims += weights["year"] * np.where((year_a > 0) & (year_b > 0), year_sims, 0.0).astype(np.float32)
+    return sims
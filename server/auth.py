@@ -7,6 +7,7 @@ import datetime
 import os
 from decimal import Decimal
 from middleware import SECRET_KEY  # Import the shared SECRET_KEY
+from catalog_events import publish, ARTIST, CREATED
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -225,6 +226,7 @@ def register_artist(name, email, password, phone, bio=""):
         
         # Get the new artist ID
         artist_id = cursor.lastrowid
+        publish(ARTIST, CREATED, artist_id, {"id": str(artist_id), "name": name})
         
         # Generate token for the new artist
         token = generate_token(artist_id, name, False, True)
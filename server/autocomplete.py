@@ -0,0 +1,234 @@
+import re
+import json
+import heapq
+import bisect
+import argparse
+import threading
+import unicodedata
+from database import get_db_connection
+from catalog_index import CatalogIndex
+import catalog_events
+
+# Kinds of suggestion
+TITLE = "title"
+ARTIST = "artist"
+MEDIUM = "medium"
+
+# Popularity of a suggestion: its artworks plus its completed orders, which
+# count for more
+ARTWORK_POPULARITY = 1
+ORDER_POPULARITY = 3
+
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+
+# Every key matching a prefix is ranked. Prefixes up to this long match most
+# of the catalog, so their rankings are cached until a suggestion under them
+# changes.
+CACHED_PREFIX_LENGTH = 2
+
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+# Every structure below is changed in place under _index_lock
+_index_lock = threading.Lock()
+# (kind, normalized text) -> {"text", "type", "artworks", "orders", "registered"}
+_suggestions = {}
+# Sorted (key, kind, normalized text): every suggestion under its full text and
+# under each later word, so "oka" finds "Amara Okafor"
+_entries = []
+# artwork id -> (title, artist, medium, order points) as counted, to undo on
+# update or delete
+_artworks = {}
+# (short prefix, kind or None) -> the MAX_SUGGESTIONS best suggestions
+_prefix_cache = {}
+
+def normalize(text):
+    """Lowercase words of a text without accents, joined by single spaces"""
+    text = unicodedata.normalize("NFKD", str(text or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_SEPARATORS.sub(" ", text).split())
+
+def _keys(normalized):
+    words = normalized.split(" ")
+    return {" ".join(words[i:]) for i in range(len(words))}
+
+def _adjust(kind, text, artworks=0, orders=0, registered=False):
+    # Caller holds _index_lock
+    normalized = normalize(text)
+    if not normalized:
+        return
+    suggestion = _suggestions.get((kind, normalized))
+    if suggestion is None and artworks <= 0 and not registered:
+        return
+
+    # Rankings of the short prefixes this suggestion is listed under are stale
+    for key in _keys(normalized):
+        for length in range(1, CACHED_PREFIX_LENGTH + 1):
+            _prefix_cache.pop((key[:length], None), None)
+            _prefix_cache.pop((key[:length], kind), None)
+
+    if suggestion is None:
+        suggestion = _suggestions[(kind, normalized)] = {
+            "text": str(text).strip(), "type": kind, "artworks": 0, "orders": 0, "registered": False}
+        for key in _keys(normalized):
+            bisect.insort(_entries, (key, kind, normalized))
+
+    suggestion["artworks"] += artworks
+    suggestion["orders"] += orders
+    suggestion["registered"] = suggestion["registered"] or registered
+    if suggestion["artworks"] <= 0 and not suggestion["registered"]:
+        # Nothing in the catalog has this text any more
+        del _suggestions[(kind, normalized)]
+        for key in _keys(normalized):
+            position = bisect.bisect_left(_entries, (key, kind, normalized))
+            if position < len(_entries) and _entries[position] == (key, kind, normalized):
+                del _entries[position]
+
+def _count_artwork(title, artist, medium, orders=0, sign=1):
+    # Caller holds _index_lock; orders are popularity points
+    for kind, text in ((TITLE, title), (ARTIST, artist), (MEDIUM, medium)):
+        if text:
+            _adjust(kind, text, sign * ARTWORK_POPULARITY, sign * orders)
+
+def _set_artwork(artwork_id, title, artist, medium, orders=None):
+    # Caller holds _index_lock; an updated artwork keeps its order points
+    previous = _artworks.pop(artwork_id, None)
+    if previous is not None:
+        _count_artwork(*previous[:3], orders=previous[3], sign=-1)
+    if orders is None:
+        orders = previous[3] if previous is not None else 0
+    if title is not None:
+        _artworks[artwork_id] = (title, artist, medium, orders)
+        _count_artwork(title, artist, medium, orders=orders)
+
+def load_autocomplete_index():
+    """Build the suggestions from the artworks and artists tables"""
+    connection = get_db_connection()
+    if connection is None:
+        print("Error loading autocomplete index: Database connection failed")
+        return False
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT a.id, a.title, a.artist, a.medium,
+               (SELECT COUNT(*) FROM artwork_orders o
+                WHERE o.artwork_id = a.id AND o.payment_status = 'completed') AS orders
+        FROM artworks a
+        """
+        cursor.execute(query)
+        artworks = cursor.fetchall()
+
+        cursor.execute("SELECT name FROM artists")
+        artists = [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error loading autocomplete index: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    with _index_lock:
+        _suggestions.clear()
+        _artworks.clear()
+        _prefix_cache.clear()
+        del _entries[:]
+        for artwork_id, title, artist, medium, orders in artworks:
+            _set_artwork(str(artwork_id), title, artist, medium, orders * ORDER_POPULARITY)
+        for name in artists:
+            # Registered artists are suggested even before their first artwork
+            _adjust(ARTIST, name, registered=True)
+
+    print(f"Loaded {len(_suggestions)} autocomplete suggestions")
+    return True
+
+def _rank(prefix, limit, kind):
+    """The limit most popular suggestions under a normalized prefix
+
+    Caller holds _index_lock.
+    """
+    seen = set()
+    candidates = []
+    position = bisect.bisect_left(_entries, (prefix,))
+    while position < len(_entries):
+        key, entry_kind, normalized = _entries[position]
+        if not key.startswith(prefix):
+            break
+        position += 1
+        if (kind and entry_kind != kind) or (entry_kind, normalized) in seen:
+            continue
+        seen.add((entry_kind, normalized))
+        suggestion = _suggestions[(entry_kind, normalized)]
+        popularity = suggestion["artworks"] + suggestion["orders"]
+        # Among equally popular ones, matches at the start of the text first
+        candidates.append((popularity, normalized.startswith(prefix), suggestion))
+
+    top = heapq.nlargest(limit, candidates, key=lambda candidate: candidate[:2])
+    return [{"text": s["text"], "type": s["type"], "popularity": popularity} for popularity, _, s in top]
+
+def suggest(prefix, limit=DEFAULT_SUGGESTIONS, kind=None):
+    """The most popular suggestions with a word starting with prefix"""
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+    kind = kind or None
+
+    with _index_lock:
+        if len(prefix) > CACHED_PREFIX_LENGTH:
+            return _rank(prefix, limit, kind)
+        ranked = _prefix_cache.get((prefix, kind))
+        if ranked is None:
+            ranked = _prefix_cache[(prefix, kind)] = _rank(prefix, MAX_SUGGESTIONS, kind)
+        return [dict(suggestion) for suggestion in ranked[:limit]]
+
+def get_autocomplete(prefix, limit=DEFAULT_SUGGESTIONS, kind=None):
+    """Handle /autocomplete?prefix=: titles, artists and mediums as you type"""
+    if kind and kind not in (TITLE, ARTIST, MEDIUM):
+        return {"error": f"Unknown type: {kind}"}
+    try:
+        limit = min(MAX_SUGGESTIONS, max(1, int(limit)))
+    except (TypeError, ValueError):
+        return {"error": "limit must be a number"}
+
+    _index.ensure_loaded()
+    return {"prefix": prefix or "", "suggestions": suggest(prefix, limit, kind)}
+
+def _on_catalog_change(kind, action, item_id, item):
+    if kind == catalog_events.ARTIST:
+        if item and action == catalog_events.CREATED:
+            with _index_lock:
+                # Suggested from registration on, like the artists loaded at startup
+                _adjust(ARTIST, item["name"], registered=True)
+        return
+    if kind != catalog_events.ARTWORK:
+        return
+    with _index_lock:
+        if action == catalog_events.DELETED:
+            _set_artwork(item_id, None, None, None)
+        elif action == catalog_events.SOLD:
+            previous = _artworks.get(item_id)
+            if previous is not None:
+                _set_artwork(item_id, *previous[:3], orders=previous[3] + ORDER_POPULARITY)
+        elif item and action in (catalog_events.CREATED, catalog_events.UPDATED):
+            _set_artwork(item_id, item.get("title"), item.get("artist"), item.get("medium"))
+
+_index = CatalogIndex(load_autocomplete_index, _on_catalog_change)
+
+def start_autocomplete_index():
+    """Build the suggestions and keep them current as the catalog changes"""
+    _index.start()
+
+def stop_autocomplete_index():
+    _index.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suggest titles, artists and mediums for a prefix")
+    parser.add_argument("prefix")
+    parser.add_argument("--type", choices=(TITLE, ARTIST, MEDIUM))
+    parser.add_argument("--limit", type=int, default=DEFAULT_SUGGESTIONS)
+    args = parser.parse_args()
+
+    _index.load_or_exit()
+    print(json.dumps(get_autocomplete(args.prefix, args.limit, args.type), indent=2))
@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import zlib
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timedelta
+from mpesa import handle_mpesa_callback, parse_stk_callback
+
+# Durable local journal of M-Pesa callbacks, applied by background workers
+JOURNAL_PATH = os.path.join(os.path.dirname(__file__), "data", "callback_journal.db")
+
+# Callbacks are partitioned by checkout_request_id; each worker owns one
+# partition and applies callbacks for the same payment in arrival order. A
+# failing callback only holds back later ones for its own payment.
+WORKER_COUNT = 4
+
+# Number of journal entries a worker applies per pass
+BATCH_SIZE = 20
+
+# Workers also poll the journal this often in case a wake-up was missed
+POLL_INTERVAL_SECONDS = 5
+
+# Entries that keep failing are parked as 'dead' for the replay tool
+MAX_ATTEMPTS = 10
+
+# Failed entries wait this long before their next attempt
+RETRY_DELAY_SECONDS = 5
+
+# Errors that retrying will not fix
+PERMANENT_ERRORS = ("Missing CheckoutRequestID",)
+
+# A callback can beat the CheckoutRequestID being recorded against its
+# checkout, so "Transaction not found" is retried, but only briefly: the
+# callback endpoint is public and most such callbacks never match
+NOT_FOUND_ERROR = "Transaction not found"
+NOT_FOUND_MAX_ATTEMPTS = 3
+
+_stop_event = threading.Event()
+_wake_events = [threading.Event() for _ in range(WORKER_COUNT)]
+_worker_threads = []
+
+def get_journal_connection():
+    """Open a connection to the callback journal, creating it if needed"""
+    journal_dir = os.path.dirname(JOURNAL_PATH)
+    if not os.path.exists(journal_dir):
+        os.makedirs(journal_dir)
+        print(f"Created directory: {journal_dir}")
+
+    connection = sqlite3.connect(JOURNAL_PATH, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # Every acknowledged callback must survive a crash
+    connection.execute("PRAGMA synchronous=FULL")
+    connection.execute("""
+    CREATE TABLE IF NOT EXISTS callbacks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        checkout_request_id TEXT,
+        partition INTEGER NOT NULL,
+        payload TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        received_at TEXT NOT NULL,
+        processed_at TEXT,
+        next_attempt_at TEXT
+    )
+    """)
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(callbacks)")}
+    if "next_attempt_at" not in columns:
+        # Journals created before retries were delayed
+        connection.execute("ALTER TABLE callbacks ADD COLUMN next_attempt_at TEXT")
+    connection.execute("""
+    CREATE INDEX IF NOT EXISTS idx_callbacks_partition_state
+    ON callbacks (partition, state, id)
+    """)
+    return connection
+
+def get_partition(checkout_request_id):
+    """Map a checkout_request_id to a worker partition"""
+    return zlib.crc32((checkout_request_id or "").encode()) % WORKER_COUNT
+
+def append_callback(callback_data):
+    """Durably append a callback to the journal and return its journal id"""
+    checkout_request_id = parse_stk_callback(callback_data).get("CheckoutRequestID")
+    partition = get_partition(checkout_request_id)
+
+    connection = get_journal_connection()
+    try:
+        cursor = connection.execute(
+            """
+            INSERT INTO callbacks (checkout_request_id, partition, payload, received_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (checkout_request_id, partition, json.dumps(callback_data), datetime.now().isoformat())
+        )
+        connection.commit()
+        entry_id = cursor.lastrowid
+    finally:
+        connection.close()
+
+    _wake_events[partition].set()
+    return entry_id
+
+def apply_entry(connection, entry_id, payload, attempts):
+    """Apply one journal entry and record the outcome
+
+    Returns False if the entry should be retried later.
+    """
+    result = handle_mpesa_callback(json.loads(payload))
+    now = datetime.now().isoformat()
+
+    if "error" not in result:
+        connection.execute(
+            "UPDATE callbacks SET state = 'done', attempts = ?, last_error = NULL, processed_at = ? WHERE id = ?",
+            (attempts + 1, now, entry_id)
+        )
+        connection.commit()
+        return True
+
+    error = result["error"]
+    max_attempts = NOT_FOUND_MAX_ATTEMPTS if error == NOT_FOUND_ERROR else MAX_ATTEMPTS
+    if error in PERMANENT_ERRORS or attempts + 1 >= max_attempts:
+        print(f"Callback journal entry {entry_id} parked: {error}")
+        connection.execute(
+            "UPDATE callbacks SET state = 'dead', attempts = ?, last_error = ?, processed_at = ? WHERE id = ?",
+            (attempts + 1, error, now, entry_id)
+        )
+        connection.commit()
+        return True
+
+    next_attempt_at = (datetime.now() + timedelta(seconds=RETRY_DELAY_SECONDS)).isoformat()
+    connection.execute(
+        "UPDATE callbacks SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+        (attempts + 1, error, next_attempt_at, entry_id)
+    )
+    connection.commit()
+    return False
+
+def process_partition(connection, partition):
+    """Apply pending entries of a partition in order; returns the number applied
+
+    Entries waiting to be retried are skipped, along with every later entry
+    for the same checkout_request_id, so one failing payment does not hold up
+    the rest of the partition.
+    """
+    now = datetime.now().isoformat()
+    rows = connection.execute(
+        """
+        SELECT id, checkout_request_id, payload, attempts FROM callbacks
+        WHERE partition = ? AND state = 'pending'
+          AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
+          AND IFNULL(checkout_request_id, '') NOT IN (
+              SELECT IFNULL(checkout_request_id, '') FROM callbacks
+              WHERE partition = ? AND state = 'pending' AND next_attempt_at > ?
+          )
+        ORDER BY id
+        LIMIT ?
+        """,
+        (partition, now, partition, now, BATCH_SIZE)
+    ).fetchall()
+
+    applied = 0
+    failed = set()
+    for entry_id, checkout_request_id, payload, attempts in rows:
+        if checkout_request_id in failed:
+            # Keep later callbacks for this payment behind the failed one
+            continue
+        if apply_entry(connection, entry_id, payload, attempts):
+            applied += 1
+        else:
+            failed.add(checkout_request_id)
+    return applied
+
+def _run_worker(partition):
+    connection = get_journal_connection()
+    try:
+        while not _stop_event.is_set():
+            wake_event = _wake_events[partition]
+            wake_event.clear()
+            try:
+                applied = process_partition(connection, partition)
+            except Exception as e:
+                print(f"Error in callback worker {partition}: {e}")
+                applied = 0
+            if applied < BATCH_SIZE:
+                wake_event.wait(POLL_INTERVAL_SECONDS)
+    finally:
+        connection.close()
+
+def start_callback_workers():
+    """Start the worker pool that applies journaled callbacks"""
+    if any(thread.is_alive() for thread in _worker_threads):
+        return _worker_threads
+
+    _stop_event.clear()
+    _worker_threads.clear()
+    for partition in range(WORKER_COUNT):
+        thread = threading.Thread(target=_run_worker, args=(partition,),
+                                  name=f"callback-worker-{partition}", daemon=True)
+        thread.start()
+        _worker_threads.append(thread)
+    print(f"Started {WORKER_COUNT} M-Pesa callback workers")
+    return _worker_threads
+
+def stop_callback_workers():
+    """Signal the callback workers to stop"""
+    _stop_event.set()
+    for wake_event in _wake_events:
+        wake_event.set()
+
+def get_journal_summary():
+    """Count journal entries by state"""
+    connection = get_journal_connection()
+    try:
+        rows = connection.execute("SELECT state, COUNT(*) FROM callbacks GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+    finally:
+        connection.close()
+
+def replay_callbacks(since_id=None, checkout_request_id=None, dead_only=False):
+    """Requeue journal entries and apply them in order
+
+    Applying a payment result is idempotent, so entries that were already
+    applied are safe to replay.
+    """
+    conditions = []
+    params = []
+    if since_id is not None:
+        conditions.append("id >= ?")
+        params.append(since_id)
+    if checkout_request_id:
+        conditions.append("checkout_request_id = ?")
+        params.append(checkout_request_id)
+    if dead_only:
+        conditions.append("state = 'dead'")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    connection = get_journal_connection()
+    try:
+        cursor = connection.execute(
+            f"UPDATE callbacks SET state = 'pending', attempts = 0, processed_at = NULL, next_attempt_at = NULL {where}",
+            params
+        )
+        connection.commit()
+        print(f"Requeued {cursor.rowcount} callback(s)")
+
+        applied = 0
+        for partition in range(WORKER_COUNT):
+            while True:
+                count = process_partition(connection, partition)
+                applied += count
+                if count < BATCH_SIZE:
+                    break
+        print(f"Applied {applied} callback(s)")
+        return applied
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and replay the M-Pesa callback journal")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("status", help="Show journal entry counts by state")
+
+    replay_parser = subparsers.add_parser("replay", help="Reprocess journaled callbacks")
+    replay_parser.add_argument("--since", type=int, help="Replay entries with this journal id or later")
+    replay_parser.add_argument("--checkout", help="Replay entries for one CheckoutRequestID")
+    replay_parser.add_argument("--dead-only", action="store_true", help="Replay only parked entries")
+
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(json.dumps(get_journal_summary(), indent=2))
+    elif args.command == "replay":
+        replay_callbacks(args.since, args.checkout, args.dead_only)
+    else:
+        parser.print_help()
+        sys.exit(1)
@@ -0,0 +1,44 @@
+import threading
+
+# Kinds and actions of catalog changes
+ARTWORK = "artwork"
+EXHIBITION = "exhibition"
+# Artist accounts; item is {"id", "name"}
+ARTIST = "artist"
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+SOLD = "sold"
+
+# Listeners called as listener(kind, action, item_id, item) after a change
+# to the catalog has been committed
+_listeners = []
+_listeners_lock = threading.Lock()
+
+def subscribe(listener):
+    """Register a function called after every committed catalog change
+
+    Listeners run on the thread that made the change, so they should only
+    update memory or queue work. item is the changed record as the API
+    returns it, or None when it is not at hand (deletes, sales).
+    """
+    with _listeners_lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+def unsubscribe(listener):
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+def publish(kind, action, item_id, item=None):
+    """Notify every listener of a committed change"""
+    with _listeners_lock:
+        listeners = list(_listeners)
+
+    for listener in listeners:
+        try:
+            listener(kind, action, str(item_id), item)
+        except Exception as e:
+            # One failing index must not fail the request that changed the catalog
+            print(f"Error in catalog listener {getattr(listener, '__name__', listener)}: {e}")
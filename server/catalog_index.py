@@ -0,0 +1,66 @@
+import sys
+import time
+import threading
+import catalog_events
+
+# After a failed load, requests wait this long before trying again
+LOAD_RETRY_SECONDS = 30
+
+class CatalogIndex:
+    """Lifecycle of an in-memory index of the catalog
+
+    load builds the whole index from the database and returns True on
+    success; on_change is the catalog_events listener keeping it current
+    while it runs. Requests call ensure_loaded(), so an index that could not
+    be loaded at startup is loaded on first use. Loads run one at a time,
+    and after a failure requests wait LOAD_RETRY_SECONDS before trying again
+    instead of each starting another load.
+
+    The index data itself is guarded by its module. Indexes changed in place
+    hold their module's lock for reads and writes; indexes kept as numpy
+    arrays build new arrays under the lock and swap in a new snapshot dict,
+    so readers take the current snapshot once and need no lock.
+    """
+
+    def __init__(self, load, on_change):
+        self._load = load
+        self._on_change = on_change
+        self._load_lock = threading.Lock()
+        self._last_attempt = None
+        self.loaded = False
+
+    def _attempt(self):
+        # Caller holds _load_lock
+        self._last_attempt = time.monotonic()
+        succeeded = bool(self._load())
+        self.loaded = self.loaded or succeeded
+        return succeeded
+
+    def load(self):
+        """Build the index now; returns whether it succeeded"""
+        with self._load_lock:
+            return self._attempt()
+
+    def ensure_loaded(self):
+        """Load the index if it never was, unless an attempt failed just now"""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if self.loaded:
+                return
+            if self._last_attempt is not None and time.monotonic() - self._last_attempt < LOAD_RETRY_SECONDS:
+                return
+            self._attempt()
+
+    def load_or_exit(self):
+        """Load the index for a command-line run, exiting with status 1 on failure"""
+        if not self.load():
+            sys.exit(1)
+
+    def start(self):
+        """Follow catalog changes and load the index"""
+        catalog_events.subscribe(self._on_change)
+        return self.load()
+
+    def stop(self):
+        catalog_events.unsubscribe(self._on_change)
@@ -0,0 +1,197 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from database import get_db_connection
+from inventory import run_in_transaction, is_valid_slot_count, MAX_SLOTS_PER_BOOKING
+from db_operations import insert_order
+from mpesa import initiate_stk_push, apply_payment_result, format_phone_number
+
+# Default for requests that do not pass "async": when enabled, checkouts are
+# acknowledged before the STK Push is sent
+ASYNC_STK_PUSH = False
+
+# Maximum number of STK Push requests in flight to Safaricom at once
+MAX_CONCURRENT_STK_PUSHES = 8
+
+# Writing the CheckoutRequestID is retried this many times, waiting
+# RECORD_STK_PUSH_BACKOFF_SECONDS and then twice as long each time; callbacks
+# can only find the checkout once it is written
+RECORD_STK_PUSH_ATTEMPTS = 5
+RECORD_STK_PUSH_BACKOFF_SECONDS = 0.5
+
+# Background pool that sends STK Push requests for acknowledged checkouts
+_stk_push_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_STK_PUSHES, thread_name_prefix="stk-push")
+
+def create_checkout(user_id, order_type, reference_id, amount, slots, phone_number):
+    """Hold the item and write the order and its pending transaction in one transaction
+
+    For exhibitions the booking row carries the ticket code, so a purchase is
+    one booking insert and one transaction insert under a single commit. The
+    transaction is keyed by a local checkout handle until Safaricom assigns a
+    CheckoutRequestID.
+    """
+    checkout_handle = uuid.uuid4().hex
+
+    def write(cursor):
+        order = insert_order(cursor, user_id, order_type, reference_id, amount, slots)
+        if "error" in order:
+            return order
+
+        query = """
+        INSERT INTO mpesa_transactions
+        (checkout_request_id, checkout_handle, merchant_request_id, order_type, order_id, user_id, amount, phone_number)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        cursor.execute(query, (
+            checkout_handle,
+            checkout_handle,
+            '',
+            order_type,
+            order["order_id"],
+            user_id,
+            amount,
+            phone_number
+        ))
+
+        order["checkout_handle"] = checkout_handle
+        return order
+
+    return run_in_transaction(write)
+
+def record_stk_push(checkout_handle, checkout_request_id, merchant_request_id):
+    """Replace the local checkout handle with the CheckoutRequestID from Safaricom"""
+    connection = get_db_connection()
+    if connection is None:
+        return False
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        UPDATE mpesa_transactions
+        SET checkout_request_id = %s, merchant_request_id = %s
+        WHERE checkout_handle = %s
+        """
+        cursor.execute(query, (checkout_request_id, merchant_request_id, checkout_handle))
+        connection.commit()
+        return cursor.rowcount == 1
+    except Exception as e:
+        print(f"Error recording STK Push for checkout {checkout_handle}: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def send_stk_push(checkout, phone_number, amount, account_reference, order_type):
+    """Prompt the customer for payment and record the result against the checkout"""
+    checkout_handle = checkout["checkout_handle"]
+    stk_result = initiate_stk_push(
+        phone_number,
+        amount,
+        account_reference,
+        order_type,
+        checkout["order_id"]
+    )
+
+    if "error" in stk_result:
+        # Fails the transaction and releases the held item straight away
+        apply_payment_result(checkout_handle, "failed", None, str(stk_result["error"])[:255])
+        return stk_result
+
+    for attempt in range(RECORD_STK_PUSH_ATTEMPTS):
+        if record_stk_push(checkout_handle, stk_result["checkoutRequestId"], stk_result["merchantRequestId"]):
+            return stk_result
+        if attempt + 1 < RECORD_STK_PUSH_ATTEMPTS:
+            time.sleep(RECORD_STK_PUSH_BACKOFF_SECONDS * (2 ** attempt))
+
+    # The callback for this push could never be matched; fail the checkout
+    # rather than let the hold expire under a payment we can't see
+    print(f"Error: STK Push {stk_result['checkoutRequestId']} not recorded for checkout {checkout_handle}; "
+          f"failing the checkout, refund required if the customer pays")
+    apply_payment_result(checkout_handle, "failed", None, "Failed to record payment request")
+    return {"error": "Failed to record payment request, please try again"}
+
+def send_stk_push_in_background(checkout, phone_number, amount, account_reference, order_type):
+    """Queue the STK Push for an acknowledged checkout on the worker pool
+
+    The outcome becomes visible through the status endpoint: the transaction
+    gains its CheckoutRequestID, or fails and releases its hold.
+    """
+    def run():
+        try:
+            send_stk_push(checkout, phone_number, amount, account_reference, order_type)
+        except Exception as e:
+            print(f"Error sending STK Push for checkout {checkout['checkout_handle']}: {e}")
+            apply_payment_result(checkout["checkout_handle"], "failed", None, "Failed to send payment request")
+
+    return _stk_push_executor.submit(run)
+
+def handle_checkout_request(request_data):
+    """Handle STK Push request from frontend"""
+    try:
+        print("STK Push request received:", request_data)
+
+        phone_number = request_data.get("phoneNumber")
+        amount = request_data.get("amount")
+        order_type = request_data.get("orderType")
+        order_id = request_data.get("orderId")
+        user_id = request_data.get("userId")
+        account_reference = request_data.get("accountReference")
+        slots = request_data.get("slots", 1)  # For exhibition tickets
+
+        # Validate required fields
+        required_fields = ["phoneNumber", "amount", "orderType", "orderId", "userId"]
+        missing_fields = []
+
+        for field in required_fields:
+            value = request_data.get(field)
+            if not value or (isinstance(value, str) and value.strip() == ''):
+                missing_fields.append(field)
+
+        if missing_fields:
+            error_msg = f"Missing required fields: {', '.join(missing_fields)}"
+            print(error_msg)
+            return {"error": error_msg}
+
+        if order_type == "exhibition" and not is_valid_slot_count(slots):
+            return {"error": f"slots must be a whole number from 1 to {MAX_SLOTS_PER_BOOKING}"}
+
+        phone_number = format_phone_number(phone_number)
+
+        # Hold the item and write the order and pending transaction before prompting for payment
+        checkout = create_checkout(user_id, order_type, order_id, amount, slots, phone_number)
+        if "error" in checkout:
+            return checkout
+
+        account_reference = account_reference or f"{order_type}-{order_id}"
+
+        if request_data.get("async", ASYNC_STK_PUSH):
+            # Acknowledge the order now; poll or stream the status by checkout handle
+            send_stk_push_in_background(checkout, phone_number, amount, account_reference, order_type)
+            response = {
+                "success": True,
+                "checkoutHandle": checkout["checkout_handle"],
+                "order": checkout
+            }
+        else:
+            stk_result = send_stk_push(checkout, phone_number, amount, account_reference, order_type)
+            if "error" in stk_result:
+                return stk_result
+
+            response = {
+                "success": True,
+                "checkoutHandle": checkout["checkout_handle"],
+                "checkoutRequestId": stk_result["checkoutRequestId"],
+                "order": checkout,
+                "stk": stk_result
+            }
+        if order_type == "exhibition":
+            response["message"] = "Exhibition ticket created successfully"
+            response["ticket"] = {"ticket_id": checkout["order_id"], "ticket_code": checkout["ticket_code"]}
+        else:
+            response["message"] = "Artwork order created successfully"
+        return response
+    except Exception as e:
+        print(f"Error handling STK Push request: {e}")
+        return {"error": str(e)}
@@ -0,0 +1,222 @@
+import threading
+from collections import defaultdict
+from mysql.connector import IntegrityError
+from inventory import run_in_transaction, reserve_slots, release_slots
+from ticket_ledger import record_bookings_cancelled
+
+# How long a checkout may hold an artwork or exhibition slots while the
+# customer completes the M-Pesa payment
+HOLD_TTL_MINUTES = 5
+
+# How often expired holds are swept
+SWEEP_INTERVAL_SECONDS = 30
+
+# Maximum number of expired holds released per sweep transaction
+SWEEP_BATCH_SIZE = 200
+
+_stop_event = threading.Event()
+_sweeper_thread = None
+
+def take_artwork_hold(cursor, artwork_id):
+    """Hold a unique artwork for one checkout
+
+    An active hold sets artwork_lock to the artwork id, and the unique index on
+    that column makes a second concurrent hold fail without scanning anything.
+    Returns the hold id, or a dict with an "error" key.
+    """
+    cursor.execute("SELECT status FROM artworks WHERE id = %s", (artwork_id,))
+    row = cursor.fetchone()
+    if not row:
+        return {"error": "Artwork not found"}
+    if row[0] == "sold":
+        return {"error": "This artwork has already been sold"}
+
+    # Free the artwork if the previous buyer's hold has lapsed but not been swept yet
+    cursor.execute("""
+    SELECT id, hold_type, item_id, order_id, slots FROM checkout_holds
+    WHERE artwork_lock = %s AND expires_at <= NOW()
+    FOR UPDATE
+    """, (artwork_id,))
+    expired = cursor.fetchall()
+    if expired:
+        release_holds(cursor, expired)
+
+    try:
+        cursor.execute("""
+        INSERT INTO checkout_holds (hold_type, item_id, slots, artwork_lock, expires_at)
+        VALUES ('artwork', %s, 1, %s, NOW() + INTERVAL %s MINUTE)
+        """, (artwork_id, artwork_id, HOLD_TTL_MINUTES))
+    except IntegrityError:
+        return {"error": "This artwork is reserved by another buyer. Please try again in a few minutes."}
+
+    return cursor.lastrowid
+
+def take_exhibition_hold(cursor, exhibition_id, slots):
+    """Hold exhibition slots for one checkout
+
+    Returns the hold id, or a dict with an "error" key.
+    """
+    if not reserve_slots(cursor, exhibition_id, slots):
+        return {"error": "Not enough slots available for this exhibition"}
+
+    cursor.execute("""
+    INSERT INTO checkout_holds (hold_type, item_id, slots, expires_at)
+    VALUES ('exhibition', %s, %s, NOW() + INTERVAL %s MINUTE)
+    """, (exhibition_id, slots, HOLD_TTL_MINUTES))
+    return cursor.lastrowid
+
+def attach_hold_to_order(cursor, hold_id, order_id):
+    """Link a hold to the order it was taken for"""
+    cursor.execute("UPDATE checkout_holds SET order_id = %s WHERE id = %s", (order_id, hold_id))
+
+def convert_hold(cursor, hold_type, order_id):
+    """Turn the active hold of a paid order into a sale
+
+    Returns False if the order has no active hold, e.g. because it expired.
+    """
+    cursor.execute("""
+    UPDATE checkout_holds
+    SET status = 'converted', artwork_lock = NULL
+    WHERE hold_type = %s AND order_id = %s AND status = 'active'
+    """, (hold_type, order_id))
+    return cursor.rowcount > 0
+
+def release_order_hold(cursor, hold_type, order_id):
+    """Release the active hold of an order whose payment did not go through"""
+    cursor.execute("""
+    SELECT id, hold_type, item_id, order_id, slots FROM checkout_holds
+    WHERE hold_type = %s AND order_id = %s AND status = 'active'
+    FOR UPDATE
+    """, (hold_type, order_id))
+    holds = cursor.fetchall()
+    if holds:
+        release_holds(cursor, holds)
+    return len(holds)
+
+def release_holds(cursor, holds):
+    """Release a batch of locked holds and return their inventory
+
+    Slots are returned with one update per exhibition, and the pending orders
+    the holds belonged to are marked as failed. Cancelled bookings are counted
+    in the exhibition occupancy.
+    """
+    hold_ids = [hold[0] for hold in holds]
+    placeholders = ", ".join(["%s"] * len(hold_ids))
+    cursor.execute(f"""
+    UPDATE checkout_holds
+    SET status = 'released', artwork_lock = NULL
+    WHERE id IN ({placeholders})
+    """, hold_ids)
+
+    slots_by_exhibition = defaultdict(int)
+    orders_by_type = defaultdict(list)
+    for _, hold_type, item_id, order_id, slots in holds:
+        if hold_type == "exhibition":
+            slots_by_exhibition[item_id] += slots
+        if order_id is not None:
+            orders_by_type[hold_type].append(order_id)
+
+    for exhibition_id, slots in slots_by_exhibition.items():
+        release_slots(cursor, exhibition_id, slots)
+
+    if orders_by_type["artwork"]:
+        order_ids = orders_by_type["artwork"]
+        placeholders = ", ".join(["%s"] * len(order_ids))
+        cursor.execute(f"""
+        UPDATE artwork_orders SET payment_status = 'failed'
+        WHERE id IN ({placeholders}) AND payment_status = 'pending'
+        """, order_ids)
+
+    if orders_by_type["exhibition"]:
+        order_ids = orders_by_type["exhibition"]
+        placeholders = ", ".join(["%s"] * len(order_ids))
+        cursor.execute(f"""
+        SELECT id, exhibition_id, slots FROM exhibition_bookings
+        WHERE id IN ({placeholders}) AND payment_status = 'pending'
+        FOR UPDATE
+        """, order_ids)
+        bookings = cursor.fetchall()
+        if bookings:
+            booking_ids = [booking[0] for booking in bookings]
+            placeholders = ", ".join(["%s"] * len(booking_ids))
+            cursor.execute(f"""
+            UPDATE exhibition_bookings SET payment_status = 'failed', status = 'cancelled'
+            WHERE id IN ({placeholders})
+            """, booking_ids)
+            record_bookings_cancelled(cursor, [(exhibition_id, slots) for _, exhibition_id, slots in bookings])
+
+def reclaim_expired_hold(cursor, hold_type, order_id):
+    """Try to restore the inventory of an order paid for after its hold expired
+
+    Returns True if the artwork or the slots could be taken again.
+    """
+    cursor.execute("""
+    SELECT item_id, slots FROM checkout_holds
+    WHERE hold_type = %s AND order_id = %s AND status = 'released'
+    ORDER BY id DESC
+    LIMIT 1
+    """, (hold_type, order_id))
+    row = cursor.fetchone()
+    if not row:
+        return False
+
+    item_id, slots = row
+    if hold_type == "exhibition":
+        return reserve_slots(cursor, item_id, slots)
+
+    # The artwork is only still available if nobody else holds or bought it
+    cursor.execute("""
+    SELECT a.status, h.id FROM artworks a
+    LEFT JOIN checkout_holds h ON h.artwork_lock = a.id AND h.expires_at > NOW()
+    WHERE a.id = %s
+    """, (item_id,))
+    row = cursor.fetchone()
+    return bool(row) and row[0] != "sold" and row[1] is None
+
+def expire_holds(limit=SWEEP_BATCH_SIZE):
+    """Release one batch of expired holds; returns the number released"""
+    def sweep(cursor):
+        # Served by the (status, expires_at) index
+        cursor.execute("""
+        SELECT id, hold_type, item_id, order_id, slots FROM checkout_holds
+        WHERE status = 'active' AND expires_at <= NOW()
+        ORDER BY expires_at
+        LIMIT %s
+        FOR UPDATE
+        """, (limit,))
+        holds = cursor.fetchall()
+        if holds:
+            release_holds(cursor, holds)
+        return len(holds)
+
+    result = run_in_transaction(sweep)
+    if isinstance(result, dict):
+        print(f"Error expiring checkout holds: {result['error']}")
+        return 0
+    return result
+
+def _run_sweeper():
+    while not _stop_event.is_set():
+        try:
+            released = expire_holds()
+            while released == SWEEP_BATCH_SIZE and not _stop_event.is_set():
+                released = expire_holds()
+        except Exception as e:
+            print(f"Error in checkout hold sweeper: {e}")
+        _stop_event.wait(SWEEP_INTERVAL_SECONDS)
+
+def start_hold_sweeper():
+    """Start the background thread that releases expired checkout holds"""
+    global _sweeper_thread
+    if _sweeper_thread and _sweeper_thread.is_alive():
+        return _sweeper_thread
+
+    _stop_event.clear()
+    _sweeper_thread = threading.Thread(target=_run_sweeper, name="checkout-hold-sweeper", daemon=True)
+    _sweeper_thread.start()
+    print("Checkout hold sweeper started")
+    return _sweeper_thread
+
+def stop_hold_sweeper():
+    """Signal the checkout hold sweeper thread to stop"""
+    _stop_event.set()
@@ -1,86 +1,98 @@
 
 from database import get_db_connection
+from checkout_holds import take_artwork_hold, take_exhibition_hold, attach_hold_to_order
+from ticket_codes import encode_ticket_code, decode_ticket_code
 from decimal import Decimal
-import random
-import string
 
-def generate_ticket_code():
-    """Generate a unique ticket code"""
-    prefix = 'TKT'
-    random_chars = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-    return f"{prefix}-{random_chars}"
+def insert_order(cursor, user_id, order_type, reference_id, amount, slots=1):
+    """Hold the item and insert a pending order using the caller's transaction"""
+    if order_type == 'artwork':
+        return insert_artwork_order(cursor, user_id, reference_id, amount)
+    elif order_type == 'exhibition':
+        return insert_exhibition_booking(cursor, user_id, reference_id, amount, slots)
+    else:
+        return {"error": "Invalid order type"}
 
-def create_order(user_id, order_type, reference_id, amount):
-    """Create a new order in the database"""
-    connection = get_db_connection()
-    if connection is None:
-        return {"error": "Database connection failed"}
+def insert_artwork_order(cursor, user_id, artwork_id, amount):
+    """Hold an artwork and insert a pending order for it"""
+    hold_id = take_artwork_hold(cursor, artwork_id)
+    if isinstance(hold_id, dict):
+        return hold_id
     
-    cursor = connection.cursor()
+    # Store artwork orders in artwork_orders table
+    query = """
+    INSERT INTO artwork_orders (user_id, artwork_id, total_amount, payment_status)
+    VALUES (%s, %s, %s, %s)
+    """
+    cursor.execute(query, (user_id, artwork_id, amount, 'pending'))
+    order_id = cursor.lastrowid
+    attach_hold_to_order(cursor, hold_id, order_id)
     
-    try:
-        if order_type == 'artwork':
-            # Store artwork orders in artwork_orders table
-            query = """
-            INSERT INTO artwork_orders (user_id, artwork_id, total_amount, payment_status)
-            VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(query, (user_id, reference_id, amount, 'pending'))
-            connection.commit()
-            
-            order_id = cursor.lastrowid
-            return {"success": True, "order_id": order_id}
-        
-        elif order_type == 'exhibition':
-            # Generate a ticket code for the exhibition booking
-            ticket_code = generate_ticket_code()
-            
-            # Store exhibition orders in exhibition_bookings table
-            query = """
-            INSERT INTO exhibition_bookings (user_id, exhibition_id, total_amount, payment_status, ticket_code, slots, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """
-            cursor.execute(query, (user_id, reference_id, amount, 'pending', ticket_code, 1, 'active'))
-            connection.commit()
-            
-            order_id = cursor.lastrowid
-            return {"success": True, "order_id": order_id, "ticket_code": ticket_code}
-        
-        else:
-            return {"error": "Invalid order type"}
-    except Exception as e:
-        print(f"Error creating order: {e}")
-        return {"error": str(e)}
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+    return {"success": True, "order_id": order_id}
 
-def create_ticket(user_id, exhibition_id, slots):
-    """Create a new ticket in the database"""
+def insert_exhibition_booking(cursor, user_id, exhibition_id, amount, slots=1):
+    """Hold exhibition slots and insert a pending booking with its ticket code
+    
+    The booking row is the ticket; there is no separate ticket insert. The
+    ticket code is issued from the booking id in the same transaction.
+    """
+    hold_id = take_exhibition_hold(cursor, exhibition_id, slots)
+    if isinstance(hold_id, dict):
+        return hold_id
+    
+    # Store exhibition orders in exhibition_bookings table
+    query = """
+    INSERT INTO exhibition_bookings (user_id, exhibition_id, total_amount, payment_status, slots, status)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    """
+    cursor.execute(query, (user_id, exhibition_id, amount, 'pending', slots, 'active'))
+    order_id = cursor.lastrowid
+    
+    # The ticket code is derived from the booking id, so it is unique without a retry loop
+    ticket_code = encode_ticket_code(order_id)
+    cursor.execute("UPDATE exhibition_bookings SET ticket_code = %s WHERE id = %s", (ticket_code, order_id))
+    attach_hold_to_order(cursor, hold_id, order_id)
+    
+    return {"success": True, "order_id": order_id, "ticket_code": ticket_code}
+
+def get_booking_by_ticket_code(ticket_code):
+    """Look up the exhibition booking a ticket code belongs to
+    
+    Codes decode straight to the booking id, so the lookup is by primary key;
+    the stored code is still compared so a forged or mistyped code fails.
+    Codes issued before the keyed codes fall back to the unique index.
+    """
     connection = get_db_connection()
     if connection is None:
-        return {"error": "Database connection failed"}
+        return None
     
     cursor = connection.cursor()
     
     try:
-        # Generate ticket code
-        ticket_code = generate_ticket_code()
-        
-        # Store tickets in exhibition_bookings table with the ticket_code field
         query = """
-        INSERT INTO exhibition_bookings (user_id, exhibition_id, ticket_code, slots, status)
-        VALUES (%s, %s, %s, %s, %s)
+        SELECT eb.id, eb.user_id, eb.exhibition_id, e.title as exhibition_title,
+               eb.ticket_code, eb.slots, eb.status, eb.payment_status, eb.booking_date
+        FROM exhibition_bookings eb
+        JOIN exhibitions e ON eb.exhibition_id = e.id
+        WHERE {}
         """
-        cursor.execute(query, (user_id, exhibition_id, ticket_code, slots, 'active'))
-        connection.commit()
+        code = ticket_code.strip().upper()
+        booking_id = decode_ticket_code(code)
         
-        ticket_id = cursor.lastrowid
-        return {"success": True, "ticket_id": ticket_id, "ticket_code": ticket_code}
+        row = None
+        if booking_id is not None:
+            cursor.execute(query.format("eb.id = %s"), (booking_id,))
+            row = cursor.fetchone()
+            if row and row[4] != encode_ticket_code(booking_id):
+                row = None
+        if row is None:
+            cursor.execute(query.format("eb.ticket_code = %s"), (code,))
+            row = cursor.fetchone()
+        
+        return dict(zip([col[0] for col in cursor.description], row)) if row else None
     except Exception as e:
-        print(f"Error creating ticket: {e}")
-        return {"error": str(e)}
+        print(f"Error looking up ticket {ticket_code}: {e}")
+        return None
     finally:
         if connection.is_connected():
             cursor.close()
@@ -119,42 +131,6 @@ def get_all_orders():
             cursor.close()
             connection.close()
 
-def get_all_tickets():
-    """Get all tickets from database"""
-    connection = get_db_connection()
-    if connection is None:
-        return {"error": "Database connection failed"}
-    
-    cursor = connection.cursor()
-    
-    try:
-        # Get exhibition bookings
-        query = """
-        SELECT eb.id, eb.user_id, u.name as user_name, eb.exhibition_id, 
-               e.title as exhibition_title, e.image_url as exhibition_image_url,
-               eb.booking_date, eb.ticket_code, eb.slots, eb.status,
-               eb.total_amount, eb.payment_status
-        FROM exhibition_bookings eb
-        JOIN users u ON eb.user_id = u.id
-        JOIN exhibitions e ON eb.exhibition_id = e.id
-        ORDER BY eb.booking_date DESC
-        """
-        cursor.execute(query)
-        
-        tickets = []
-        for row in cursor.fetchall():
-            ticket = dict(zip([col[0] for col in cursor.description], row))
-            tickets.append(ticket)
-            
-        return {"tickets": tickets}
-    except Exception as e:
-        print(f"Error getting tickets: {e}")
-        return {"error": str(e)}
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
-
 def get_user_orders(user_id):
     """Get all orders and bookings for a specific user"""
     connection = get_db_connection()
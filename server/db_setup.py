@@ -1,6 +1,7 @@
 
 import mysql.connector
 from mysql.connector import Error
+from ticket_ledger import rebuild_occupancy
 
 # Database connection configuration
 DB_CONFIG = {
@@ -21,6 +22,20 @@ def get_db_connection():
         print(f"Error connecting to MySQL: {e}")
     return None
 
+def ensure_column(cursor, table, column, column_definition):
+    """Add a column to an existing table if it is missing"""
+    cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+    if not cursor.fetchall():
+        print(f"Adding {column} column to {table} table")
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_definition}")
+
+def ensure_index(cursor, table, index_name, index_definition):
+    """Add an index to an existing table if it is missing"""
+    cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index_name,))
+    if not cursor.fetchall():
+        print(f"Adding index {index_name} to {table} table")
+        cursor.execute(f"ALTER TABLE {table} ADD {index_definition}")
+
 def initialize_database():
     """Create database tables if they don't exist"""
     connection = get_db_connection()
@@ -152,10 +167,16 @@ def initialize_database():
         payment_method ENUM('mpesa') NOT NULL,
         payment_status ENUM('pending', 'completed', 'failed') NOT NULL DEFAULT 'pending',
         mpesa_transaction_id VARCHAR(50),
+        ticket_code VARCHAR(50),
+        status ENUM('active', 'used', 'cancelled') DEFAULT 'active',
         booking_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         total_amount DECIMAL(10, 2) NOT NULL,
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-        FOREIGN KEY (exhibition_id) REFERENCES exhibitions(id) ON DELETE CASCADE
+        FOREIGN KEY (exhibition_id) REFERENCES exhibitions(id) ON DELETE CASCADE,
+        UNIQUE INDEX idx_bookings_ticket_code (ticket_code),
+        INDEX idx_bookings_exhibition_date (exhibition_id, booking_date),
+        INDEX idx_bookings_status_date (status, booking_date),
+        INDEX idx_bookings_date (booking_date)
     );
     """
     
@@ -178,6 +199,7 @@ def initialize_database():
     CREATE TABLE IF NOT EXISTS mpesa_transactions (
         id INT AUTO_INCREMENT PRIMARY KEY,
         checkout_request_id VARCHAR(100) NOT NULL,
+        checkout_handle VARCHAR(64),
         merchant_request_id VARCHAR(100) NOT NULL,
         order_type VARCHAR(20) NOT NULL,
         order_id INT NOT NULL,
@@ -188,10 +210,59 @@ def initialize_database():
         result_desc VARCHAR(255),
         transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         status ENUM('pending', 'completed', 'failed') NOT NULL DEFAULT 'pending',
+        UNIQUE INDEX idx_mpesa_checkout_request_id (checkout_request_id),
+        UNIQUE INDEX idx_mpesa_checkout_handle (checkout_handle),
+        INDEX idx_mpesa_status_date (status, transaction_date),
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
     );
     """
     
+    # Create checkout holds table
+    # artwork_lock is set to the artwork id while an artwork hold is active, so the
+    # unique index allows only one active checkout per artwork
+    checkout_holds_table = """
+    CREATE TABLE IF NOT EXISTS checkout_holds (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        hold_type ENUM('artwork', 'exhibition') NOT NULL,
+        item_id INT NOT NULL,
+        order_id INT,
+        slots INT NOT NULL DEFAULT 1,
+        artwork_lock INT NULL,
+        status ENUM('active', 'converted', 'released') NOT NULL DEFAULT 'active',
+        expires_at DATETIME NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE INDEX idx_holds_artwork_lock (artwork_lock),
+        INDEX idx_holds_status_expires (status, expires_at),
+        INDEX idx_holds_order (hold_type, order_id)
+    );
+    """
+    
+    # Create exhibition occupancy table
+    exhibition_occupancy_table = """
+    CREATE TABLE IF NOT EXISTS exhibition_occupancy (
+        exhibition_id INT PRIMARY KEY,
+        sold_tickets INT NOT NULL DEFAULT 0,
+        sold_slots INT NOT NULL DEFAULT 0,
+        used_slots INT NOT NULL DEFAULT 0,
+        cancelled_slots INT NOT NULL DEFAULT 0,
+        revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (exhibition_id) REFERENCES exhibitions(id) ON DELETE CASCADE
+    );
+    """
+    
+    # Create artwork features table (colour histogram and palette per image)
+    artwork_features_table = """
+    CREATE TABLE IF NOT EXISTS artwork_features (
+        artwork_id INT PRIMARY KEY,
+        image_url VARCHAR(255) NOT NULL,
+        histogram BLOB NOT NULL,
+        palette TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (artwork_id) REFERENCES artworks(id) ON DELETE CASCADE
+    );
+    """
+    
     try:
         cursor.execute(users_table)
         cursor.execute(admins_table)
@@ -204,6 +275,34 @@ def initialize_database():
         cursor.execute(exhibition_bookings_table)
         cursor.execute(contact_messages_table)
         cursor.execute(mpesa_transactions_table)
+        cursor.execute(checkout_holds_table)
+        cursor.execute("SHOW TABLES LIKE 'exhibition_occupancy'")
+        backfill_occupancy = not cursor.fetchall()
+        cursor.execute(exhibition_occupancy_table)
+        cursor.execute(artwork_features_table)
+        
+        # Add columns and indexes to tables created before they were part of the schema
+        ensure_column(cursor, "mpesa_transactions", "checkout_handle", "VARCHAR(64) AFTER checkout_request_id")
+        ensure_index(cursor, "mpesa_transactions", "idx_mpesa_checkout_request_id",
+                     "UNIQUE INDEX idx_mpesa_checkout_request_id (checkout_request_id)")
+        ensure_index(cursor, "mpesa_transactions", "idx_mpesa_status_date",
+                     "INDEX idx_mpesa_status_date (status, transaction_date)")
+        ensure_index(cursor, "mpesa_transactions", "idx_mpesa_checkout_handle",
+                     "UNIQUE INDEX idx_mpesa_checkout_handle (checkout_handle)")
+        ensure_column(cursor, "exhibition_bookings", "ticket_code", "VARCHAR(50)")
+        ensure_column(cursor, "exhibition_bookings", "status", "ENUM('active', 'used', 'cancelled') DEFAULT 'active'")
+        ensure_index(cursor, "exhibition_bookings", "idx_bookings_ticket_code",
+                     "UNIQUE INDEX idx_bookings_ticket_code (ticket_code)")
+        ensure_index(cursor, "exhibition_bookings", "idx_bookings_exhibition_date",
+                     "INDEX idx_bookings_exhibition_date (exhibition_id, booking_date)")
+        ensure_index(cursor, "exhibition_bookings", "idx_bookings_status_date",
+                     "INDEX idx_bookings_status_date (status, booking_date)")
+        ensure_index(cursor, "exhibition_bookings", "idx_bookings_date",
+                     "INDEX idx_bookings_date (booking_date)")
+        
+        if backfill_occupancy:
+            # Count the bookings made before occupancy was tracked
+            print(f"Backfilled occupancy for {rebuild_occupancy(cursor)} exhibitions")
         connection.commit()
         print("Database initialized successfully")
         return True
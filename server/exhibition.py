@@ -1,74 +1,39 @@
 
 from database import get_db_connection, dict_from_row, json_dumps
 from auth import verify_token
+from media_store import save_image_from_base64
+from image_derivatives import get_image_variants, schedule_derivatives
+from catalog_events import publish, EXHIBITION, CREATED, UPDATED, DELETED
 import json
-import os
-import base64
-import time
 from decimal import Decimal
 
 # Default exhibition image path
 DEFAULT_EXHIBITION_IMAGE = "/static/uploads/default_exhibition.jpg"
 
-# Ensure uploads directory exists
-def ensure_uploads_directory():
-    """Create the uploads directory if it doesn't exist"""
-    uploads_dir = os.path.join(os.path.dirname(__file__), "static", "uploads")
-    if not os.path.exists(uploads_dir):
-        os.makedirs(uploads_dir)
-        print(f"Created directory: {uploads_dir}")
-
-# Call this function to ensure directory exists
-ensure_uploads_directory()
-
-# Function to handle image storage
-def save_image_from_base64(base64_str, name_prefix="exhibition"):
-    """Save a base64 image to the uploads directory and return the path"""
-    # Handle empty strings or None values
-    if not base64_str:
-        return None
-        
-    # If it's already a URL path (not base64), return it as is
-    if base64_str.startswith('/static/'):
-        return base64_str
+def format_exhibition(exhibition):
+    """Shape an exhibitions row the way the API returns it"""
+    # Convert id to string to match frontend expectations
+    exhibition['id'] = str(exhibition['id'])
     
-    try:
-        # Extract the image data from the base64 string
-        if "," in base64_str:
-            # For format like "data:image/jpeg;base64,/9j/4AAQSk..."
-            image_format, base64_data = base64_str.split(",", 1)
-            if ';base64' not in image_format:
-                print("Warning: Not a valid base64 image format")
-                return None
-        else:
-            # Assume it's just the base64 data
-            base64_data = base64_str
-        
-        # Decode the base64 data
-        try:
-            image_data = base64.b64decode(base64_data)
-        except Exception as e:
-            print(f"Failed to decode base64 data: {e}")
-            return DEFAULT_EXHIBITION_IMAGE
-        
-        # Generate a unique filename based on timestamp
-        timestamp = time.strftime("%Y%m%d%H%M%S")
-        filename = f"{name_prefix}_{timestamp}.jpg"
-        
-        # Save to the uploads directory
-        uploads_dir = os.path.join(os.path.dirname(__file__), "static", "uploads")
-        if not os.path.exists(uploads_dir):
-            os.makedirs(uploads_dir)
-            
-        file_path = os.path.join(uploads_dir, filename)
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-        
-        # Return the URL path to the image (ALWAYS use the standard format)
-        return f"/static/uploads/{filename}"
-    except Exception as e:
-        print(f"Error saving image: {e}")
-        return DEFAULT_EXHIBITION_IMAGE
+    # Convert dates to string format
+    exhibition['startDate'] = exhibition.pop('start_date').isoformat()
+    exhibition['endDate'] = exhibition.pop('end_date').isoformat()
+    
+    # Convert ticket_price to camelCase
+    exhibition['ticketPrice'] = exhibition.pop('ticket_price')
+    
+    # Convert image_url to camelCase and ensure it's valid. Inline base64
+    # images are passed through; migrate_images.py moves them to files.
+    image_url = exhibition.pop('image_url')
+    exhibition['imageUrl'] = image_url if image_url else DEFAULT_EXHIBITION_IMAGE
+    
+    # Resized WebP variants and blur placeholder, once generated
+    exhibition['imageVariants'] = get_image_variants(exhibition['imageUrl'])
+    
+    # Convert total_slots and available_slots to camelCase
+    exhibition['totalSlots'] = exhibition.pop('total_slots')
+    exhibition['availableSlots'] = exhibition.pop('available_slots')
+    return exhibition
 
 def get_all_exhibitions():
     """Get all exhibitions from the database"""
@@ -90,36 +55,7 @@ def get_all_exhibitions():
         
         exhibitions = []
         for row in rows:
-            exhibition = dict_from_row(row, cursor)
-            
-            # Convert id to string to match frontend expectations
-            exhibition['id'] = str(exhibition['id'])
-            
-            # Convert dates to string format
-            exhibition['startDate'] = exhibition.pop('start_date').isoformat()
-            exhibition['endDate'] = exhibition.pop('end_date').isoformat()
-            
-            # Convert ticket_price to camelCase
-            exhibition['ticketPrice'] = exhibition.pop('ticket_price')
-            
-            # Convert image_url to camelCase and ensure it's valid
-            image_url = exhibition.pop('image_url')
-            # Convert base64 images to file paths
-            if image_url and (image_url.startswith('data:') or 'base64' in image_url):
-                # Save the base64 image to a file and get its path
-                saved_path = save_image_from_base64(image_url)
-                exhibition['imageUrl'] = saved_path
-                # Also update the database with the new path
-                update_exhibition_image(exhibition['id'], saved_path)
-                print(f"Converted base64 image to file: {saved_path}")
-            else:
-                exhibition['imageUrl'] = image_url if image_url else DEFAULT_EXHIBITION_IMAGE
-            
-            # Convert total_slots and available_slots to camelCase
-            exhibition['totalSlots'] = exhibition.pop('total_slots')
-            exhibition['availableSlots'] = exhibition.pop('available_slots')
-            
-            exhibitions.append(exhibition)
+            exhibitions.append(format_exhibition(dict_from_row(row, cursor)))
         
         return {"exhibitions": exhibitions}
     except Exception as e:
@@ -130,33 +66,45 @@ def get_all_exhibitions():
             cursor.close()
             connection.close()
 
-def update_exhibition_image(exhibition_id, image_path):
-    """Update the image_url in the database for an exhibition"""
+def get_exhibition(exhibition_id):
+    """Get a specific exhibition by ID"""
     connection = get_db_connection()
     if connection is None:
-        return False
+        return {"error": "Database connection failed"}
     
     cursor = connection.cursor()
     
     try:
         query = """
-        UPDATE exhibitions
-        SET image_url = %s
+        SELECT id, title, description, location, start_date, end_date,
+               ticket_price, image_url, total_slots, available_slots, status
+        FROM exhibitions
         WHERE id = %s
         """
-        cursor.execute(query, (image_path, exhibition_id))
-        connection.commit()
-        return True
+        cursor.execute(query, (exhibition_id,))
+        row = cursor.fetchone()
+        
+        if not row:
+            return {"error": "Exhibition not found"}
+        
+        return format_exhibition(dict_from_row(row, cursor))
     except Exception as e:
-        print(f"Error updating exhibition image: {e}")
-        return False
+        print(f"Error getting exhibition: {e}")
+        return {"error": str(e)}
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-def get_exhibition(exhibition_id):
-    """Get a specific exhibition by ID"""
+def get_exhibitions_by_ids(exhibition_ids):
+    """Get several exhibitions in one query, in the order of exhibition_ids
+
+    Ids that no longer exist are skipped.
+    """
+    exhibition_ids = [int(exhibition_id) for exhibition_id in exhibition_ids]
+    if not exhibition_ids:
+        return {"exhibitions": []}
+    
     connection = get_db_connection()
     if connection is None:
         return {"error": "Database connection failed"}
@@ -164,50 +112,21 @@ def get_exhibition(exhibition_id):
     cursor = connection.cursor()
     
     try:
-        query = """
+        placeholders = ", ".join(["%s"] * len(exhibition_ids))
+        query = f"""
         SELECT id, title, description, location, start_date, end_date,
                ticket_price, image_url, total_slots, available_slots, status
         FROM exhibitions
-        WHERE id = %s
+        WHERE id IN ({placeholders})
         """
-        cursor.execute(query, (exhibition_id,))
-        row = cursor.fetchone()
-        
-        if not row:
-            return {"error": "Exhibition not found"}
-        
-        exhibition = dict_from_row(row, cursor)
+        cursor.execute(query, exhibition_ids)
+        by_id = {row[0]: row for row in cursor.fetchall()}
         
-        # Convert id to string to match frontend expectations
-        exhibition['id'] = str(exhibition['id'])
-        
-        # Convert dates to string format
-        exhibition['startDate'] = exhibition.pop('start_date').isoformat()
-        exhibition['endDate'] = exhibition.pop('end_date').isoformat()
-        
-        # Convert ticket_price to camelCase
-        exhibition['ticketPrice'] = exhibition.pop('ticket_price')
-        
-        # Convert image_url to camelCase and ensure it's valid
-        image_url = exhibition.pop('image_url')
-        # Convert base64 images to file paths
-        if image_url and (image_url.startswith('data:') or 'base64' in image_url):
-            # Save the base64 image to a file and get its path
-            saved_path = save_image_from_base64(image_url)
-            exhibition['imageUrl'] = saved_path
-            # Also update the database with the new path
-            update_exhibition_image(exhibition['id'], saved_path)
-            print(f"Converted base64 image to file: {saved_path}")
-        else:
-            exhibition['imageUrl'] = image_url if image_url else DEFAULT_EXHIBITION_IMAGE
-        
-        # Convert total_slots and available_slots to camelCase
-        exhibition['totalSlots'] = exhibition.pop('total_slots')
-        exhibition['availableSlots'] = exhibition.pop('available_slots')
-        
-        return exhibition
+        exhibitions = [format_exhibition(dict_from_row(by_id[exhibition_id], cursor))
+                       for exhibition_id in exhibition_ids if exhibition_id in by_id]
+        return {"exhibitions": exhibitions}
     except Exception as e:
-        print(f"Error getting exhibition: {e}")
+        print(f"Error getting exhibitions by id: {e}")
         return {"error": str(e)}
     finally:
         if connection.is_connected():
@@ -275,7 +194,7 @@ def create_exhibition(auth_header, exhibition_data):
         image_url = exhibition_data.get("imageUrl")
         if image_url and (image_url.startswith('data:') or 'base64' in image_url):
             # Save the image and get the file path
-            saved_image_path = save_image_from_base64(image_url)
+            saved_image_path = save_image_from_base64(image_url, DEFAULT_EXHIBITION_IMAGE)
             if saved_image_path:
                 image_url = saved_image_path
                 print(f"Image saved to: {saved_image_path}")
@@ -311,10 +230,16 @@ def create_exhibition(auth_header, exhibition_data):
         ))
         connection.commit()
         
+        # Resize off the request path so the first listing has the variants
+        schedule_derivatives(image_url)
+        
         # Return the newly created exhibition
         new_exhibition_id = cursor.lastrowid
         print(f"Exhibition created successfully with ID: {new_exhibition_id}")
-        return get_exhibition(new_exhibition_id)
+        exhibition = get_exhibition(new_exhibition_id)
+        if "error" not in exhibition:
+            publish(EXHIBITION, CREATED, new_exhibition_id, exhibition)
+        return exhibition
     except Exception as e:
         print(f"ERROR creating exhibition: {e}")
         return {"error": str(e)}
@@ -344,7 +269,7 @@ def update_exhibition(auth_header, exhibition_id, exhibition_data):
         image_url = exhibition_data.get("imageUrl")
         if image_url and (image_url.startswith('data:') or 'base64' in image_url):
             # Save the image and get the file path
-            saved_image_path = save_image_from_base64(image_url)
+            saved_image_path = save_image_from_base64(image_url, DEFAULT_EXHIBITION_IMAGE)
             if saved_image_path:
                 image_url = saved_image_path
                 print(f"Image saved to: {saved_image_path}")
@@ -381,8 +306,13 @@ def update_exhibition(auth_header, exhibition_id, exhibition_data):
         if cursor.rowcount == 0:
             return {"error": "Exhibition not found"}
         
+        schedule_derivatives(image_url)
+        
         # Return the updated exhibition
-        return get_exhibition(exhibition_id)
+        exhibition = get_exhibition(exhibition_id)
+        if "error" not in exhibition:
+            publish(EXHIBITION, UPDATED, exhibition_id, exhibition)
+        return exhibition
     except Exception as e:
         print(f"Error updating exhibition: {e}")
         return {"error": str(e)}
@@ -449,6 +379,7 @@ def delete_exhibition(auth_header, exhibition_id):
         cursor.execute("DELETE FROM exhibitions WHERE id = %s", (exhibition_id,))
         connection.commit()
         
+        publish(EXHIBITION, DELETED, exhibition_id)
         return {"success": True, "message": f"Exhibition with ID {exhibition_id} deleted successfully"}
     except Exception as e:
         print(f"Error deleting exhibition: {e}")
@@ -0,0 +1,276 @@
+import sys
+import json
+import bisect
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from database import get_db_connection
+from exhibition import get_exhibition, get_exhibitions_by_ids
+from catalog_index import CatalogIndex
+import catalog_events
+
+# Range returned by /exhibitions/calendar when to= is omitted, and the
+# longest range it accepts
+DEFAULT_CALENDAR_DAYS = 31
+MAX_CALENDAR_DAYS = 366
+
+# The status job runs just after midnight, and at least this often in case
+# the clock jumps or a run failed
+STATUS_JOB_INTERVAL_SECONDS = 60 * 60
+STATUS_JOB_DELAY_SECONDS = 5
+
+# Status of an exhibition on a day, the same rule in SQL and in Python
+STATUS_BY_DATE = """
+CASE WHEN end_date < %s THEN 'past'
+     WHEN start_date <= %s THEN 'ongoing'
+     ELSE 'upcoming' END
+"""
+
+_stop_event = threading.Event()
+_run_now = threading.Event()
+_job_thread = None
+
+# The interval index: exhibitions sorted by start date, with a segment tree
+# holding the latest end date under every node. A query skips every subtree
+# that ends before the range starts or begins after it ends, so it visits
+# O(log n) nodes plus one per result. There are few exhibitions, so every
+# change rebuilds the tree from _intervals.
+_index_lock = threading.Lock()
+_snapshot = {"starts": [], "ends": [], "ids": [], "size": 0, "max_ends": []}
+# exhibition id -> (start, end), the source of every rebuild
+_intervals = {}
+
+def status_on(start_date, end_date, day):
+    if end_date < day:
+        return "past"
+    if start_date <= day:
+        return "ongoing"
+    return "upcoming"
+
+def _rebuild():
+    # Caller holds _index_lock
+    global _snapshot
+    items = sorted((start, end, exhibition_id) for exhibition_id, (start, end) in _intervals.items())
+    size = 1
+    while size < len(items):
+        size *= 2
+    max_ends = [date.min] * (2 * size)
+    for position, (_, end, _) in enumerate(items):
+        max_ends[size + position] = end
+    for node in range(size - 1, 0, -1):
+        max_ends[node] = max(max_ends[2 * node], max_ends[2 * node + 1])
+    _snapshot = {
+        "starts": [item[0] for item in items],
+        "ends": [item[1] for item in items],
+        "ids": [item[2] for item in items],
+        "size": size,
+        "max_ends": max_ends,
+    }
+
+def find_overlapping(first_day, last_day):
+    """Ids of exhibitions open on any day of [first_day, last_day], by start date"""
+    snapshot = _snapshot
+    if not snapshot["ids"]:
+        return []
+    # Only exhibitions starting by last_day can overlap
+    limit = bisect.bisect_right(snapshot["starts"], last_day)
+    max_ends, size = snapshot["max_ends"], snapshot["size"]
+
+    found = []
+    # (node, first position, end position) of the subtrees left to visit
+    pending = [(1, 0, size)]
+    while pending:
+        node, low, high = pending.pop()
+        if low >= limit or max_ends[node] < first_day:
+            continue
+        if node >= size:
+            found.append(low)
+            continue
+        middle = (low + high) // 2
+        # Right child first, so positions come off the stack in order
+        pending.append((2 * node + 1, middle, high))
+        pending.append((2 * node, low, middle))
+    return [snapshot["ids"][position] for position in found]
+
+def load_calendar_index():
+    """Index the dates of every exhibition"""
+    connection = get_db_connection()
+    if connection is None:
+        print("Error loading exhibition calendar: Database connection failed")
+        return False
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute("SELECT id, start_date, end_date FROM exhibitions")
+        rows = cursor.fetchall()
+    except Exception as e:
+        print(f"Error loading exhibition calendar: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    with _index_lock:
+        _intervals.clear()
+        for exhibition_id, start_date, end_date in rows:
+            _intervals[str(exhibition_id)] = (start_date, end_date)
+        _rebuild()
+
+    print(f"Loaded calendar of {len(rows)} exhibitions")
+    return True
+
+def _parse_day(value, name):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a date like 2025-04-19")
+
+def get_exhibition_calendar(first_day=None, last_day=None):
+    """Handle /exhibitions/calendar?from=&to=: exhibitions open in a date range"""
+    try:
+        first = _parse_day(first_day, "from") if first_day else date.today()
+        last = _parse_day(last_day, "to") if last_day else first + timedelta(days=DEFAULT_CALENDAR_DAYS - 1)
+    except ValueError as e:
+        return {"error": str(e)}
+    if last < first:
+        return {"error": "to must not be before from"}
+    if (last - first).days >= MAX_CALENDAR_DAYS:
+        return {"error": f"The range can span at most {MAX_CALENDAR_DAYS} days"}
+
+    _index.ensure_loaded()
+    result = get_exhibitions_by_ids(find_overlapping(first, last))
+    if "error" in result:
+        return result
+    return {"from": first.isoformat(), "to": last.isoformat(), "exhibitions": result["exhibitions"]}
+
+def get_exhibitions_on(day=None):
+    """Handle /exhibitions/on?date=: exhibitions open on one day (default today)"""
+    try:
+        day = _parse_day(day, "date") if day else date.today()
+    except ValueError as e:
+        return {"error": str(e)}
+
+    _index.ensure_loaded()
+    result = get_exhibitions_by_ids(find_overlapping(day, day))
+    if "error" in result:
+        return result
+    return {"date": day.isoformat(), "exhibitions": result["exhibitions"]}
+
+def update_exhibition_statuses(today=None):
+    """Set the status of every exhibition from its dates; returns the changed ids
+
+    Rows already right are not written. Changed exhibitions are published as
+    updates so the other catalog indexes see the new status.
+    """
+    today = today or date.today()
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError("Database connection failed")
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(
+            f"SELECT id FROM exhibitions WHERE status <> {STATUS_BY_DATE}",
+            (today, today)
+        )
+        changed = [row[0] for row in cursor.fetchall()]
+        if changed:
+            placeholders = ", ".join(["%s"] * len(changed))
+            cursor.execute(
+                f"UPDATE exhibitions SET status = {STATUS_BY_DATE} WHERE id IN ({placeholders})",
+                [today, today] + changed
+            )
+            connection.commit()
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    for exhibition_id in changed:
+        exhibition = get_exhibition(exhibition_id)
+        if "error" not in exhibition:
+            catalog_events.publish(catalog_events.EXHIBITION, catalog_events.UPDATED, exhibition_id, exhibition)
+    if changed:
+        print(f"Updated the status of {len(changed)} exhibitions for {today.isoformat()}")
+    return [str(exhibition_id) for exhibition_id in changed]
+
+def _seconds_until_tomorrow():
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - now).total_seconds() + STATUS_JOB_DELAY_SECONDS
+
+def _run_status_job():
+    while not _stop_event.is_set():
+        _run_now.clear()
+        try:
+            update_exhibition_statuses()
+        except Exception as e:
+            print(f"Error updating exhibition statuses: {e}")
+        _run_now.wait(min(_seconds_until_tomorrow(), STATUS_JOB_INTERVAL_SECONDS))
+
+def _on_catalog_change(kind, action, item_id, item):
+    if kind != catalog_events.EXHIBITION:
+        return
+    with _index_lock:
+        if action == catalog_events.DELETED:
+            _intervals.pop(item_id, None)
+        elif item and action in (catalog_events.CREATED, catalog_events.UPDATED):
+            start = _parse_day(item["startDate"], "startDate")
+            end = _parse_day(item["endDate"], "endDate")
+            _intervals[item_id] = (start, end)
+            if item.get("status") != status_on(start, end, date.today()):
+                # Saved with a status its dates contradict
+                _run_now.set()
+        else:
+            return
+        _rebuild()
+
+_index = CatalogIndex(load_calendar_index, _on_catalog_change)
+
+def start_exhibition_calendar():
+    """Load the calendar index and start the daily status job"""
+    global _job_thread
+    _index.start()
+
+    if _job_thread and _job_thread.is_alive():
+        return _job_thread
+
+    _stop_event.clear()
+    _job_thread = threading.Thread(target=_run_status_job, name="exhibition-status-job", daemon=True)
+    _job_thread.start()
+    print("Exhibition status job started")
+    return _job_thread
+
+def stop_exhibition_calendar():
+    """Signal the exhibition status job to stop"""
+    _index.stop()
+    _stop_event.set()
+    _run_now.set()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exhibition calendar and status job")
+    subparsers = parser.add_subparsers(dest="command")
+
+    status_parser = subparsers.add_parser("update-statuses", help="Set every exhibition's status from its dates")
+    status_parser.add_argument("--date", help="Day to compute the statuses for (default today)")
+    calendar_parser = subparsers.add_parser("calendar", help="Exhibitions open in a date range")
+    calendar_parser.add_argument("--from", dest="first_day")
+    calendar_parser.add_argument("--to", dest="last_day")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "update-statuses":
+            changed = update_exhibition_statuses(_parse_day(args.date, "date") if args.date else None)
+            print(f"{len(changed)} exhibitions changed status")
+        elif args.command == "calendar":
+            print(json.dumps(get_exhibition_calendar(args.first_day, args.last_day), indent=2, default=str))
+        else:
+            parser.print_help()
+            sys.exit(1)
+    except (RuntimeError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
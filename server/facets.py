@@ -0,0 +1,213 @@
+import json
+import argparse
+import threading
+from database import get_db_connection, dict_from_row
+from catalog_index import CatalogIndex
+import catalog_events
+
+# Facets of the artwork catalog, in the order they are returned
+FACETS = ("medium", "status", "price", "decade", "artist")
+
+# Upper edges (KES) of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = (10000, 25000, 50000, 100000, 250000)
+
+# Value of the decade facet for artworks without a year
+UNKNOWN_DECADE = "unknown"
+
+# Bitmaps are Python ints with one bit per artwork slot; int.bit_count is
+# much faster than counting the characters of bin() where available
+_popcount = getattr(int, "bit_count", None) or (lambda bitmap: bin(bitmap).count("1"))
+
+# Bitmaps are changed in place; counts and updates hold _index_lock
+_index_lock = threading.Lock()
+# facet -> value -> bitmap of the artworks with that value
+_bitmaps = {facet: {} for facet in FACETS}
+# artwork id -> (slot, {facet: value}); slots of deleted artworks are reused
+_artworks = {}
+_free_slots = []
+_next_slot = 0
+# Bitmap of every slot in use
+_all = 0
+
+def price_bucket(price):
+    price = float(price or 0)
+    lower = 0
+    for edge in PRICE_BUCKETS:
+        if price <= edge:
+            return f"{lower}-{edge}"
+        lower = edge
+    return f"{lower}+"
+
+def facet_values(artwork):
+    """The value of every facet for an artwork row or API record"""
+    year = artwork.get("year")
+    return {
+        "medium": (artwork.get("medium") or "").strip() or None,
+        "status": artwork.get("status") or "available",
+        "price": price_bucket(artwork.get("price")),
+        "decade": f"{int(year) // 10 * 10}s" if year else UNKNOWN_DECADE,
+        "artist": (artwork.get("artist") or "").strip() or None,
+    }
+
+def _clear(slot, values):
+    # Caller holds _index_lock
+    global _all
+    bit = 1 << slot
+    for facet, value in values.items():
+        bitmaps = _bitmaps[facet]
+        if value in bitmaps:
+            bitmaps[value] &= ~bit
+            if not bitmaps[value]:
+                del bitmaps[value]
+    _all &= ~bit
+
+def _set(slot, values):
+    # Caller holds _index_lock
+    global _all
+    bit = 1 << slot
+    for facet, value in values.items():
+        if value is not None:
+            _bitmaps[facet][value] = _bitmaps[facet].get(value, 0) | bit
+    _all |= bit
+
+def _set_artwork(artwork_id, values):
+    """Insert or replace an artwork; values None removes it"""
+    # Caller holds _index_lock
+    global _next_slot
+    current = _artworks.pop(artwork_id, None)
+    if current is not None:
+        slot = current[0]
+        _clear(slot, current[1])
+        if values is None:
+            _free_slots.append(slot)
+            return
+    elif values is None:
+        return
+    else:
+        if _free_slots:
+            slot = _free_slots.pop()
+        else:
+            slot = _next_slot
+            _next_slot += 1
+    _artworks[artwork_id] = (slot, values)
+    _set(slot, values)
+
+def load_facet_index():
+    """Build the bitmaps of every artwork"""
+    global _next_slot, _all
+    connection = get_db_connection()
+    if connection is None:
+        print("Error loading facet index: Database connection failed")
+        return False
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute("SELECT id, medium, status, price, year, artist FROM artworks ORDER BY id")
+        rows = [dict_from_row(row, cursor) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error loading facet index: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    with _index_lock:
+        for bitmaps in _bitmaps.values():
+            bitmaps.clear()
+        _artworks.clear()
+        del _free_slots[:]
+        _next_slot = 0
+        _all = 0
+        for row in rows:
+            _set_artwork(str(row["id"]), facet_values(row))
+
+    print(f"Loaded facet index of {len(rows)} artworks")
+    return True
+
+def count_facets(selected):
+    """Counts of every facet value among the artworks matching the selection
+
+    selected maps a facet to the values chosen in it. Values of one facet are
+    alternatives (OR) and facets narrow each other (AND). Each facet is counted
+    against the other facets' selections, so its own alternatives keep their
+    counts. Returns (total, {facet: {value: count}}).
+    """
+    with _index_lock:
+        # One bitmap per facet: the union of its selected values
+        masks = {}
+        for facet, values in selected.items():
+            mask = 0
+            for value in values:
+                mask |= _bitmaps[facet].get(value, 0)
+            masks[facet] = mask
+
+        matching = _all
+        for mask in masks.values():
+            matching &= mask
+
+        counts = {}
+        for facet in FACETS:
+            base = _all
+            for other, mask in masks.items():
+                if other != facet:
+                    base &= mask
+            counts[facet] = {value: _popcount(bitmap & base) for value, bitmap in _bitmaps[facet].items()}
+    return _popcount(matching), counts
+
+def get_artwork_facets(query_params):
+    """Handle /artworks/facets: counts per facet value for the selected filters
+
+    query_params is a parse_qs dict; a facet may be given several times.
+    """
+    _index.ensure_loaded()
+    selected = {}
+    for facet in FACETS:
+        values = [value for value in query_params.get(facet) or () if value]
+        if values:
+            selected[facet] = values
+    total, counts = count_facets(selected)
+
+    facets = {}
+    for facet in FACETS:
+        values = [{"value": value, "count": count, "selected": value in selected.get(facet, ())}
+                  for value, count in counts[facet].items()]
+        # Price buckets keep their order, other values go by count
+        if facet == "price":
+            values.sort(key=lambda item: float(item["value"].split("-")[0].rstrip("+")))
+        else:
+            values.sort(key=lambda item: (-item["count"], item["value"]))
+        facets[facet] = values
+    return {"total": total, "selected": selected, "facets": facets}
+
+def _on_catalog_change(kind, action, item_id, item):
+    if kind != catalog_events.ARTWORK:
+        return
+    with _index_lock:
+        if action == catalog_events.DELETED:
+            _set_artwork(item_id, None)
+        elif action == catalog_events.SOLD:
+            current = _artworks.get(item_id)
+            if current is not None:
+                _set_artwork(item_id, {**current[1], "status": "sold"})
+        elif item and action in (catalog_events.CREATED, catalog_events.UPDATED):
+            _set_artwork(item_id, facet_values(item))
+
+_index = CatalogIndex(load_facet_index, _on_catalog_change)
+
+def start_facet_index():
+    """Build the facet bitmaps and keep them current as the catalog changes"""
+    _index.start()
+
+def stop_facet_index():
+    _index.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count artworks per facet value")
+    for facet in FACETS:
+        parser.add_argument(f"--{facet}", action="append", help=f"Select a {facet} (repeatable)")
+    args = parser.parse_args()
+
+    _index.load_or_exit()
+    print(json.dumps(get_artwork_facets({facet: getattr(args, facet) for facet in FACETS}), indent=2))
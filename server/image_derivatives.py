@@ -0,0 +1,221 @@
+import os
+import io
+import json
+import base64
+import hashlib
+from concurrent.futures.process import BrokenProcessPool
+from media_store import is_media_url, media_url_to_path
+from worker_pool import WorkerPool
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    print("Warning: Pillow is not installed, images will be served at full size only")
+
+# Resized WebP variants live under the static path, sharded like the originals
+DERIVATIVES_DIR = os.path.join(os.path.dirname(__file__), "static", "derivatives")
+DERIVATIVES_URL = "/static/derivatives"
+
+# Bump when the output changes so old variants are regenerated
+DERIVATIVES_VERSION = 1
+
+# Widths generated for every image; ?w= requests are rounded up to one of these
+VARIANT_WIDTHS = (320, 640, 1280)
+WEBP_QUALITY = 80
+
+# The blur placeholder is this wide and is inlined in the JSON as a data URL
+PLACEHOLDER_WIDTH = 16
+
+# Worker processes decoding and resizing images
+DERIVATIVE_WORKERS = min(4, os.cpu_count() or 1)
+
+_pool = WorkerPool(DERIVATIVE_WORKERS)
+# key -> Future for images being processed, so concurrent requests share one
+# job; guarded by _pool.lock
+_in_flight = {}
+# key -> manifest of images whose variants are on disk
+_manifests = {}
+# Keys of images that could not be decoded; a marker file next to where the
+# manifest would be keeps them from being resubmitted after a restart
+_failed = set()
+
+def get_image_key(url):
+    """Stable key of an uploaded image; the content hash for media-store files"""
+    name = url.split("?", 1)[0].rsplit("/", 1)[-1]
+    stem = name.rsplit(".", 1)[0]
+    if len(stem) == 64 and all(c in "0123456789abcdef" for c in stem):
+        return stem
+    # Older uploads have names like artwork_<timestamp>.jpg
+    return hashlib.sha256(url.encode()).hexdigest()
+
+def _variant_path(key, name):
+    return os.path.join(DERIVATIVES_DIR, key[:2], key[2:4], f"{key}_v{DERIVATIVES_VERSION}_{name}")
+
+def _variant_url(key, name):
+    return f"{DERIVATIVES_URL}/{key[:2]}/{key[2:4]}/{key}_v{DERIVATIVES_VERSION}_{name}"
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def _encode_webp(image, width):
+    resized = image.copy()
+    resized.thumbnail((width, width * 4), Image.LANCZOS)
+    buffer = io.BytesIO()
+    resized.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+def _generate(source_path, key):
+    """Worker process entry point: write every variant and the manifest"""
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        width, height = image.size
+
+        variants = {}
+        for variant_width in VARIANT_WIDTHS:
+            if variant_width >= width and variants:
+                # Never upscale; the original is the largest variant
+                break
+            name = f"{variant_width}.webp"
+            _write_atomic(_variant_path(key, name), _encode_webp(image, min(variant_width, width)))
+            variants[str(min(variant_width, width))] = _variant_url(key, name)
+
+        placeholder = image.copy()
+        placeholder.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4))
+        buffer = io.BytesIO()
+        placeholder.save(buffer, "WEBP", quality=30)
+
+    manifest = {
+        "width": width,
+        "height": height,
+        "variants": variants,
+        "placeholder": "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode(),
+    }
+    # Written last, so a manifest on disk means every variant is there
+    _write_atomic(_variant_path(key, "manifest.json"), json.dumps(manifest).encode())
+    return manifest
+
+def _load_manifest(key):
+    manifest = _manifests.get(key)
+    if manifest is None:
+        try:
+            with open(_variant_path(key, "manifest.json")) as f:
+                manifest = _manifests[key] = json.load(f)
+        except (OSError, ValueError):
+            return None
+    return manifest
+
+def _has_failed(key):
+    if key in _failed:
+        return True
+    if os.path.exists(_variant_path(key, "failed.json")):
+        _failed.add(key)
+        return True
+    return False
+
+def _record_failure(key, error):
+    _failed.add(key)
+    try:
+        _write_atomic(_variant_path(key, "failed.json"), json.dumps({"error": str(error)[:500]}).encode())
+    except OSError as e:
+        print(f"Error recording failed variants of {key}: {e}")
+
+def _source_path(url):
+    if not url or not url.startswith("/static/uploads/"):
+        return None
+    path = media_url_to_path(url)
+    return path if os.path.isfile(path) else None
+
+def schedule_derivatives(url):
+    """Queue variant generation for an uploaded image; returns a Future or None
+
+    Does nothing if Pillow is missing, the URL is not an upload, the
+    variants already exist, or the image has failed to process before.
+    """
+    if Image is None:
+        return None
+    source_path = _source_path(url)
+    if source_path is None or source_path.endswith(".svg"):
+        return None
+
+    key = get_image_key(url)
+    if _load_manifest(key) is not None or _has_failed(key):
+        return None
+
+    with _pool.lock:
+        future = _in_flight.get(key)
+        if future is None:
+            future = _pool.submit(_generate, source_path, key)
+            _in_flight[key] = future
+
+            def done(finished, key=key):
+                _in_flight.pop(key, None)
+                error = finished.exception()
+                if error is None:
+                    _manifests[key] = finished.result()
+                    return
+                print(f"Error generating variants for {url}: {error}")
+                if not isinstance(error, BrokenProcessPool):
+                    # The image itself is at fault; a crashed pool is retried
+                    _record_failure(key, error)
+            future.add_done_callback(done)
+    return future
+
+def get_image_variants(url):
+    """Responsive variants of an image for the API, or None until they exist
+
+    Shaped as {"width", "height", "srcset", "variants", "placeholder"}. A
+    missing set is queued for generation, so the next response has it.
+    """
+    if Image is None or not is_media_url(url):
+        return None
+    manifest = _load_manifest(get_image_key(url))
+    if manifest is None:
+        schedule_derivatives(url)
+        return None
+    return {
+        "width": manifest["width"],
+        "height": manifest["height"],
+        "srcset": ", ".join(f"{variant_url} {width}w" for width, variant_url in manifest["variants"].items()),
+        "variants": manifest["variants"],
+        "placeholder": manifest["placeholder"],
+    }
+
+def get_variant_path(url, width):
+    """File of the smallest variant at least width pixels wide, or None
+
+    An image not processed yet is queued and None returned at once; callers
+    serve the original when this returns None.
+    """
+    if Image is None or not is_media_url(url):
+        return None
+    try:
+        width = int(width)
+    except (TypeError, ValueError):
+        return None
+
+    key = get_image_key(url)
+    manifest = _load_manifest(key)
+    if manifest is None:
+        schedule_derivatives(url)
+        return None
+
+    for variant_width, variant_url in sorted(manifest["variants"].items(), key=lambda item: int(item[0])):
+        if int(variant_width) >= width:
+            return os.path.join(os.path.dirname(__file__), variant_url.lstrip("/"))
+    # Wider than every variant: the original is the best there is
+    return None
+
+def forget_variants(key):
+    """Drop the cached manifest or failure of an image whose variants were deleted"""
+    _manifests.pop(key, None)
+    _failed.discard(key)
+
+def stop_derivative_workers():
+    """Shut down the derivative worker processes"""
+    _pool.stop()
@@ -0,0 +1,393 @@
+import os
+import sys
+import json
+import argparse
+import threading
+from database import get_db_connection
+from media_store import is_media_url, media_url_to_path
+from artwork import get_artworks_by_ids
+from catalog_index import CatalogIndex
+from worker_pool import WorkerPool
+import catalog_events
+
+try:
+    import numpy as np
+    from PIL import Image, ImageOps
+except ImportError:
+    np = None
+    print("Warning: NumPy or Pillow is not installed, colour search is disabled")
+
+# Images are shrunk to at most this many pixels a side before analysis;
+# colour statistics barely change and the work drops by orders of magnitude
+FEATURE_SAMPLE_SIZE = 64
+
+# Levels per RGB channel of the colour histogram (8 -> 512 bins)
+HISTOGRAM_LEVELS = 8
+
+# Dominant colours found per image by k-means
+PALETTE_SIZE = 5
+KMEANS_ITERATIONS = 12
+
+# How far (in RGB units) a pixel may be from a searched colour and still count
+COLOR_MATCH_SIGMA = 48.0
+
+DEFAULT_SEARCH_LIMIT = 24
+MAX_SEARCH_LIMIT = 100
+
+# Worker processes extracting features; decoding and k-means are CPU bound
+FEATURE_WORKERS = min(2, os.cpu_count() or 1)
+
+# Names accepted by ?color= besides hex values
+COLOR_NAMES = {
+    "black": "#000000", "white": "#ffffff", "grey": "#808080", "gray": "#808080",
+    "red": "#c0392b", "orange": "#e67e22", "yellow": "#f1c40f", "green": "#27ae60",
+    "teal": "#16a085", "blue": "#2e6fd8", "purple": "#8e44ad", "pink": "#e84393",
+    "brown": "#8b5a2b", "beige": "#e8d8b8", "gold": "#d4af37",
+}
+
+_pool = WorkerPool(FEATURE_WORKERS)
+# artwork_id -> image_url being processed, so an image is queued once;
+# guarded by _pool.lock
+_in_flight = {}
+
+# One histogram row per analysed artwork, in the order of ids
+_index_lock = threading.Lock()
+_snapshot = {"ids": [], "positions": {}, "image_urls": [], "histograms": None, "palettes": []}
+_bin_centres = None
+
+def get_bin_centres():
+    """RGB centre of every histogram bin, in bin order"""
+    global _bin_centres
+    if _bin_centres is not None:
+        return _bin_centres
+    step = 256 / HISTOGRAM_LEVELS
+    levels = np.arange(HISTOGRAM_LEVELS) * step + step / 2
+    r, g, b = np.meshgrid(levels, levels, levels, indexing="ij")
+    _bin_centres = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1).astype(np.float32)
+    return _bin_centres
+
+def _dominant_colors(pixels):
+    """k-means over the pixels; returns [{"color": "#rrggbb", "weight"}] by weight"""
+    unique = np.unique(pixels, axis=0)
+    k = min(PALETTE_SIZE, len(unique))
+    # Seeded, so the same image always gets the same palette
+    rng = np.random.default_rng(0)
+    centroids = unique[rng.choice(len(unique), k, replace=False)].astype(np.float32)
+
+    for _ in range(KMEANS_ITERATIONS):
+        distances = ((pixels[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, pixels)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+
+    labels = ((pixels[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    counts = np.bincount(labels, minlength=k)
+    weights = counts / counts.sum()
+    return [
+        {"color": "#%02x%02x%02x" % tuple(int(round(float(v))) for v in centroids[i]),
+         "weight": round(float(weights[i]), 4)}
+        for i in np.argsort(-weights) if counts[i]
+    ]
+
+def extract_features(source_path):
+    """Worker process entry point: colour histogram bytes and palette of an image"""
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((FEATURE_SAMPLE_SIZE, FEATURE_SAMPLE_SIZE))
+        pixels = np.asarray(image, dtype=np.float32).reshape(-1, 3)
+
+    levels = HISTOGRAM_LEVELS
+    bins = np.minimum((pixels * levels / 256).astype(np.int32), levels - 1)
+    index = (bins[:, 0] * levels + bins[:, 1]) * levels + bins[:, 2]
+    histogram = np.bincount(index, minlength=levels ** 3).astype(np.float32)
+    histogram /= histogram.sum()
+    return histogram.tobytes(), _dominant_colors(pixels)
+
+def save_features(artwork_id, image_url, histogram, palette):
+    """Store the features of an artwork image"""
+    connection = get_db_connection()
+    if connection is None:
+        return False
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        INSERT INTO artwork_features (artwork_id, image_url, histogram, palette)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE image_url = VALUES(image_url),
+            histogram = VALUES(histogram), palette = VALUES(palette)
+        """
+        cursor.execute(query, (int(artwork_id), image_url, histogram, json.dumps(palette)))
+        connection.commit()
+        return True
+    except Exception as e:
+        # The artwork may have been deleted meanwhile (foreign key)
+        print(f"Error saving features of artwork {artwork_id}: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def _set_features(artwork_id, image_url, histogram, palette):
+    """Insert or replace one artwork in the feature matrix"""
+    vector = np.frombuffer(histogram, dtype=np.float32)
+    with _index_lock:
+        ids = list(_snapshot["ids"])
+        image_urls = list(_snapshot["image_urls"])
+        palettes = list(_snapshot["palettes"])
+        histograms = _snapshot["histograms"]
+        position = _snapshot["positions"].get(artwork_id)
+        if position is not None:
+            histograms = histograms.copy()
+            histograms[position] = vector
+            image_urls[position] = image_url
+            palettes[position] = palette
+        else:
+            ids.append(artwork_id)
+            image_urls.append(image_url)
+            palettes.append(palette)
+            histograms = vector[None, :] if histograms is None else np.vstack([histograms, vector])
+        _replace_snapshot(ids, image_urls, histograms, palettes)
+
+def _remove_features(artwork_id):
+    with _index_lock:
+        ids = _snapshot["ids"]
+        position = _snapshot["positions"].get(artwork_id)
+        if position is None:
+            return
+        keep = [i for i in range(len(ids)) if i != position]
+        _replace_snapshot(
+            [ids[i] for i in keep],
+            [_snapshot["image_urls"][i] for i in keep],
+            _snapshot["histograms"][keep] if keep else None,
+            [_snapshot["palettes"][i] for i in keep],
+        )
+
+def _replace_snapshot(ids, image_urls, histograms, palettes):
+    # Caller holds _index_lock
+    global _snapshot
+    _snapshot = {
+        "ids": ids,
+        "positions": {artwork_id: position for position, artwork_id in enumerate(ids)},
+        "image_urls": image_urls,
+        "histograms": histograms,
+        "palettes": palettes,
+    }
+
+def get_palette(artwork_id):
+    """Dominant colours of an artwork, or None if not analysed yet"""
+    snapshot = _snapshot
+    position = snapshot["positions"].get(str(artwork_id))
+    return None if position is None else snapshot["palettes"][position]
+
+def load_feature_index():
+    """Load every stored feature vector whose image is still current"""
+    if np is None:
+        return False
+
+    connection = get_db_connection()
+    if connection is None:
+        print("Error loading feature index: Database connection failed")
+        return False
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT f.artwork_id, f.image_url, f.histogram, f.palette
+        FROM artwork_features f
+        JOIN artworks a ON a.id = f.artwork_id AND a.image_url = f.image_url
+        """
+        cursor.execute(query)
+        rows = cursor.fetchall()
+    except Exception as e:
+        print(f"Error loading feature index: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    ids = [str(row[0]) for row in rows]
+    histograms = np.vstack([np.frombuffer(bytes(row[2]), dtype=np.float32) for row in rows]) if rows else None
+    with _index_lock:
+        _replace_snapshot(ids, [row[1] for row in rows], histograms, [json.loads(row[3]) for row in rows])
+
+    print(f"Loaded colour features of {len(rows)} artworks")
+    return True
+
+def schedule_features(artwork_id, image_url):
+    """Queue feature extraction for an artwork image; returns a Future or None"""
+    if np is None or not is_media_url(image_url) or image_url.endswith(".svg"):
+        return None
+    source_path = media_url_to_path(image_url)
+    if not os.path.isfile(source_path):
+        return None
+
+    artwork_id = str(artwork_id)
+    with _pool.lock:
+        if _in_flight.get(artwork_id) == image_url:
+            return None
+        _in_flight[artwork_id] = image_url
+        future = _pool.submit(extract_features, source_path)
+
+    def done(finished):
+        with _pool.lock:
+            if _in_flight.get(artwork_id) == image_url:
+                del _in_flight[artwork_id]
+        if finished.exception() is not None:
+            print(f"Error extracting features of artwork {artwork_id}: {finished.exception()}")
+            return
+        histogram, palette = finished.result()
+        if save_features(artwork_id, image_url, histogram, palette):
+            _set_features(artwork_id, image_url, histogram, palette)
+
+    future.add_done_callback(done)
+    return future
+
+def backfill_features():
+    """Queue every artwork whose features are missing or for an older image"""
+    if np is None:
+        return 0
+
+    connection = get_db_connection()
+    if connection is None:
+        return 0
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT a.id, a.image_url FROM artworks a
+        LEFT JOIN artwork_features f ON f.artwork_id = a.id
+        WHERE f.artwork_id IS NULL OR f.image_url <> a.image_url
+        """
+        cursor.execute(query)
+        rows = cursor.fetchall()
+    except Exception as e:
+        print(f"Error finding artworks without features: {e}")
+        return 0
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    return sum(1 for artwork_id, image_url in rows if schedule_features(artwork_id, image_url))
+
+def _on_catalog_change(kind, action, item_id, item):
+    if kind != catalog_events.ARTWORK:
+        return
+    if action == catalog_events.DELETED:
+        _remove_features(item_id)
+    elif item and action in (catalog_events.CREATED, catalog_events.UPDATED):
+        snapshot = _snapshot
+        position = snapshot["positions"].get(item_id)
+        if position is not None and snapshot["image_urls"][position] == item.get("image_url"):
+            return
+        schedule_features(item_id, item.get("image_url"))
+
+def parse_color(value):
+    """An (r, g, b) tuple from "#rrggbb", "rrggbb", "#rgb" or a colour name"""
+    value = COLOR_NAMES.get(value.strip().lower(), value.strip())
+    value = value.lstrip("#")
+    if len(value) == 3:
+        value = "".join(c * 2 for c in value)
+    if len(value) != 6:
+        raise ValueError(f"Invalid colour: {value}")
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+def search_by_color(colors, limit=DEFAULT_SEARCH_LIMIT):
+    """Artwork ids ranked by how much of each image is close to the colours
+
+    The query colours become soft kernels over the histogram bins, so one
+    matrix product scores every artwork at once; with several colours an
+    artwork must contain all of them to rank high (geometric mean). Returns
+    [(artwork_id, score)] best first.
+    """
+    snapshot = _snapshot
+    histograms = snapshot["histograms"]
+    if histograms is None:
+        return []
+
+    centres = get_bin_centres()
+    targets = np.asarray(colors, dtype=np.float32)
+    distances = ((centres[:, None, :] - targets[None, :, :]) ** 2).sum(axis=2)
+    kernels = np.exp(-distances / (2 * COLOR_MATCH_SIGMA ** 2))
+
+    # (artworks x bins) @ (bins x colours): share of each image near each colour
+    scores = histograms @ kernels
+    combined = np.exp(np.log(np.maximum(scores, 1e-9)).mean(axis=1))
+
+    limit = min(limit, len(combined))
+    top = np.argpartition(-combined, limit - 1)[:limit]
+    top = top[np.argsort(-combined[top])]
+    return [(snapshot["ids"][i], float(combined[i])) for i in top]
+
+def search_artworks_by_color(color_query, limit=DEFAULT_SEARCH_LIMIT):
+    """Handle /artworks/search?color=: artworks best matching a list of colours"""
+    if np is None:
+        return {"error": "Colour search is not available"}
+    if not color_query:
+        return {"error": "At least one colour is required"}
+    try:
+        colors = [parse_color(value) for value in color_query.split(",") if value.strip()]
+        limit = min(MAX_SEARCH_LIMIT, max(1, int(limit)))
+    except ValueError as e:
+        return {"error": str(e)}
+    if not colors:
+        return {"error": "At least one colour is required"}
+
+    _index.ensure_loaded()
+    matches = search_by_color(colors, limit)
+    result = get_artworks_by_ids([artwork_id for artwork_id, _ in matches])
+    if "error" in result:
+        return result
+
+    scores = dict(matches)
+    for artwork in result["artworks"]:
+        artwork["color_score"] = round(scores[artwork["id"]], 4)
+        artwork["palette"] = get_palette(artwork["id"])
+    return result
+
+_index = CatalogIndex(load_feature_index, _on_catalog_change)
+
+def start_feature_index():
+    """Load the feature matrix, keep it current and analyse missing images"""
+    if np is None:
+        return
+    _index.start()
+    queued = backfill_features()
+    if queued:
+        print(f"Queued colour feature extraction for {queued} artworks")
+
+def stop_feature_workers():
+    """Shut down the feature extraction worker processes"""
+    _index.stop()
+    _pool.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract colour features of artwork images")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("backfill", help="Analyse every artwork without current features")
+    search_parser = subparsers.add_parser("search", help="Search artworks by colour")
+    search_parser.add_argument("color", help="Comma-separated colours, e.g. #1e3a8a,gold")
+
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit(1)
+    if args.command == "backfill":
+        queued = backfill_features()
+        print(f"Analysing {queued} artworks...")
+        _pool.stop(wait=True)
+    elif args.command == "search":
+        print(json.dumps(search_artworks_by_color(args.color), indent=2, default=str))
+    else:
+        parser.print_help()
+        sys.exit(1)
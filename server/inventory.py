@@ -0,0 +1,85 @@
+import time
+import random
+from mysql.connector import Error
+from database import get_db_connection
+
+# MySQL error codes worth retrying: deadlock found, lock wait timeout
+RETRYABLE_ERROR_CODES = (1213, 1205)
+
+# Attempts for a transaction that keeps hitting deadlocks
+MAX_ATTEMPTS = 5
+
+# First retry waits around this long; each further retry doubles it
+BASE_BACKOFF_SECONDS = 0.05
+
+# Most tickets one booking may take; larger groups book several times
+MAX_SLOTS_PER_BOOKING = 50
+
+def run_in_transaction(operation, max_attempts=MAX_ATTEMPTS):
+    """Run operation(cursor) in one transaction, retrying on deadlock
+
+    The transaction is committed unless the operation returns a dict with an
+    "error" key, in which case it is rolled back and the error is returned.
+    Deadlocks and lock wait timeouts are retried with jittered exponential
+    backoff, since hot inventory rows are contended during busy openings.
+    """
+    for attempt in range(1, max_attempts + 1):
+        connection = get_db_connection()
+        if connection is None:
+            return {"error": "Database connection failed"}
+
+        cursor = connection.cursor()
+
+        try:
+            connection.start_transaction()
+            result = operation(cursor)
+            if isinstance(result, dict) and "error" in result:
+                connection.rollback()
+            else:
+                connection.commit()
+            return result
+        except Error as e:
+            connection.rollback()
+            if e.errno in RETRYABLE_ERROR_CODES and attempt < max_attempts:
+                backoff = BASE_BACKOFF_SECONDS * (2 ** (attempt - 1))
+                print(f"Transaction conflict ({e.errno}), retrying in {backoff:.2f}s (attempt {attempt})")
+                time.sleep(backoff * random.uniform(0.5, 1.5))
+                continue
+            print(f"Error running transaction: {e}")
+            return {"error": str(e)}
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+def is_valid_slot_count(slots):
+    """Whether slots is a whole number of tickets one booking may take"""
+    return isinstance(slots, int) and not isinstance(slots, bool) and 1 <= slots <= MAX_SLOTS_PER_BOOKING
+
+def reserve_slots(cursor, exhibition_id, slots):
+    """Atomically take slots from an exhibition if enough are left
+
+    Returns True if the slots were reserved. The conditional decrement is a
+    single-row update, so concurrent bookings can never oversell.
+    """
+    # A zero or negative count would pass the guard below and add slots
+    if not is_valid_slot_count(slots):
+        return False
+
+    query = """
+    UPDATE exhibitions
+    SET available_slots = available_slots - %s
+    WHERE id = %s AND available_slots >= %s
+    """
+    cursor.execute(query, (slots, exhibition_id, slots))
+    return cursor.rowcount == 1
+
+def release_slots(cursor, exhibition_id, slots):
+    """Return previously reserved slots to an exhibition"""
+    query = """
+    UPDATE exhibitions
+    SET available_slots = LEAST(total_slots, available_slots + %s)
+    WHERE id = %s
+    """
+    cursor.execute(query, (slots, exhibition_id))
+    return cursor.rowcount == 1
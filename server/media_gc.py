@@ -0,0 +1,226 @@
+import os
+import sys
+import time
+import json
+import argparse
+import threading
+from database import get_db_connection
+from media_store import UPLOADS_DIR, UPLOADS_URL, TEMP_DIR, is_inline_image
+from image_derivatives import DERIVATIVES_DIR, get_image_key, forget_variants
+from upload_sessions import get_pending_upload_urls
+
+# Unreferenced files younger than this are left alone: an upload is stored
+# before the row that references it is written
+GRACE_SECONDS = 24 * 60 * 60
+
+# Quarantined files are deleted after this long, unless referenced again
+QUARANTINE_SECONDS = 7 * 24 * 60 * 60
+
+# Quarantine sits under the temp dir so moving a file in or out is a rename
+QUARANTINE_DIR = os.path.join(TEMP_DIR, "quarantine")
+
+# Directory entries examined per step, and rows fetched per step
+SCAN_BATCH_SIZE = 1000
+FETCH_BATCH_SIZE = 1000
+
+# The collector runs this often when started with the server
+GC_INTERVAL_SECONDS = 6 * 60 * 60
+
+# Files that are used without being referenced by a row: fallback images
+# used by the API and the frontend
+KEEP_FILES = {
+    "placeholder.jpg",
+    "default_exhibition.jpg",
+    "exhibition_20250419211948.jpg",
+}
+
+# Table and column of every stored image reference
+IMAGE_COLUMNS = (
+    ("artworks", "image_url"),
+    ("exhibitions", "image_url"),
+    ("artists", "profile_image_url"),
+)
+
+_stop_event = threading.Event()
+_gc_thread = None
+
+def _url_to_relative(url):
+    """Path under UPLOADS_DIR that an image_url points at, or None
+
+    Mirrors format_artwork: a value outside /static/ is served as
+    /static/uploads/<basename>, whatever directory or host it names, so its
+    basename is kept. Only other /static/ paths are known not to be uploads.
+    """
+    if not url or is_inline_image(url):
+        return None
+    url = url.split("?", 1)[0]
+    if url.startswith(f"{UPLOADS_URL}/"):
+        return url[len(UPLOADS_URL) + 1:]
+    if not url.startswith("/static/"):
+        return os.path.basename(url) or None
+    return None
+
+def load_referenced_files():
+    """Every upload a row still points at, as paths relative to UPLOADS_DIR
+
+    Rows are streamed through an unbuffered cursor, so only the set of paths
+    is held in memory.
+    """
+    referenced = set(KEEP_FILES)
+    for url in get_pending_upload_urls():
+        referenced.add(_url_to_relative(url))
+
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError("Database connection failed")
+
+    try:
+        for table, column in IMAGE_COLUMNS:
+            cursor = connection.cursor(buffered=False)
+            try:
+                # Inline base64 values are skipped in SQL rather than transferred
+                cursor.execute(
+                    f"SELECT {column} FROM {table} "
+                    f"WHERE {column} IS NOT NULL AND {column} NOT LIKE 'data:%' AND {column} NOT LIKE 'base64,%'"
+                )
+                while True:
+                    rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                    if not rows:
+                        break
+                    for (url,) in rows:
+                        relative = _url_to_relative(url)
+                        if relative:
+                            referenced.add(relative)
+            finally:
+                cursor.close()
+    finally:
+        if connection.is_connected():
+            connection.close()
+
+    referenced.discard(None)
+    return referenced
+
+def _scan(root, skip=()):
+    """Yield batches of (relative path, DirEntry) for files under root"""
+    batch = []
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path not in skip:
+                        pending.append(entry.path)
+                    continue
+                batch.append((os.path.relpath(entry.path, root).replace(os.sep, "/"), entry))
+                if len(batch) >= SCAN_BATCH_SIZE:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+def _move(source, destination):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(source, destination)
+
+def collect_garbage(dry_run=False, now=None):
+    """Quarantine unreferenced uploads and delete old quarantined files
+
+    An unreferenced upload older than GRACE_SECONDS is moved to the quarantine
+    dir; one still unreferenced QUARANTINE_SECONDS later is deleted, and one
+    that is referenced again is moved back. Image variants whose original is
+    no longer referenced are deleted outright, since they can be regenerated.
+    Returns counts and the bytes reclaimed.
+    """
+    now = now or time.time()
+    referenced = load_referenced_files()
+    referenced_keys = {get_image_key(f"{UPLOADS_URL}/{relative}") for relative in referenced}
+    report = {"scanned": 0, "quarantined": 0, "restored": 0, "deleted": 0, "variants_deleted": 0,
+              "quarantined_bytes": 0, "reclaimed_bytes": 0}
+
+    for batch in _scan(UPLOADS_DIR, skip={TEMP_DIR}):
+        for relative, entry in batch:
+            report["scanned"] += 1
+            if relative in referenced:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if now - stat.st_mtime < GRACE_SECONDS:
+                continue
+            report["quarantined"] += 1
+            report["quarantined_bytes"] += stat.st_size
+            if not dry_run:
+                destination = os.path.join(QUARANTINE_DIR, *relative.split("/"))
+                _move(entry.path, destination)
+                # The quarantine clock starts now
+                os.utime(destination, (now, now))
+
+    for batch in _scan(QUARANTINE_DIR):
+        for relative, entry in batch:
+            if relative in referenced:
+                report["restored"] += 1
+                if not dry_run:
+                    _move(entry.path, os.path.join(UPLOADS_DIR, *relative.split("/")))
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if now - stat.st_mtime < QUARANTINE_SECONDS:
+                continue
+            report["deleted"] += 1
+            report["reclaimed_bytes"] += stat.st_size
+            if not dry_run:
+                os.remove(entry.path)
+
+    for batch in _scan(DERIVATIVES_DIR):
+        for relative, entry in batch:
+            # Variant files are named <key>_v<version>_<name>
+            key = relative.rsplit("/", 1)[-1].split("_", 1)[0]
+            if key in referenced_keys:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if now - stat.st_mtime < GRACE_SECONDS:
+                continue
+            report["variants_deleted"] += 1
+            report["reclaimed_bytes"] += stat.st_size
+            if not dry_run:
+                os.remove(entry.path)
+                forget_variants(key)
+
+    print(f"Media GC: {json.dumps(report)}")
+    return report
+
+def _run_collector():
+    while not _stop_event.wait(GC_INTERVAL_SECONDS):
+        try:
+            collect_garbage()
+        except Exception as e:
+            print(f"Error in media garbage collector: {e}")
+
+def start_media_gc():
+    """Start the background thread that collects orphaned uploads"""
+    global _gc_thread
+    if _gc_thread and _gc_thread.is_alive():
+        return _gc_thread
+
+    _stop_event.clear()
+    _gc_thread = threading.Thread(target=_run_collector, name="media-gc", daemon=True)
+    _gc_thread.start()
+    print("Media garbage collector started")
+    return _gc_thread
+
+def stop_media_gc():
+    """Signal the media garbage collector thread to stop"""
+    _stop_event.set()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quarantine and delete uploads no longer referenced by any row")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be collected without moving anything")
+    args = parser.parse_args()
+
+    try:
+        collect_garbage(dry_run=args.dry_run)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
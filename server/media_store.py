@@ -0,0 +1,224 @@
+import os
+import re
+import base64
+import hashlib
+import tempfile
+
+# Uploaded media is stored by content hash under static/uploads/ab/cd/,
+# so identical uploads share one file and no directory grows too large
+UPLOADS_DIR = os.path.join(os.path.dirname(__file__), "static", "uploads")
+UPLOADS_URL = "/static/uploads"
+
+# Partially written files live here until they are renamed into place; it is
+# under UPLOADS_DIR so the rename never crosses filesystems
+TEMP_DIR = os.path.join(UPLOADS_DIR, "tmp")
+
+# Base64 characters decoded per step; a multiple of 4 so every chunk decodes on its own
+DECODE_CHUNK_CHARS = 64 * 1024
+
+# Image types accepted for upload. Every stored file must also carry the
+# magic bytes of one of them; anything else (SVG in particular, which can
+# carry script and is served from our origin) is rejected.
+EXTENSIONS_BY_TYPE = {
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+def ensure_media_directories():
+    """Create the uploads and temp directories if they don't exist"""
+    for directory in (UPLOADS_DIR, TEMP_DIR):
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+            print(f"Created directory: {directory}")
+
+ensure_media_directories()
+
+def sniff_extension(head):
+    """The extension of a JPEG, PNG, GIF or WebP file from its first bytes, else None"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+def get_media_path(digest, extension):
+    """Sharded location of a stored file, e.g. static/uploads/ab/cd/abcd....jpg"""
+    return os.path.join(UPLOADS_DIR, digest[:2], digest[2:4], f"{digest}.{extension}")
+
+def get_media_url(digest, extension):
+    return f"{UPLOADS_URL}/{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+def is_media_url(url):
+    return bool(url) and url.startswith(f"{UPLOADS_URL}/")
+
+def media_url_to_path(url):
+    """Map a /static/uploads URL back to its file on disk"""
+    relative = url[len(UPLOADS_URL) + 1:].split("?", 1)[0]
+    return os.path.join(UPLOADS_DIR, *relative.split("/"))
+
+class MediaWriter:
+    """Write a file into the media store as it arrives
+
+    Bytes are hashed while they are written to a temp file; commit() renames
+    the file to its content-addressed path, or drops it if that content is
+    already stored. Only JPEG, PNG, GIF and WebP content is committed,
+    whatever type the client declared.
+    """
+
+    def __init__(self, max_bytes=None):
+        ensure_media_directories()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b""
+        self._hash = hashlib.sha256()
+        fd, self.temp_path = tempfile.mkstemp(dir=TEMP_DIR, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, data):
+        """Append bytes; raises ValueError once max_bytes is exceeded"""
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise ValueError(f"File exceeds the {self.max_bytes} byte limit")
+        if len(self.head) < 16:
+            self.head += data[:16 - len(self.head)]
+        self._hash.update(data)
+        self._file.write(data)
+
+    def commit(self):
+        """Move the file into place and return its URL"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        if self.size == 0:
+            self.abort()
+            raise ValueError("File is empty")
+
+        extension = sniff_extension(self.head)
+        if extension is None:
+            self.abort()
+            raise ValueError("Unsupported image format")
+
+        digest = self._hash.hexdigest()
+        path = get_media_path(digest, extension)
+        if os.path.exists(path):
+            # Same content is already stored; refresh its age so the garbage
+            # collector treats it as a new upload
+            os.remove(self.temp_path)
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.temp_path, path)
+        return get_media_url(digest, extension)
+
+    def abort(self):
+        """Discard a partially written file"""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+def store_file(source_path):
+    """Move a fully received file into the media store and return its URL
+
+    The file is hashed in chunks and then renamed, so it is never read into
+    memory. source_path must be on the same filesystem as the store. Raises
+    ValueError, leaving the file in place, unless it is a JPEG, PNG, GIF or
+    WebP image.
+    """
+    digest = hashlib.sha256()
+    with open(source_path, "rb") as f:
+        head = f.read(16)
+        digest.update(head)
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    if not head:
+        raise ValueError("File is empty")
+    extension = sniff_extension(head)
+    if extension is None:
+        raise ValueError("Unsupported image format")
+
+    digest = digest.hexdigest()
+    path = get_media_path(digest, extension)
+    if os.path.exists(path):
+        # Same content is already stored
+        os.remove(source_path)
+        os.utime(path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+    return get_media_url(digest, extension)
+
+def is_inline_image(image_url):
+    """Whether an image_url column holds a base64 image rather than a path"""
+    return bool(image_url) and (image_url.startswith("data:") or image_url.startswith("base64,"))
+
+def parse_data_url(base64_str):
+    """Split a data URL into its content type and base64 payload"""
+    if "," in base64_str:
+        # For format like "data:image/jpeg;base64,/9j/4AAQSk..."
+        header, base64_data = base64_str.split(",", 1)
+        if ";base64" not in header:
+            raise ValueError("Not a valid base64 image format")
+        content_type = header[len("data:"):].split(";", 1)[0] if header.startswith("data:") else None
+        return content_type, base64_data
+    # Assume it's just the base64 data
+    return None, base64_str
+
+def store_base64(base64_str, max_bytes=None):
+    """Decode a base64 string or data URL into the media store and return its URL
+
+    The payload is decoded a chunk at a time, so the decoded image is never
+    held in memory as a whole.
+    """
+    _, base64_data = parse_data_url(base64_str)
+    writer = MediaWriter(max_bytes)
+    try:
+        carry = ""
+        for start in range(0, len(base64_data), DECODE_CHUNK_CHARS):
+            chunk = carry + _WHITESPACE.sub("", base64_data[start:start + DECODE_CHUNK_CHARS])
+            usable = len(chunk) - len(chunk) % 4
+            carry = chunk[usable:]
+            if usable:
+                writer.write(base64.b64decode(chunk[:usable], validate=True))
+        if carry:
+            # Tolerate payloads with their trailing padding stripped
+            writer.write(base64.b64decode(carry + "=" * (-len(carry) % 4), validate=True))
+        return writer.commit()
+    except Exception:
+        writer.abort()
+        raise
+
+def save_image_from_base64(base64_str, fallback_url=None):
+    """Save a base64 image to the media store and return its URL path
+
+    Existing /static/ paths are returned as they are. If the data cannot be
+    decoded or saved, fallback_url is returned instead.
+    """
+    # Handle empty strings or None values
+    if not base64_str:
+        return None
+
+    # If it's already a URL path (not base64), return it as is
+    if base64_str.startswith('/static/'):
+        return base64_str
+
+    try:
+        return store_base64(base64_str)
+    except ValueError as e:
+        # Includes binascii.Error for malformed base64
+        print(f"Failed to decode base64 data: {e}")
+        return fallback_url
+    except Exception as e:
+        print(f"Error saving image: {e}")
+        return fallback_url
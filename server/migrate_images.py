@@ -0,0 +1,146 @@
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from database import get_db_connection
+from media_store import store_base64
+
+# Rows fetched, converted and written back per step
+BATCH_SIZE = 100
+
+# Worker processes decoding images; base64 decoding and hashing are CPU bound
+MIGRATION_WORKERS = min(4, os.cpu_count() or 1)
+
+# Tables whose image_url may still hold an inline base64 image
+LEGACY_IMAGE_TABLES = ("artworks", "exhibitions")
+
+LEGACY_IMAGE_CONDITION = "(image_url LIKE 'data:%' OR image_url LIKE 'base64,%')"
+
+def _convert(row):
+    """Worker process entry point: store one inline image, returning (id, url or None)"""
+    row_id, image_url = row
+    try:
+        return row_id, store_base64(image_url)
+    except Exception as e:
+        print(f"Could not decode image of row {row_id}: {e}")
+        return row_id, None
+
+def count_legacy_images(table):
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError("Database connection failed")
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {LEGACY_IMAGE_CONDITION}")
+        return cursor.fetchone()[0]
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def _update_batch(cursor, table, paths):
+    """Write back a batch of new paths in one statement
+
+    Rows whose image was replaced since they were read no longer match the
+    legacy condition and are left alone.
+    """
+    cases = " ".join(["WHEN %s THEN %s"] * len(paths))
+    placeholders = ", ".join(["%s"] * len(paths))
+    params = [value for row_id, path in paths for value in (row_id, path)]
+    params += [row_id for row_id, _ in paths]
+    cursor.execute(
+        f"UPDATE {table} SET image_url = CASE id {cases} END "
+        # %% keeps the LIKE wildcards literal when parameters are interpolated
+        f"WHERE id IN ({placeholders}) AND {LEGACY_IMAGE_CONDITION.replace('%', '%%')}",
+        params
+    )
+    return cursor.rowcount
+
+def migrate_table(table, executor, batch_size=BATCH_SIZE):
+    """Move every inline image in a table into the media store
+
+    Rows are streamed through an unbuffered cursor, so only one batch of
+    images is in memory at a time; updates go through a second connection
+    and are committed per batch, so an interrupted run can simply be resumed.
+
+    Rows whose image cannot be decoded are left untouched and their ids
+    returned in stats["unreadable"] for an operator to look at; a later run
+    lists them again.
+    """
+    read_connection = get_db_connection()
+    write_connection = get_db_connection()
+    if read_connection is None or write_connection is None:
+        raise RuntimeError("Database connection failed")
+
+    read_cursor = read_connection.cursor(buffered=False)
+    write_cursor = write_connection.cursor()
+    stats = {"migrated": 0, "unreadable": [], "bytes": 0}
+
+    try:
+        read_cursor.execute(f"SELECT id, image_url FROM {table} WHERE {LEGACY_IMAGE_CONDITION}")
+        while True:
+            rows = read_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            stats["bytes"] += sum(len(image_url) for _, image_url in rows)
+            paths = []
+            for row_id, path in executor.map(_convert, rows):
+                if path is None:
+                    stats["unreadable"].append(row_id)
+                else:
+                    paths.append((row_id, path))
+
+            if paths:
+                stats["migrated"] += _update_batch(write_cursor, table, paths)
+                write_connection.commit()
+            print(f"{table}: {stats['migrated']} migrated, {len(stats['unreadable'])} unreadable")
+    finally:
+        for connection, cursor in ((read_connection, read_cursor), (write_connection, write_cursor)):
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+    return stats
+
+def migrate_legacy_images(tables=None, batch_size=BATCH_SIZE, workers=MIGRATION_WORKERS):
+    """Migrate inline images of the given tables (all by default)"""
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for table in tables or LEGACY_IMAGE_TABLES:
+            results[table] = migrate_table(table, executor, batch_size)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move legacy base64 images out of the database into the media store")
+    parser.add_argument("--table", choices=sorted(LEGACY_IMAGE_TABLES), action="append",
+                        help="Only migrate this table (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=MIGRATION_WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the rows to migrate")
+
+    args = parser.parse_args()
+    tables = args.table or list(LEGACY_IMAGE_TABLES)
+    unreadable = False
+
+    try:
+        if args.dry_run:
+            for table in tables:
+                print(f"{table}: {count_legacy_images(table)} rows with inline images")
+            sys.exit(0)
+
+        for table, stats in migrate_legacy_images(tables, args.batch_size, args.workers).items():
+            print(f"{table}: migrated {stats['migrated']} rows "
+                  f"({len(stats['unreadable'])} unreadable, {stats['bytes']} bytes of inline image data)")
+            if stats["unreadable"]:
+                unreadable = True
+                ids = ", ".join(str(row_id) for row_id in stats["unreadable"])
+                print(f"{table}: rows left with their inline image, which could not be decoded: {ids}")
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    # Non-zero so scripts notice rows that still need an operator
+    sys.exit(2 if unreadable else 0)
@@ -3,8 +3,14 @@ import base64
 import json
 from datetime import datetime
 import time
+import threading
 from db_setup import get_db_connection, dict_from_row
-from mysql.connector import Error
+from payment_events import publish_payment_status
+from inventory import run_in_transaction
+from checkout_holds import convert_hold, release_order_hold, reclaim_expired_hold
+from ticket_checkin import index_paid_booking
+from ticket_ledger import record_booking_sold
+from catalog_events import publish as publish_catalog_change, ARTWORK, SOLD
 
 # M-Pesa API credentials
 CONSUMER_KEY = "sMwMwGZ8oOiSkNrUIrPbcCeWIO8UiQ3SV4CyX739uAyZVs1F"
@@ -14,8 +20,16 @@ PASSKEY = "bfb279f9aa9bdbcf158e97dd71a467cd2e0c893059b10f78e6b72ada1ed2c919"
 CALLBACK_URL = "https://webhook.site/3c1f62b5-4214-47d6-9f26-71c1f4b9c8f0"
 API_BASE_URL = "https://sandbox.safaricom.co.ke"
 
+# Cached OAuth token shared by request handlers and the payment reconciler
+_access_token_cache = {"token": None, "expires_at": 0}
+_access_token_lock = threading.Lock()
+
 def get_access_token():
-    """Get OAuth access token from M-Pesa"""
+    """Get OAuth access token from M-Pesa, reusing the cached token until it expires"""
+    with _access_token_lock:
+        if _access_token_cache["token"] and time.time() < _access_token_cache["expires_at"]:
+            return _access_token_cache["token"]
+    
     url = f"{API_BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
     auth = base64.b64encode(f"{CONSUMER_KEY}:{CONSUMER_SECRET}".encode()).decode('utf-8')
     headers = {
@@ -27,6 +41,11 @@ def get_access_token():
         response_data = response.json()
         
         if "access_token" in response_data:
+            # Refresh a minute early so an in-flight request never uses an expired token
+            expires_in = int(response_data.get("expires_in", 3599))
+            with _access_token_lock:
+                _access_token_cache["token"] = response_data["access_token"]
+                _access_token_cache["expires_at"] = time.time() + max(expires_in - 60, 0)
             return response_data["access_token"]
         else:
             print("Error getting access token:", response_data)
@@ -42,19 +61,26 @@ def generate_password():
     password = base64.b64encode(password_str.encode()).decode('utf-8')
     return password, timestamp
 
-def initiate_stk_push(phone_number, amount, account_reference, order_type, order_id, user_id):
-    """Initiate STK Push to customer's phone"""
+def format_phone_number(phone_number):
+    """Format a phone number to match M-Pesa requirements (2547XXXXXXXX)"""
+    if phone_number.startswith('+'):
+        phone_number = phone_number[1:]
+    if phone_number.startswith('0'):
+        phone_number = '254' + phone_number[1:]
+    return phone_number
+
+def initiate_stk_push(phone_number, amount, account_reference, order_type, order_id):
+    """Initiate STK Push to customer's phone
+    
+    The pending transaction is recorded by the caller; this only talks to Safaricom.
+    """
     access_token = get_access_token()
     if not access_token:
         return {"error": "Failed to get access token"}
     
     password, timestamp = generate_password()
     
-    # Format phone number to match M-Pesa requirements
-    if phone_number.startswith('+'):
-        phone_number = phone_number[1:]
-    if phone_number.startswith('0'):
-        phone_number = '254' + phone_number[1:]
+    phone_number = format_phone_number(phone_number)
     
     url = f"{API_BASE_URL}/mpesa/stkpush/v1/processrequest"
     headers = {
@@ -82,17 +108,6 @@ def initiate_stk_push(phone_number, amount, account_reference, order_type, order
         print(f"STK Push result: {result}")
         
         if "ResponseCode" in result and result["ResponseCode"] == "0":
-            # Save transaction to database
-            save_transaction_request(
-                result["CheckoutRequestID"],
-                result["MerchantRequestID"],
-                order_type,
-                order_id,
-                user_id,
-                amount,
-                phone_number
-            )
-            
             return {
                 "success": True,
                 "checkoutRequestId": result["CheckoutRequestID"],
@@ -107,8 +122,62 @@ def initiate_stk_push(phone_number, amount, account_reference, order_type, order
         print(f"Exception during STK Push: {e}")
         return {"error": str(e)}
 
+def query_stk_push_status(checkout_request_id, access_token=None):
+    """Query Safaricom for the status of an STK Push transaction"""
+    if not access_token:
+        access_token = get_access_token()
+    if not access_token:
+        return {"error": "Failed to get access token"}
+    
+    password, timestamp = generate_password()
+    
+    url = f"{API_BASE_URL}/mpesa/stkpushquery/v1/query"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    
+    payload = {
+        "BusinessShortCode": BUSINESS_SHORT_CODE,
+        "Password": password,
+        "Timestamp": timestamp,
+        "CheckoutRequestID": checkout_request_id
+    }
+    
+    try:
+        response = requests.post(url, json=payload, headers=headers)
+        result = response.json()
+        print(f"Transaction status query result: {result}")
+        return result
+    except Exception as e:
+        print(f"Exception during status query: {e}")
+        return {"error": str(e)}
+
+def apply_stk_query_result(transaction, result):
+    """Record the outcome of an STK Push status query for a pending transaction
+    
+    Returns the new status, or "pending" if M-Pesa has not settled the payment yet.
+    """
+    if "ResultCode" not in result:
+        return "pending"
+    
+    status = "completed" if str(result["ResultCode"]) == "0" else "failed"
+    apply_payment_result(
+        transaction["checkout_request_id"],
+        status,
+        result.get("ResultCode"),
+        result.get("ResultDesc")
+    )
+    return status
+
 def check_transaction_status(checkout_request_id):
-    """Check status of an STK Push transaction"""
+    """Check status of an STK Push transaction
+    
+    This is a read of the stored status only. Pending transactions are settled
+    by the M-Pesa callback or by the background payment reconciler. The
+    transaction can be looked up by its CheckoutRequestID or by the checkout
+    handle returned when the order was acknowledged.
+    """
     connection = get_db_connection()
     if not connection:
         return {"error": "Database connection failed"}
@@ -116,12 +185,13 @@ def check_transaction_status(checkout_request_id):
     cursor = connection.cursor()
     
     try:
-        # Check if transaction exists in database
+        # Indexed lookups on checkout_request_id and checkout_handle
         query = """
-        SELECT * FROM mpesa_transactions 
-        WHERE checkout_request_id = %s
+        SELECT checkout_request_id, checkout_handle, status, result_desc FROM mpesa_transactions 
+        WHERE checkout_request_id = %s OR checkout_handle = %s
+        LIMIT 1
         """
-        cursor.execute(query, (checkout_request_id,))
+        cursor.execute(query, (checkout_request_id, checkout_request_id))
         row = cursor.fetchone()
         
         if not row:
@@ -129,83 +199,27 @@ def check_transaction_status(checkout_request_id):
         
         transaction = dict_from_row(row, cursor)
         
-        # If transaction is still pending, check status from M-Pesa
+        # Until the STK Push has been sent the transaction is keyed by its handle
+        stk_sent = transaction["checkout_request_id"] != transaction["checkout_handle"]
+        checkout_ids = {
+            "checkoutRequestId": transaction["checkout_request_id"] if stk_sent else None,
+            "checkoutHandle": transaction["checkout_handle"]
+        }
+        
         if transaction["status"] == "pending":
-            access_token = get_access_token()
-            if not access_token:
-                return {"error": "Failed to get access token"}
-            
-            password, timestamp = generate_password()
-            
-            url = f"{API_BASE_URL}/mpesa/stkpushquery/v1/query"
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "BusinessShortCode": BUSINESS_SHORT_CODE,
-                "Password": password,
-                "Timestamp": timestamp,
-                "CheckoutRequestID": checkout_request_id
-            }
-            
-            try:
-                response = requests.post(url, json=payload, headers=headers)
-                result = response.json()
-                print(f"Transaction status query result: {result}")
-                
-                if "ResultCode" in result:
-                    if result["ResultCode"] == "0":
-                        # Update transaction status to completed
-                        update_transaction_status(
-                            checkout_request_id,
-                            "completed",
-                            result.get("ResultCode"),
-                            result.get("ResultDesc")
-                        )
-                        
-                        # Update order status
-                        update_order_status(
-                            transaction["order_type"],
-                            transaction["order_id"],
-                            "completed"
-                        )
-                        
-                        return {
-                            "success": True,
-                            "status": "completed",
-                            "message": "Payment completed successfully"
-                        }
-                    else:
-                        # Update transaction status to failed
-                        update_transaction_status(
-                            checkout_request_id,
-                            "failed",
-                            result.get("ResultCode"),
-                            result.get("ResultDesc")
-                        )
-                        
-                        return {
-                            "success": False,
-                            "status": "failed",
-                            "message": result.get("ResultDesc", "Payment failed")
-                        }
-                else:
-                    return {
-                        "status": "pending",
-                        "message": "Payment is being processed"
-                    }
-            except Exception as e:
-                print(f"Exception during status check: {e}")
-                return {"error": str(e)}
-        else:
-            # Return status from database
             return {
-                "status": transaction["status"],
-                "message": transaction["result_desc"] if transaction["result_desc"] else 
-                          "Payment completed" if transaction["status"] == "completed" else "Payment failed"
+                "status": "pending",
+                "message": "Payment is being processed" if stk_sent else "Sending payment request to your phone",
+                **checkout_ids
             }
+        
+        return {
+            "success": transaction["status"] == "completed",
+            "status": transaction["status"],
+            "message": transaction["result_desc"] if transaction["result_desc"] else 
+                      "Payment completed" if transaction["status"] == "completed" else "Payment failed",
+            **checkout_ids
+        }
     except Exception as e:
         print(f"Error checking transaction: {e}")
         return {"error": str(e)}
@@ -214,248 +228,175 @@ def check_transaction_status(checkout_request_id):
             cursor.close()
             connection.close()
 
-def save_transaction_request(checkout_request_id, merchant_request_id, order_type, order_id, user_id, amount, phone_number):
-    """Save M-Pesa transaction request to database"""
-    connection = get_db_connection()
-    if not connection:
-        return False
+def apply_order_status(cursor, order_type, order_id, payment_status):
+    """Apply a payment result to its order using the caller's transaction
     
-    cursor = connection.cursor()
-    
-    try:
+    Only pending orders are updated, so the side effects on the artwork or the
+    exhibition slots are applied at most once. A completed payment turns the
+    order's checkout hold into a sale; a failed one releases the hold.
+    """
+    if order_type == "artwork":
+        query = """
+        UPDATE artwork_orders
+        SET payment_status = %s
+        WHERE id = %s AND payment_status = 'pending'
+        """
+    elif order_type == "exhibition":
         query = """
-        INSERT INTO mpesa_transactions
-        (checkout_request_id, merchant_request_id, order_type, order_id, user_id, amount, phone_number)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        UPDATE exhibition_bookings
+        SET payment_status = %s
+        WHERE id = %s AND payment_status = 'pending'
         """
-        cursor.execute(query, (
-            checkout_request_id,
-            merchant_request_id,
-            order_type,
-            order_id,
-            user_id,
-            amount,
-            phone_number
-        ))
-        connection.commit()
+    else:
+        return False
+    
+    if payment_status == "failed" and release_order_hold(cursor, order_type, order_id):
+        # Releasing the hold returned the inventory and marked the order failed
         return True
-    except Error as e:
-        print(f"Error saving transaction: {e}")
+    
+    cursor.execute(query, (payment_status, order_id))
+    if cursor.rowcount == 0:
+        if payment_status == "completed":
+            return recover_late_payment(cursor, order_type, order_id)
         return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+    
+    if payment_status == "completed":
+        convert_hold(cursor, order_type, order_id)
+        if order_type == "artwork":
+            mark_artwork_sold(cursor, order_id)
+        else:
+            record_booking_sold(cursor, order_id)
+    
+    return True
 
-def update_transaction_status(checkout_request_id, status, result_code=None, result_desc=None):
-    """Update M-Pesa transaction status in database"""
-    connection = get_db_connection()
-    if not connection:
+def mark_artwork_sold(cursor, order_id):
+    """Mark the artwork of an order as sold"""
+    query = """
+    UPDATE artworks a
+    JOIN artwork_orders o ON a.id = o.artwork_id
+    SET a.status = 'sold'
+    WHERE o.id = %s
+    """
+    cursor.execute(query, (order_id,))
+
+def recover_late_payment(cursor, order_type, order_id):
+    """Complete an order whose payment arrived after its checkout hold expired
+    
+    This only succeeds if the artwork or the slots are still free.
+    """
+    if not reclaim_expired_hold(cursor, order_type, order_id):
+        print(f"Payment for {order_type} order {order_id} arrived after its hold expired "
+              f"and the item is no longer available; refund required")
         return False
     
-    cursor = connection.cursor()
+    if order_type == "artwork":
+        cursor.execute("""
+        UPDATE artwork_orders SET payment_status = 'completed'
+        WHERE id = %s AND payment_status = 'failed'
+        """, (order_id,))
+        mark_artwork_sold(cursor, order_id)
+    else:
+        cursor.execute("""
+        UPDATE exhibition_bookings SET payment_status = 'completed', status = 'active'
+        WHERE id = %s AND payment_status = 'failed'
+        """, (order_id,))
+        if cursor.rowcount == 1:
+            record_booking_sold(cursor, order_id, reinstated=True)
     
-    try:
+    print(f"Recovered late payment for {order_type} order {order_id}")
+    return True
+
+def apply_payment_result(checkout_request_id, status, result_code=None, result_desc=None):
+    """Record the final result of a payment and apply it to its order
+    
+    Everything happens in one transaction on one connection. The transaction row
+    is locked by its checkout_request_id, and a transaction that is no longer
+    pending is left untouched, so duplicate callbacks or a callback racing the
+    reconciler are applied only once.
+    """
+    # Clients may be waiting on the CheckoutRequestID or on the checkout handle
+    subscriber_keys = {checkout_request_id}
+    
+    def apply(cursor):
+        query = """
+        SELECT order_type, order_id, status, checkout_handle FROM mpesa_transactions
+        WHERE checkout_request_id = %s
+        FOR UPDATE
+        """
+        cursor.execute(query, (checkout_request_id,))
+        row = cursor.fetchone()
+        
+        if not row:
+            return {"error": "Transaction not found"}
+        
+        order_type, order_id, current_status, checkout_handle = row
+        subscriber_keys.add(checkout_handle)
+        
+        if current_status != "pending":
+            # Already settled by an earlier callback or by the reconciler
+            print(f"Transaction {checkout_request_id} already {current_status}, ignoring duplicate result")
+            return {"success": True, "applied": False, "status": current_status}
+        
         query = """
         UPDATE mpesa_transactions
         SET status = %s, result_code = %s, result_desc = %s
         WHERE checkout_request_id = %s
         """
         cursor.execute(query, (status, result_code, result_desc, checkout_request_id))
-        connection.commit()
-        return True
-    except Error as e:
-        print(f"Error updating transaction: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
-
-def update_order_status(order_type, order_id, payment_status):
-    """Update order payment status in database"""
-    connection = get_db_connection()
-    if not connection:
-        return False
+        
+        sold = apply_order_status(cursor, order_type, order_id, status) and status == "completed"
+        result = {"success": True, "applied": True, "status": status, "order_type": order_type, "order_id": order_id}
+        if sold and order_type == "artwork":
+            cursor.execute("SELECT artwork_id FROM artwork_orders WHERE id = %s", (order_id,))
+            row = cursor.fetchone()
+            result["artwork_id"] = row[0] if row else None
+        return result
     
-    cursor = connection.cursor()
+    result = run_in_transaction(apply)
     
-    try:
-        if order_type == "artwork":
-            query = """
-            UPDATE artwork_orders
-            SET payment_status = %s
-            WHERE id = %s
-            """
-        elif order_type == "exhibition":
-            query = """
-            UPDATE exhibition_bookings
-            SET payment_status = %s
-            WHERE id = %s
-            """
-        else:
-            return False
-        
-        cursor.execute(query, (payment_status, order_id))
-        connection.commit()
-        
-        # If it's an artwork order and payment is completed, update artwork status
-        if order_type == "artwork" and payment_status == "completed":
-            query = """
-            UPDATE artworks a
-            JOIN artwork_orders o ON a.id = o.artwork_id
-            SET a.status = 'sold'
-            WHERE o.id = %s
-            """
-            cursor.execute(query, (order_id,))
-            connection.commit()
+    if result.get("applied"):
+        if status == "completed" and result["order_type"] == "exhibition":
+            # Make the ticket valid at the door check-in
+            index_paid_booking(result["order_id"])
+        if result.get("artwork_id"):
+            # Catalog indexes drop sold artworks from recommendations
+            publish_catalog_change(ARTWORK, SOLD, result["artwork_id"])
         
-        # If it's an exhibition booking and payment is completed, update available slots
-        if order_type == "exhibition" and payment_status == "completed":
-            query = """
-            UPDATE exhibitions e
-            JOIN exhibition_bookings b ON e.id = b.exhibition_id
-            SET e.available_slots = e.available_slots - b.slots
-            WHERE b.id = %s
-            """
-            cursor.execute(query, (order_id,))
-            connection.commit()
-        
-        return True
-    except Error as e:
-        print(f"Error updating order: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        # Wake any clients streaming this payment's status
+        for key in subscriber_keys:
+            if key:
+                publish_payment_status(key, status, result_desc)
+    return result
+
+def parse_stk_callback(callback_data):
+    """Return the stkCallback part of an M-Pesa callback payload"""
+    # Safaricom wraps the result in Body.stkCallback
+    return callback_data.get("Body", {}).get("stkCallback", callback_data)
 
 def handle_mpesa_callback(callback_data):
     """Handle M-Pesa callback data"""
     try:
-        checkout_request_id = callback_data.get("CheckoutRequestID")
-        result_code = callback_data.get("ResultCode")
-        result_desc = callback_data.get("ResultDesc")
+        stk_callback = parse_stk_callback(callback_data)
+        
+        checkout_request_id = stk_callback.get("CheckoutRequestID")
+        result_code = stk_callback.get("ResultCode")
+        result_desc = stk_callback.get("ResultDesc")
         
         if not checkout_request_id:
             return {"error": "Missing CheckoutRequestID"}
         
-        if result_code == "0":
+        if str(result_code) == "0":
             # Payment successful
             status = "completed"
         else:
             # Payment failed
             status = "failed"
         
-        # Update transaction status
-        success = update_transaction_status(checkout_request_id, status, result_code, result_desc)
-        
-        if success:
-            # Get transaction details
-            connection = get_db_connection()
-            if not connection:
-                return {"error": "Database connection failed"}
-            
-            cursor = connection.cursor()
-            
-            try:
-                query = """
-                SELECT order_type, order_id FROM mpesa_transactions 
-                WHERE checkout_request_id = %s
-                """
-                cursor.execute(query, (checkout_request_id,))
-                row = cursor.fetchone()
-                
-                if row:
-                    order_type = row[0]
-                    order_id = row[1]
-                    
-                    # Update order status
-                    update_order_status(order_type, order_id, status)
-            finally:
-                if connection.is_connected():
-                    cursor.close()
-                    connection.close()
+        result = apply_payment_result(checkout_request_id, status, result_code, result_desc)
+        if "error" in result:
+            return result
         
         return {"success": True}
     except Exception as e:
         print(f"Error handling M-Pesa callback: {e}")
         return {"error": str(e)}
-
-def handle_stk_push_request(request_data):
-    """Handle STK Push request from frontend"""
-    try:
-        print("STK Push request received:", request_data)
-        
-        phone_number = request_data.get("phoneNumber")
-        amount = request_data.get("amount")
-        order_type = request_data.get("orderType")
-        order_id = request_data.get("orderId")
-        user_id = request_data.get("userId")
-        account_reference = request_data.get("accountReference")
-        callback_url = request_data.get("callbackUrl", CALLBACK_URL)
-        slots = request_data.get("slots", 1)  # For exhibition tickets
-        
-        # Validate required fields
-        required_fields = ["phoneNumber", "amount", "orderType", "orderId", "userId"]
-        missing_fields = []
-        
-        for field in required_fields:
-            value = request_data.get(field)
-            if not value or (isinstance(value, str) and value.strip() == ''):
-                missing_fields.append(field)
-        
-        if missing_fields:
-            error_msg = f"Missing required fields: {', '.join(missing_fields)}"
-            print(error_msg)
-            return {"error": error_msg}
-        
-        # Initialize STK Push
-        stk_result = initiate_stk_push(
-            phone_number, 
-            amount, 
-            account_reference or f"{order_type}-{order_id}", 
-            order_type, 
-            order_id, 
-            user_id
-        )
-        
-        if "error" in stk_result:
-            return stk_result
-        
-        # For development, create order and ticket immediately after STK push initiation
-        if order_type == "exhibition":
-            # Create ticket
-            from db_operations import create_ticket, create_order
-            ticket_result = create_ticket(user_id, order_id, slots)
-            if "error" in ticket_result:
-                return ticket_result
-            
-            # Create order for the ticket
-            order_result = create_order(user_id, "exhibition", order_id, amount)
-            if "error" in order_result:
-                return order_result
-            
-            return {
-                "success": True,
-                "message": "Exhibition ticket created successfully",
-                "ticket": ticket_result,
-                "order": order_result,
-                "stk": stk_result
-            }
-        else:
-            # Create order for artwork
-            from db_operations import create_order
-            order_result = create_order(user_id, "artwork", order_id, amount)
-            if "error" in order_result:
-                return order_result
-            
-            return {
-                "success": True,
-                "message": "Artwork order created successfully",
-                "order": order_result,
-                "stk": stk_result
-            }
-    except Exception as e:
-        print(f"Error handling STK Push request: {e}")
-        return {"error": str(e)}
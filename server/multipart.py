@@ -0,0 +1,160 @@
+import re
+from media_store import MediaWriter
+
+# Bytes read from the socket per step. Reading only as fast as parts are
+# written out keeps memory flat and lets TCP flow control slow the sender.
+READ_CHUNK_BYTES = 64 * 1024
+
+# Largest accepted file part
+MAX_FILE_BYTES = 20 * 1024 * 1024
+
+# Largest accepted whole request, checked against Content-Length up front
+MAX_REQUEST_BYTES = 25 * 1024 * 1024
+
+# Plain form fields and part headers are small; cap them so they cannot be
+# used to buffer a large body in memory
+MAX_FIELD_BYTES = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+
+class MultipartError(ValueError):
+    """The request body is not valid multipart/form-data"""
+
+class UploadTooLarge(MultipartError):
+    """The request or one of its files is over the size limit"""
+
+_PARAM = re.compile(r';\s*([\w-]+)="?([^";]*)"?')
+
+def get_boundary(content_type):
+    """Extract the boundary from a multipart/form-data Content-Type header"""
+    for name, value in _PARAM.findall(content_type):
+        if name.lower() == "boundary" and value:
+            return value.encode("latin-1")
+    raise MultipartError("Missing multipart boundary")
+
+def _parse_part_headers(raw):
+    headers = {}
+    for line in raw.decode("utf-8", "replace").split("\r\n"):
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    disposition = headers.get("content-disposition", "")
+    params = {name.lower(): value for name, value in _PARAM.findall(disposition)}
+    if "name" not in params:
+        raise MultipartError("Part without a field name")
+    return params["name"], params.get("filename"), headers.get("content-type")
+
+class _Reader:
+    """Buffered reader that never reads past Content-Length"""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+        self.buffer = b""
+
+    def fill(self):
+        """Read one more chunk into the buffer; False at the end of the body"""
+        if self.remaining <= 0:
+            return False
+        data = self.stream.read(min(READ_CHUNK_BYTES, self.remaining))
+        if not data:
+            raise MultipartError("Request body ended early")
+        self.remaining -= len(data)
+        self.buffer += data
+        return True
+
+def parse_multipart(stream, content_type, content_length,
+                    max_file_bytes=MAX_FILE_BYTES, max_request_bytes=MAX_REQUEST_BYTES):
+    """Parse a multipart/form-data body straight off the socket
+
+    File parts are streamed into the media store as they arrive, so only about
+    one read chunk is held in memory at a time. Returns (fields, files): form
+    field values, and the media URL of each file part, keyed by field name.
+    Raises UploadTooLarge or MultipartError; files already stored stay in the
+    store (they are content-addressed and cleaned up like any orphan).
+    """
+    if content_length > max_request_bytes:
+        raise UploadTooLarge(f"Request exceeds the {max_request_bytes} byte limit")
+
+    boundary = get_boundary(content_type)
+    delimiter = b"\r\n--" + boundary
+    reader = _Reader(stream, content_length)
+    # The first delimiter has no leading CRLF; add one so every delimiter looks the same
+    reader.buffer = b"\r\n"
+
+    fields = {}
+    files = {}
+
+    # Skip the preamble up to the first delimiter
+    while delimiter not in reader.buffer:
+        reader.buffer = reader.buffer[-len(delimiter):]
+        if not reader.fill():
+            raise MultipartError("Missing multipart boundary in body")
+    reader.buffer = reader.buffer[reader.buffer.index(delimiter) + len(delimiter):]
+
+    while True:
+        while len(reader.buffer) < 2:
+            if not reader.fill():
+                raise MultipartError("Request body ended early")
+        if reader.buffer.startswith(b"--"):
+            # Closing delimiter
+            return fields, files
+        if not reader.buffer.startswith(b"\r\n"):
+            raise MultipartError("Malformed multipart delimiter")
+        reader.buffer = reader.buffer[2:]
+
+        while b"\r\n\r\n" not in reader.buffer:
+            if len(reader.buffer) > MAX_HEADER_BYTES:
+                raise MultipartError("Part headers too large")
+            if not reader.fill():
+                raise MultipartError("Request body ended early")
+        raw_headers, reader.buffer = reader.buffer.split(b"\r\n\r\n", 1)
+        name, filename, _ = _parse_part_headers(raw_headers)
+
+        if filename is not None:
+            writer = MediaWriter(max_file_bytes)
+            sink = writer.write
+        else:
+            writer = None
+            value = bytearray()
+
+            def sink(data, value=value):
+                value.extend(data)
+                if len(value) > MAX_FIELD_BYTES:
+                    raise MultipartError(f"Field {name} is too large")
+
+        try:
+            # Pass the body through, holding back enough bytes to catch a
+            # delimiter split across two reads
+            while True:
+                index = reader.buffer.find(delimiter)
+                if index >= 0:
+                    sink(reader.buffer[:index])
+                    reader.buffer = reader.buffer[index + len(delimiter):]
+                    break
+                keep = len(delimiter) - 1
+                if len(reader.buffer) > keep:
+                    sink(reader.buffer[:-keep])
+                    reader.buffer = reader.buffer[-keep:]
+                if not reader.fill():
+                    raise MultipartError("Request body ended early")
+        except ValueError as e:
+            if writer is not None:
+                writer.abort()
+            if isinstance(e, MultipartError):
+                raise
+            # MediaWriter signals its size cap with a plain ValueError
+            raise UploadTooLarge(str(e))
+
+        if writer is not None:
+            if filename and writer.size:
+                try:
+                    files[name] = writer.commit()
+                except ValueError as e:
+                    # Not a JPEG, PNG, GIF or WebP image
+                    raise MultipartError(f"{name}: {e}")
+            else:
+                # An empty file input still sends a part with no content
+                writer.abort()
+        else:
+            fields[name] = value.decode("utf-8", "replace")
@@ -0,0 +1,63 @@
+import threading
+
+# Final payment statuses that end a status stream
+FINAL_STATUSES = ("completed", "failed")
+
+# Waiters for each checkout_request_id, notified when its payment settles
+_waiters = {}
+_waiters_lock = threading.Lock()
+
+class PaymentWaiter:
+    """A single subscriber waiting for the final status of a payment"""
+
+    def __init__(self, checkout_request_id):
+        self.checkout_request_id = checkout_request_id
+        self.event = threading.Event()
+        self.status = None
+
+    def wait(self, timeout):
+        """Wait for the payment to settle and return its status, or None on timeout"""
+        if self.event.wait(timeout):
+            return self.status
+        return None
+
+def subscribe(checkout_request_id):
+    """Register a waiter for a payment
+
+    Subscribe before reading the stored status so a result published in
+    between is not missed.
+    """
+    waiter = PaymentWaiter(checkout_request_id)
+    with _waiters_lock:
+        _waiters.setdefault(checkout_request_id, []).append(waiter)
+    return waiter
+
+def unsubscribe(waiter):
+    """Remove a waiter that is no longer listening"""
+    with _waiters_lock:
+        waiters = _waiters.get(waiter.checkout_request_id)
+        if not waiters:
+            return
+        if waiter in waiters:
+            waiters.remove(waiter)
+        if not waiters:
+            del _waiters[waiter.checkout_request_id]
+
+def publish_payment_status(checkout_request_id, status, message=None):
+    """Notify every waiter of a payment that it has reached a final status"""
+    if status not in FINAL_STATUSES:
+        return 0
+
+    with _waiters_lock:
+        waiters = _waiters.pop(checkout_request_id, [])
+
+    payload = {
+        "success": status == "completed",
+        "status": status,
+        "message": message or ("Payment completed" if status == "completed" else "Payment failed")
+    }
+    for waiter in waiters:
+        waiter.status = payload
+        waiter.event.set()
+
+    return len(waiters)
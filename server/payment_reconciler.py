@@ -0,0 +1,141 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from db_setup import get_db_connection, dict_from_row
+from mpesa import get_access_token, query_stk_push_status, apply_stk_query_result, apply_payment_result
+
+# How often the reconciler looks for pending transactions
+RECONCILE_INTERVAL_SECONDS = 10
+
+# Maximum number of concurrent stkpushquery calls to Safaricom
+MAX_CONCURRENT_QUERIES = 4
+
+# Maximum number of pending transactions reconciled per pass
+BATCH_SIZE = 50
+
+# Give the customer time to answer the STK prompt before querying
+MIN_PENDING_AGE_SECONDS = 15
+
+# STK prompts expire on the handset long before this; anything older is failed
+PENDING_TIMEOUT_MINUTES = 15
+
+_stop_event = threading.Event()
+_reconciler_thread = None
+
+def get_pending_transactions(limit=BATCH_SIZE):
+    """Get the oldest pending transactions that are due for a status query
+    
+    Transactions still keyed by their checkout handle have not been sent to
+    Safaricom yet, so there is nothing to query.
+    """
+    connection = get_db_connection()
+    if not connection:
+        return []
+
+    cursor = connection.cursor()
+
+    try:
+        # Served by the (status, transaction_date) index
+        query = """
+        SELECT checkout_request_id, order_type, order_id, transaction_date
+        FROM mpesa_transactions
+        WHERE status = 'pending'
+          AND transaction_date <= NOW() - INTERVAL %s SECOND
+          AND NOT (checkout_request_id <=> checkout_handle)
+        ORDER BY transaction_date ASC
+        LIMIT %s
+        """
+        cursor.execute(query, (MIN_PENDING_AGE_SECONDS, limit))
+        return [dict_from_row(row, cursor) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error getting pending transactions: {e}")
+        return []
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def expire_stale_transactions():
+    """Mark pending transactions that outlived the STK prompt as failed"""
+    connection = get_db_connection()
+    if not connection:
+        return []
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT checkout_request_id FROM mpesa_transactions
+        WHERE status = 'pending'
+          AND transaction_date <= NOW() - INTERVAL %s MINUTE
+        LIMIT %s
+        """
+        cursor.execute(query, (PENDING_TIMEOUT_MINUTES, BATCH_SIZE))
+        stale_ids = [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error finding stale transactions: {e}")
+        return []
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    for checkout_request_id in stale_ids:
+        apply_payment_result(checkout_request_id, "failed", None, "Payment request timed out")
+
+    return stale_ids
+
+def reconcile_transaction(transaction, access_token):
+    """Query and record the status of a single pending transaction"""
+    result = query_stk_push_status(transaction["checkout_request_id"], access_token)
+    if "error" in result:
+        return "error"
+    return apply_stk_query_result(transaction, result)
+
+def reconcile_pending_transactions():
+    """Run one reconciliation pass and return a summary of the outcomes"""
+    summary = {"checked": 0, "completed": 0, "failed": 0, "pending": 0, "error": 0, "expired": 0}
+
+    summary["expired"] = len(expire_stale_transactions())
+
+    transactions = get_pending_transactions()
+    if not transactions:
+        return summary
+
+    # One OAuth token for the whole batch
+    access_token = get_access_token()
+    if not access_token:
+        print("Payment reconciler: failed to get access token, skipping pass")
+        return summary
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_QUERIES) as executor:
+        outcomes = executor.map(lambda t: reconcile_transaction(t, access_token), transactions)
+        for outcome in outcomes:
+            summary["checked"] += 1
+            summary[outcome] += 1
+
+    print(f"Payment reconciler pass: {summary}")
+    return summary
+
+def _run_reconciler():
+    while not _stop_event.is_set():
+        try:
+            reconcile_pending_transactions()
+        except Exception as e:
+            print(f"Error in payment reconciler: {e}")
+        _stop_event.wait(RECONCILE_INTERVAL_SECONDS)
+
+def start_payment_reconciler():
+    """Start the background payment reconciler thread"""
+    global _reconciler_thread
+    if _reconciler_thread and _reconciler_thread.is_alive():
+        return _reconciler_thread
+
+    _stop_event.clear()
+    _reconciler_thread = threading.Thread(target=_run_reconciler, name="payment-reconciler", daemon=True)
+    _reconciler_thread.start()
+    print("Payment reconciler started")
+    return _reconciler_thread
+
+def stop_payment_reconciler():
+    """Signal the background payment reconciler thread to stop"""
+    _stop_event.set()
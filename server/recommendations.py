@@ -0,0 +1,390 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from itertools import combinations
+from database import get_db_connection, dict_from_row
+from artwork import get_artworks_by_ids
+from artwork_similarity import attribute_arrays, attribute_similarity, encode_attributes
+import catalog_events
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("Warning: NumPy is not installed, recommendations are disabled")
+
+# Most similar artworks kept per artwork; scoring only looks at these
+RECOMMENDATION_NEIGHBOURS = 50
+
+# Contribution of co-purchases to the similarity of two artworks, on top of
+# the attribute similarity of artwork_similarity.py
+CO_PURCHASE_WEIGHT = 0.6
+
+# Rows of the similarity matrix computed at a time, bounding memory to
+# SIMILARITY_BLOCK_SIZE x catalog size floats
+SIMILARITY_BLOCK_SIZE = 512
+
+# Only a buyer's most recent purchases form co-purchase pairs, so one
+# collector cannot add a quadratic number of pairs
+MAX_ITEMS_PER_BUYER = 50
+
+DEFAULT_RECOMMENDATIONS = 6
+MAX_RECOMMENDATIONS = 50
+
+# Catalog changes are batched for this long before the matrix is rebuilt
+REBUILD_DELAY_SECONDS = 30
+
+# The matrix is rebuilt at least this often to take in new co-purchases
+REBUILD_INTERVAL_SECONDS = 60 * 60
+
+# New orders are read into the preference profiles at most this often
+PROFILE_SYNC_SECONDS = 5
+
+_stop_event = threading.Event()
+_rebuild_requested = threading.Event()
+_builder_thread = None
+
+# The similarity index: the RECOMMENDATION_NEIGHBOURS nearest artworks of
+# every artwork, replaced by each rebuild; sales only swap the available flags
+_index_lock = threading.Lock()
+_snapshot = {"ids": [], "positions": {}, "neighbours": None, "weights": None,
+             "available": None, "popular": None}
+
+# user_id -> {artwork_id: number of orders}; a changed profile is replaced,
+# never modified in place
+_profiles = {}
+_profiles_lock = threading.Lock()
+_last_order_id = 0
+_last_profile_sync = 0.0
+
+def _load_catalog():
+    """Attributes of every artwork, newest first, as parallel arrays"""
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError("Database connection failed")
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT id, artist, artist_id, medium, price, year, status
+        FROM artworks
+        ORDER BY created_at DESC, id DESC
+        """
+        cursor.execute(query)
+        rows = [dict_from_row(row, cursor) for row in cursor.fetchall()]
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    artists, mediums = {}, {}
+    return {
+        "ids": [str(row["id"]) for row in rows],
+        "attributes": attribute_arrays([encode_attributes(row, artists, mediums) for row in rows]),
+        "available": np.array([row["status"] == "available" for row in rows], dtype=bool),
+    }
+
+def _load_co_purchases(positions):
+    """Co-purchase pairs as (rows, cols, strengths) and purchase counts per artwork
+
+    Two artworks bought by the same user form a pair; its strength is the
+    number of such users over the geometric mean of the two purchase counts.
+    """
+    connection = get_db_connection()
+    if connection is None:
+        raise RuntimeError("Database connection failed")
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT user_id, artwork_id FROM artwork_orders
+        WHERE payment_status = 'completed'
+        ORDER BY user_id, id DESC
+        """
+        cursor.execute(query)
+        rows = cursor.fetchall()
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    purchases = np.zeros(len(positions), dtype=np.float32)
+    baskets = {}
+    for user_id, artwork_id in rows:
+        position = positions.get(str(artwork_id))
+        if position is None:
+            continue
+        purchases[position] += 1
+        basket = baskets.setdefault(user_id, [])
+        if len(basket) < MAX_ITEMS_PER_BUYER and position not in basket:
+            basket.append(position)
+
+    pairs = {}
+    for basket in baskets.values():
+        for a, b in combinations(sorted(basket), 2):
+            pairs[(a, b)] = pairs.get((a, b), 0) + 1
+
+    if not pairs:
+        empty = np.zeros(0, dtype=np.int32)
+        return (empty, empty, np.zeros(0, dtype=np.float32)), purchases
+
+    a = np.fromiter((pair[0] for pair in pairs), dtype=np.int32, count=len(pairs))
+    b = np.fromiter((pair[1] for pair in pairs), dtype=np.int32, count=len(pairs))
+    counts = np.fromiter(pairs.values(), dtype=np.float32, count=len(pairs))
+    strengths = counts / np.sqrt(purchases[a] * purchases[b])
+    # Both directions, so every row of the matrix sees its pairs
+    return (np.concatenate([a, b]), np.concatenate([b, a]), np.concatenate([strengths, strengths])), purchases
+
+def _similarity_block(catalog, co_purchases, start, stop):
+    """Rows start:stop of the item-item similarity matrix"""
+    attributes = catalog["attributes"]
+    sims = attribute_similarity(
+        [column[start:stop, None] for column in attributes],
+        [column[None, :] for column in attributes],
+    )
+
+    rows, cols, strengths = co_purchases
+    in_block = (rows >= start) & (rows < stop)
+    np.add.at(sims, (rows[in_block] - start, cols[in_block]), CO_PURCHASE_WEIGHT * strengths[in_block])
+
+    # An artwork is never its own neighbour
+    sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+    return sims
+
+def build_similarity_index():
+    """Recompute the nearest neighbours of every artwork and swap them in"""
+    global _snapshot
+    if np is None:
+        return False
+
+    started = time.time()
+    catalog = _load_catalog()
+    ids = catalog["ids"]
+    positions = {artwork_id: position for position, artwork_id in enumerate(ids)}
+    co_purchases, purchases = _load_co_purchases(positions)
+
+    count = len(ids)
+    neighbour_count = min(RECOMMENDATION_NEIGHBOURS, max(count - 1, 0))
+    neighbours = np.zeros((count, neighbour_count), dtype=np.int32)
+    weights = np.zeros((count, neighbour_count), dtype=np.float32)
+
+    if neighbour_count:
+        for start in range(0, count, SIMILARITY_BLOCK_SIZE):
+            stop = min(count, start + SIMILARITY_BLOCK_SIZE)
+            sims = _similarity_block(catalog, co_purchases, start, stop)
+            top = np.argpartition(-sims, neighbour_count - 1, axis=1)[:, :neighbour_count]
+            neighbours[start:stop] = top
+            weights[start:stop] = np.take_along_axis(sims, top, axis=1)
+
+    # Most purchased first, newest first among equals (ids are newest first)
+    popular = np.lexsort((np.arange(count), -purchases)).astype(np.int32)
+
+    with _index_lock:
+        _snapshot = {
+            "ids": ids,
+            "positions": positions,
+            "neighbours": neighbours,
+            "weights": weights,
+            "available": catalog["available"],
+            "popular": popular,
+        }
+
+    print(f"Built recommendation index of {count} artworks in {time.time() - started:.2f}s")
+    return True
+
+def _set_available(artwork_id, available):
+    """Mark one artwork as for sale or not without a rebuild"""
+    global _snapshot
+    with _index_lock:
+        position = _snapshot["positions"].get(artwork_id)
+        if position is None or _snapshot["available"][position] == available:
+            return
+        flags = _snapshot["available"].copy()
+        flags[position] = available
+        _snapshot = {**_snapshot, "available": flags}
+
+def sync_profiles(force=False):
+    """Fold orders placed since the last sync into the preference profiles
+
+    Orders are read past the highest id seen so far, so each sync only
+    touches new rows. Every order counts, paid or not: ordering an artwork
+    is the preference signal.
+    """
+    global _last_order_id, _last_profile_sync
+    with _profiles_lock:
+        if not force and time.time() - _last_profile_sync < PROFILE_SYNC_SECONDS:
+            return
+        _last_profile_sync = time.time()
+
+        connection = get_db_connection()
+        if connection is None:
+            print("Error syncing preference profiles: Database connection failed")
+            return
+
+        cursor = connection.cursor()
+
+        try:
+            query = """
+            SELECT id, user_id, artwork_id FROM artwork_orders
+            WHERE id > %s
+            ORDER BY id
+            """
+            cursor.execute(query, (_last_order_id,))
+            rows = cursor.fetchall()
+        except Exception as e:
+            print(f"Error syncing preference profiles: {e}")
+            return
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+        changed = {}
+        for order_id, user_id, artwork_id in rows:
+            user_id, artwork_id = str(user_id), str(artwork_id)
+            profile = changed.get(user_id)
+            if profile is None:
+                profile = changed[user_id] = dict(_profiles.get(user_id, {}))
+            profile[artwork_id] = profile.get(artwork_id, 0) + 1
+            _last_order_id = max(_last_order_id, order_id)
+        _profiles.update(changed)
+
+def recommend_for_user(user_id, k=DEFAULT_RECOMMENDATIONS):
+    """Ids of the k available artworks closest to what a user ordered
+
+    Every ordered artwork adds the similarities of its neighbours, weighted
+    by how often it was ordered. Returns None for users without orders.
+    """
+    snapshot = _snapshot
+    profile = _profiles.get(str(user_id))
+    if not profile or snapshot["neighbours"] is None:
+        return None
+
+    ordered = [(snapshot["positions"][artwork_id], count) for artwork_id, count in profile.items()
+               if artwork_id in snapshot["positions"]]
+    if not ordered:
+        return None
+
+    sources = np.array([position for position, _ in ordered], dtype=np.int32)
+    counts = np.array([count for _, count in ordered], dtype=np.float32)
+
+    scores = np.zeros(len(snapshot["ids"]), dtype=np.float32)
+    np.add.at(scores, snapshot["neighbours"][sources].ravel(),
+              (snapshot["weights"][sources] * counts[:, None]).ravel())
+
+    eligible = snapshot["available"] & (scores > 0)
+    eligible[sources] = False
+    candidates = np.flatnonzero(eligible)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [snapshot["ids"][i] for i in candidates]
+
+def recommend_popular(k=DEFAULT_RECOMMENDATIONS):
+    """Ids of the k most purchased available artworks"""
+    snapshot = _snapshot
+    if snapshot["popular"] is None:
+        return []
+    popular = snapshot["popular"]
+    ranked = popular[snapshot["available"][popular]][:k]
+    return [snapshot["ids"][i] for i in ranked]
+
+def get_recommendations(user_id=None, k=DEFAULT_RECOMMENDATIONS):
+    """Handle /recommendations: top-k artworks for a user, or popular ones
+
+    personalized is false when there is no user or the user has no orders
+    yet; the artworks are then the most purchased ones.
+    """
+    if np is None:
+        return {"error": "Recommendations are not available"}
+    try:
+        k = min(MAX_RECOMMENDATIONS, max(1, int(k)))
+    except (TypeError, ValueError):
+        return {"error": "k must be a number"}
+
+    artwork_ids = None
+    if user_id is not None:
+        sync_profiles()
+        artwork_ids = recommend_for_user(user_id, k)
+
+    personalized = artwork_ids is not None
+    if not personalized:
+        artwork_ids = recommend_popular(k)
+
+    result = get_artworks_by_ids(artwork_ids)
+    if "error" in result:
+        return result
+    result["personalized"] = personalized
+    return result
+
+def _on_catalog_change(kind, action, item_id, item):
+    if kind != catalog_events.ARTWORK:
+        return
+    if action == catalog_events.SOLD:
+        _set_available(item_id, False)
+        return
+    if action == catalog_events.UPDATED and item and item.get("status"):
+        _set_available(item_id, item["status"] == "available")
+    # Attribute changes, new and deleted artworks need new neighbours
+    _rebuild_requested.set()
+
+def _run_builder():
+    while not _stop_event.is_set():
+        requested = _rebuild_requested.wait(REBUILD_INTERVAL_SECONDS)
+        if requested:
+            # Let a burst of changes settle into one rebuild
+            _stop_event.wait(REBUILD_DELAY_SECONDS)
+        if _stop_event.is_set():
+            break
+        _rebuild_requested.clear()
+        try:
+            build_similarity_index()
+        except Exception as e:
+            print(f"Error building recommendation index: {e}")
+
+def start_recommendation_engine():
+    """Build the similarity index and profiles, and keep them current"""
+    global _builder_thread
+    if np is None:
+        return
+    if _builder_thread and _builder_thread.is_alive():
+        return _builder_thread
+
+    catalog_events.subscribe(_on_catalog_change)
+    try:
+        build_similarity_index()
+    except Exception as e:
+        print(f"Error building recommendation index: {e}")
+    sync_profiles(force=True)
+
+    _stop_event.clear()
+    _builder_thread = threading.Thread(target=_run_builder, name="recommendation-builder", daemon=True)
+    _builder_thread.start()
+    print("Recommendation engine started")
+    return _builder_thread
+
+def stop_recommendation_engine():
+    """Signal the recommendation index builder thread to stop"""
+    catalog_events.unsubscribe(_on_catalog_change)
+    _stop_event.set()
+    _rebuild_requested.set()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recommend artworks from the similarity index")
+    parser.add_argument("--user", help="User id to recommend for (most purchased artworks if omitted)")
+    parser.add_argument("-k", type=int, default=DEFAULT_RECOMMENDATIONS)
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit(1)
+    try:
+        build_similarity_index()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    sync_profiles(force=True)
+    print(json.dumps(get_recommendations(args.user, args.k), indent=2, default=str))
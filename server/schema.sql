@@ -96,7 +96,11 @@ CREATE TABLE IF NOT EXISTS exhibition_bookings (
     booking_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     total_amount DECIMAL(10, 2) NOT NULL,
     FOREIGN KEY (user_id) REFERENCES users(id),
-    FOREIGN KEY (exhibition_id) REFERENCES exhibitions(id)
+    FOREIGN KEY (exhibition_id) REFERENCES exhibitions(id),
+    UNIQUE INDEX idx_bookings_ticket_code (ticket_code),
+    INDEX idx_bookings_exhibition_date (exhibition_id, booking_date),
+    INDEX idx_bookings_status_date (status, booking_date),
+    INDEX idx_bookings_date (booking_date)
 );
 
 -- Legacy tables (kept for backward compatibility)
@@ -124,3 +128,64 @@ CREATE TABLE IF NOT EXISTS orders (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
+
+-- M-Pesa transactions table
+CREATE TABLE IF NOT EXISTS mpesa_transactions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    checkout_request_id VARCHAR(100) NOT NULL,
+    checkout_handle VARCHAR(64),
+    merchant_request_id VARCHAR(100) NOT NULL,
+    order_type VARCHAR(20) NOT NULL,
+    order_id INT NOT NULL,
+    user_id INT NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    phone_number VARCHAR(20) NOT NULL,
+    result_code VARCHAR(10),
+    result_desc VARCHAR(255),
+    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status ENUM('pending', 'completed', 'failed') NOT NULL DEFAULT 'pending',
+    UNIQUE INDEX idx_mpesa_checkout_request_id (checkout_request_id),
+    UNIQUE INDEX idx_mpesa_checkout_handle (checkout_handle),
+    INDEX idx_mpesa_status_date (status, transaction_date),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Checkout holds table
+-- artwork_lock is set to the artwork id while an artwork hold is active, so the
+-- unique index allows only one active checkout per artwork
+CREATE TABLE IF NOT EXISTS checkout_holds (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    hold_type ENUM('artwork', 'exhibition') NOT NULL,
+    item_id INT NOT NULL,
+    order_id INT,
+    slots INT NOT NULL DEFAULT 1,
+    artwork_lock INT NULL,
+    status ENUM('active', 'converted', 'released') NOT NULL DEFAULT 'active',
+    expires_at DATETIME NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE INDEX idx_holds_artwork_lock (artwork_lock),
+    INDEX idx_holds_status_expires (status, expires_at),
+    INDEX idx_holds_order (hold_type, order_id)
+);
+
+-- Per-exhibition ticket counters, maintained with every booking status change
+CREATE TABLE IF NOT EXISTS exhibition_occupancy (
+    exhibition_id INT PRIMARY KEY,
+    sold_tickets INT NOT NULL DEFAULT 0,
+    sold_slots INT NOT NULL DEFAULT 0,
+    used_slots INT NOT NULL DEFAULT 0,
+    cancelled_slots INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (exhibition_id) REFERENCES exhibitions(id) ON DELETE CASCADE
+);
+
+-- Colour histogram (float32 bytes) and dominant colours (JSON) of each artwork image
+CREATE TABLE IF NOT EXISTS artwork_features (
+    artwork_id INT PRIMARY KEY,
+    image_url VARCHAR(255) NOT NULL,
+    histogram BLOB NOT NULL,
+    palette TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (artwork_id) REFERENCES artworks(id) ON DELETE CASCADE
+);
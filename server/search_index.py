@@ -0,0 +1,255 @@
+import re
+import json
+import math
+import heapq
+import bisect
+import argparse
+import threading
+import unicodedata
+from artwork import get_all_artworks
+from exhibition import get_all_exhibitions
+from catalog_index import CatalogIndex
+import catalog_events
+
+# Indexed fields of each kind of document and how much a match in each counts
+FIELD_WEIGHTS = {
+    catalog_events.ARTWORK: {"title": 3.0, "artist": 2.0, "medium": 1.5, "description": 1.0},
+    catalog_events.EXHIBITION: {"title": 3.0, "location": 2.0, "description": 1.0},
+}
+
+# BM25 term frequency saturation and document length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# A query word also matches indexed words it is a prefix of ("impr" ->
+# "impression", "impressionism"), at this share of an exact match and for at
+# most this many words
+PREFIX_MATCH_WEIGHT = 0.6
+MAX_PREFIX_EXPANSIONS = 50
+
+# Query words shorter than this only match exactly
+MIN_PREFIX_LENGTH = 2
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+STOP_WORDS = {"a", "an", "and", "at", "by", "for", "in", "of", "on", "or", "the", "to", "with"}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Postings are changed in place under _index_lock; searches and updates
+# only touch the postings of the words involved
+_index_lock = threading.Lock()
+# word -> {document key: weighted term frequency}
+_postings = {}
+# Every indexed word, sorted, for prefix lookups with bisect
+_words = []
+# document key -> {"length", "words", "summary"}; keys are (kind, id)
+_documents = {}
+_total_length = 0.0
+
+def tokenize(text):
+    """Lowercase words of a text without accents or stop words"""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [word for word in _TOKEN_PATTERN.findall(text) if word not in STOP_WORDS]
+
+def _summary(kind, item_id, item):
+    """The fields a search result carries, named as the item's own API names them"""
+    if kind == catalog_events.ARTWORK:
+        return {
+            "type": kind, "id": item_id, "title": item.get("title"), "artist": item.get("artist"),
+            "medium": item.get("medium"), "price": item.get("price"), "status": item.get("status"),
+            "image_url": item.get("image_url"),
+        }
+    return {
+        "type": kind, "id": item_id, "title": item.get("title"), "location": item.get("location"),
+        "startDate": item.get("startDate"), "endDate": item.get("endDate"), "status": item.get("status"),
+        "imageUrl": item.get("imageUrl"),
+    }
+
+def _remove_document(key):
+    # Caller holds _index_lock
+    global _total_length
+    document = _documents.pop(key, None)
+    if document is None:
+        return
+    _total_length -= document["length"]
+    for word in document["words"]:
+        postings = _postings.get(word)
+        if postings is None:
+            continue
+        postings.pop(key, None)
+        if not postings:
+            del _postings[word]
+            position = bisect.bisect_left(_words, word)
+            if position < len(_words) and _words[position] == word:
+                del _words[position]
+
+def _add_document(kind, item_id, item):
+    # Caller holds _index_lock
+    global _total_length
+    key = (kind, str(item_id))
+    _remove_document(key)
+
+    frequencies = {}
+    length = 0.0
+    for field, weight in FIELD_WEIGHTS[kind].items():
+        words = tokenize(item.get(field))
+        length += weight * len(words)
+        for word in words:
+            frequencies[word] = frequencies.get(word, 0.0) + weight
+
+    for word, frequency in frequencies.items():
+        postings = _postings.get(word)
+        if postings is None:
+            postings = _postings[word] = {}
+            bisect.insort(_words, word)
+        postings[key] = frequency
+
+    _documents[key] = {"length": length, "words": list(frequencies), "summary": _summary(kind, str(item_id), item)}
+    _total_length += length
+
+def index_item(kind, item_id, item):
+    """Add or replace one artwork or exhibition in the index"""
+    with _index_lock:
+        _add_document(kind, item_id, item)
+
+def remove_item(kind, item_id):
+    with _index_lock:
+        _remove_document((kind, str(item_id)))
+
+def load_search_index():
+    """Index every artwork and exhibition, as their APIs return them"""
+    global _total_length
+    artworks = get_all_artworks()
+    exhibitions = get_all_exhibitions()
+    for result in (artworks, exhibitions):
+        if "error" in result:
+            print(f"Error loading search index: {result['error']}")
+            return False
+    artworks, exhibitions = artworks["artworks"], exhibitions["exhibitions"]
+
+    with _index_lock:
+        _postings.clear()
+        _documents.clear()
+        del _words[:]
+        _total_length = 0.0
+        for artwork in artworks:
+            _add_document(catalog_events.ARTWORK, artwork["id"], artwork)
+        for exhibition in exhibitions:
+            _add_document(catalog_events.EXHIBITION, exhibition["id"], exhibition)
+
+    print(f"Indexed {len(artworks)} artworks and {len(exhibitions)} exhibitions for search")
+    return True
+
+def _expand(word):
+    """(indexed word, weight) pairs a query word matches; caller holds _index_lock"""
+    matches = []
+    if word in _postings:
+        matches.append((word, 1.0))
+    if len(word) < MIN_PREFIX_LENGTH:
+        return matches
+
+    position = bisect.bisect_right(_words, word)
+    while position < len(_words) and len(matches) < MAX_PREFIX_EXPANSIONS:
+        candidate = _words[position]
+        if not candidate.startswith(word):
+            break
+        matches.append((candidate, PREFIX_MATCH_WEIGHT))
+        position += 1
+    return matches
+
+def search(query, kind=None, limit=DEFAULT_SEARCH_LIMIT, offset=0):
+    """Documents matching a query, best first, as (total, [(score, summary)])
+
+    Each query word is scored with BM25 over the words it matches exactly or
+    as a prefix. Documents matching more of the query words rank first, then
+    by score.
+    """
+    words = list(dict.fromkeys(tokenize(query)))
+    if not words:
+        return 0, []
+
+    with _index_lock:
+        count = len(_documents)
+        if not count:
+            return 0, []
+        average_length = _total_length / count or 1.0
+
+        scores = {}
+        matched = {}
+        for word in words:
+            word_scores = {}
+            for term, weight in _expand(word):
+                postings = _postings[term]
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                factor = weight * idf * (BM25_K1 + 1)
+                for key, frequency in postings.items():
+                    if kind and key[0] != kind:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * _documents[key]["length"] / average_length)
+                    score = factor * frequency / (frequency + norm)
+                    # A document counts its best match of each query word
+                    if score > word_scores.get(key, 0.0):
+                        word_scores[key] = score
+            for key, score in word_scores.items():
+                scores[key] = scores.get(key, 0.0) + score
+                matched[key] = matched.get(key, 0) + 1
+
+        top = heapq.nlargest(offset + limit, scores, key=lambda key: (matched[key], scores[key]))
+        results = [(scores[key], dict(_documents[key]["summary"])) for key in top[offset:]]
+    return len(scores), results
+
+def search_catalog(query, kind=None, limit=DEFAULT_SEARCH_LIMIT, page=1):
+    """Handle /search?q=: ranked artworks and exhibitions matching the words"""
+    if not query or not query.strip():
+        return {"error": "A search query is required"}
+    if kind and kind not in FIELD_WEIGHTS:
+        return {"error": f"Unknown type: {kind}"}
+    try:
+        limit = min(MAX_SEARCH_LIMIT, max(1, int(limit)))
+        page = max(1, int(page))
+    except (TypeError, ValueError):
+        return {"error": "limit and page must be numbers"}
+
+    _index.ensure_loaded()
+    total, results = search(query, kind, limit, (page - 1) * limit)
+    for score, summary in results:
+        summary["score"] = round(score, 4)
+    return {"query": query, "total": total, "page": page, "limit": limit,
+            "results": [summary for _, summary in results]}
+
+def _on_catalog_change(kind, action, item_id, item):
+    if kind not in FIELD_WEIGHTS:
+        return
+    if action == catalog_events.DELETED:
+        remove_item(kind, item_id)
+    elif action == catalog_events.SOLD:
+        with _index_lock:
+            document = _documents.get((kind, item_id))
+            if document is not None:
+                document["summary"] = {**document["summary"], "status": "sold"}
+    elif item and action in (catalog_events.CREATED, catalog_events.UPDATED):
+        index_item(kind, item_id, item)
+
+_index = CatalogIndex(load_search_index, _on_catalog_change)
+
+def start_search_index():
+    """Build the search index and keep it current as the catalog changes"""
+    _index.start()
+
+def stop_search_index():
+    _index.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search artworks and exhibitions")
+    parser.add_argument("query")
+    parser.add_argument("--type", choices=sorted(FIELD_WEIGHTS))
+    parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT)
+    args = parser.parse_args()
+
+    _index.load_or_exit()
+    print(json.dumps(search_catalog(args.query, args.type, args.limit), indent=2, default=str))
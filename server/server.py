@@ -16,13 +16,47 @@ from exhibition import get_all_exhibitions, get_exhibition, create_exhibition, u
 from contact import create_contact_message, get_messages, update_message, json_dumps
 from db_setup import initialize_database
 from middleware import auth_required, admin_required, extract_auth_token, verify_token
-from mpesa import handle_stk_push_request, check_transaction_status, handle_mpesa_callback
-from db_operations import get_all_tickets, get_all_orders, get_artist_artworks, get_artist_orders, get_all_artists, get_user_orders
+from mpesa import check_transaction_status
+from checkout import handle_checkout_request
+from payment_reconciler import start_payment_reconciler, stop_payment_reconciler
+from checkout_holds import start_hold_sweeper, stop_hold_sweeper
+from callback_journal import append_callback, start_callback_workers, stop_callback_workers
+from ticket_checkin import check_in_ticket, start_ticket_index, stop_ticket_index
+from ticket_documents import generate_ticket, stop_ticket_renderer
+from ticket_ledger import get_ticket_ledger, get_exhibition_occupancy
+from multipart import parse_multipart, MultipartError, UploadTooLarge
+from upload_sessions import create_upload_session, get_upload_status, write_upload_chunk, finalize_upload
+from image_derivatives import get_variant_path, stop_derivative_workers
+from media_gc import start_media_gc, stop_media_gc
+from image_features import search_artworks_by_color, start_feature_index, stop_feature_workers
+from recommendations import get_recommendations, start_recommendation_engine, stop_recommendation_engine
+from similar_artworks import get_similar_artworks, start_similar_index, stop_similar_index
+from search_index import search_catalog, start_search_index, stop_search_index
+from autocomplete import get_autocomplete, start_autocomplete_index, stop_autocomplete_index
+from facets import get_artwork_facets, start_facet_index, stop_facet_index
+from exhibition_calendar import get_exhibition_calendar, get_exhibitions_on, start_exhibition_calendar, stop_exhibition_calendar
+from payment_events import subscribe as subscribe_payment_status, unsubscribe as unsubscribe_payment_status
+from db_operations import get_all_orders, get_artist_artworks, get_artist_orders, get_all_artists, get_user_orders
 from database import get_db_connection  # Add this import
 
 # Define the port
 PORT = 8000
 
+# Endpoints that accept multipart/form-data image uploads
+MULTIPART_UPLOAD_PATHS = ('/artworks', '/exhibitions')
+
+# Image variants are named by content hash and never change
+VARIANT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# HTTP status for each reason a resumable upload request can fail
+UPLOAD_ERROR_STATUS = {"bad_request": 400, "not_found": 404, "forbidden": 403, "conflict": 409, "too_large": 413}
+
+# Payment status streams send a keep-alive comment this often
+PAYMENT_STREAM_HEARTBEAT_SECONDS = 15
+
+# Payment status streams give up after this long (STK prompts expire well before)
+PAYMENT_STREAM_TIMEOUT_SECONDS = 180
+
 # Ensure the static/uploads directory exists
 def ensure_uploads_directory():
     uploads_dir = os.path.join(os.path.dirname(__file__), "static", "uploads")
@@ -87,87 +121,6 @@ class DecimalEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super(DecimalEncoder, self).default(obj)
 
-# Mock data for tickets (in a real app, this would come from a database)
-# We'll use this for demo purposes
-mock_tickets = [
-    {
-        "id": "ticket-001",
-        "userId": "user-123",
-        "userName": "John Doe",
-        "exhibitionId": "exhibition-1",
-        "exhibitionTitle": "Modern Art Showcase",
-        "bookingDate": "2025-04-20T14:00:00",
-        "ticketCode": "EXHB-001-123",
-        "slots": 2,
-        "status": "active"
-    },
-    {
-        "id": "ticket-002",
-        "userId": "user-456",
-        "userName": "Jane Smith",
-        "exhibitionId": "exhibition-2",
-        "exhibitionTitle": "Classical Paintings",
-        "bookingDate": "2025-04-21T10:30:00",
-        "ticketCode": "EXHB-002-456",
-        "slots": 1,
-        "status": "used"
-    },
-    {
-        "id": "ticket-003",
-        "userId": "user-789",
-        "userName": "Alex Johnson",
-        "exhibitionId": "exhibition-1",
-        "exhibitionTitle": "Modern Art Showcase",
-        "bookingDate": "2025-04-22T16:15:00",
-        "ticketCode": "EXHB-001-789",
-        "slots": 3,
-        "status": "cancelled"
-    }
-]
-
-# Function to get all tickets (mock implementation)
-def get_all_tickets(auth_header):
-    """Get all tickets (admin only)"""
-    print(f"Getting all tickets with auth header: {auth_header[:20]}... (truncated)")
-    
-    # Extract and verify token - directly use the token from auth_header
-    token = extract_auth_token(auth_header)
-    if not token:
-        print("Authentication required - no token found")
-        return {"error": "Authentication required"}
-    
-    payload = verify_token(token)
-    if isinstance(payload, dict) and "error" in payload:
-        print(f"Authentication failed: {payload['error']}")
-        return {"error": payload["error"]}
-    
-    # Check if user is admin
-    if not payload.get("is_admin", False):
-        print("Access denied - not an admin user")
-        return {"error": "Unauthorized access: Admin privileges required"}
-    
-    print(f"Admin user authenticated, returning {len(mock_tickets)} tickets")
-    # Return tickets data
-    return {"tickets": mock_tickets}
-
-# Function to generate exhibition ticket (mock implementation)
-def generate_ticket(booking_id, auth_header):
-    # Extract and verify token
-    token = extract_auth_token(auth_header)
-    if not token:
-        return {"error": "Authentication required"}
-    
-    payload = verify_token(token)
-    if isinstance(payload, dict) and "error" in payload:
-        return {"error": payload["error"]}
-    
-    # In a real application, we would generate a PDF here
-    # For demo purposes, we'll return mock data
-    return {
-        "pdfData": "Mock PDF data for ticket " + booking_id,
-        "success": True
-    }
-
 class RequestHandler(http.server.BaseHTTPRequestHandler):
     
     def _set_response(self, status_code=200, content_type='application/json'):
@@ -175,13 +128,13 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
         self.send_header('Content-type', content_type)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, Upload-Offset')
         self.end_headers()
     
     def do_OPTIONS(self):
         self._set_response()
     
-    def serve_static_file(self, file_path):
+    def serve_static_file(self, file_path, cache_control=None, vary=None):
         """Serve a static file based on its MIME type"""
         try:
             # Check if file exists
@@ -212,6 +165,10 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
             self.send_response(200)
             self.send_header('Content-type', content_type)
             self.send_header('Content-Length', str(file_size))
+            if cache_control:
+                self.send_header('Cache-Control', cache_control)
+            if vary:
+                self.send_header('Vary', vary)
             self.end_headers()
             
             # Read and send the file
@@ -223,6 +180,131 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
             self.send_response(500)
             self.end_headers()
     
+    def read_multipart_body(self, content_type, content_length):
+        """Parse a multipart upload into post data, or send an error and return None
+        
+        Only signed-in users may upload to the artwork and exhibition endpoints,
+        and that is checked before any of the body is read. Each file part's
+        media URL is stored under its field name; a file in the "image" field
+        becomes the imageUrl the endpoints expect.
+        """
+        path = urllib.parse.urlparse(self.path).path
+        if not path.startswith(MULTIPART_UPLOAD_PATHS):
+            self.close_connection = True
+            self._set_response(415)
+            self.wfile.write(json_dumps({"error": "Multipart uploads are not supported here"}).encode())
+            return None
+        
+        token = extract_auth_token(self.headers.get('Authorization', ''))
+        payload = verify_token(token) if token else None
+        if not payload or (isinstance(payload, dict) and "error" in payload):
+            # Don't read an unauthenticated upload at all
+            self.close_connection = True
+            self._set_response(401)
+            self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
+            return None
+        
+        try:
+            fields, files = parse_multipart(self.rfile, content_type, content_length)
+        except UploadTooLarge as e:
+            # The rest of the body is left unread, so the connection can't be reused
+            self.close_connection = True
+            self._set_response(413)
+            self.wfile.write(json_dumps({"error": str(e)}).encode())
+            return None
+        except MultipartError as e:
+            self.close_connection = True
+            self._set_response(400)
+            self.wfile.write(json_dumps({"error": str(e)}).encode())
+            return None
+        
+        post_data = dict(fields)
+        post_data.update(files)
+        if "image" in files and not post_data.get("imageUrl"):
+            post_data["imageUrl"] = files["image"]
+        print(f"Parsed multipart data: fields {list(fields)}, files {files}")
+        return post_data
+    
+    def get_uploader(self):
+        """Return the token payload of an admin or artist, or send an error and return None"""
+        token = extract_auth_token(self.headers.get('Authorization', ''))
+        payload = verify_token(token) if token else None
+        if not payload or (isinstance(payload, dict) and "error" in payload):
+            self._set_response(401)
+            self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
+            return None
+        
+        if not (payload.get("is_admin", False) or payload.get("is_artist", False)):
+            self._set_response(403)
+            self.wfile.write(json_dumps({"error": "Admin or artist access required"}).encode())
+            return None
+        return payload
+    
+    def send_upload_response(self, response, success_status=200):
+        if "error" in response:
+            self._set_response(UPLOAD_ERROR_STATUS.get(response.get("reason"), 500))
+        else:
+            self._set_response(success_status)
+        self.wfile.write(json_dumps(response).encode())
+    
+    def put_upload_chunk(self, upload_id):
+        """Append the request body to a resumable upload
+        
+        The offset comes from the Upload-Offset header (or ?offset=), and the
+        body is copied to disk as it arrives rather than read into memory.
+        """
+        content_length = int(self.headers.get('Content-Length', 0))
+        payload = self.get_uploader()
+        if payload is None:
+            self.close_connection = True
+            return
+        
+        offset = self.headers.get('Upload-Offset')
+        if offset is None:
+            offset = parse_qs(urlparse(self.path).query).get('offset', [None])[0]
+        
+        response = write_upload_chunk(upload_id, payload.get("sub"), offset, self.rfile, content_length,
+                                      payload.get("is_admin", False))
+        if "error" in response:
+            # The body may be partly unread, so the connection can't be reused
+            self.close_connection = True
+        self.send_upload_response(response)
+    
+    def stream_payment_status(self, checkout_request_id):
+        """Stream the final status of a payment as Server-Sent Events"""
+        # Subscribe before reading the stored status so a result published in between is not missed
+        waiter = subscribe_payment_status(checkout_request_id)
+        
+        try:
+            status = check_transaction_status(checkout_request_id)
+            if "error" in status:
+                self._set_response(404 if status["error"] == "Transaction not found" else 400)
+                self.wfile.write(json_dumps(status).encode())
+                return
+            
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            
+            waited = 0
+            while status["status"] == "pending" and waited < PAYMENT_STREAM_TIMEOUT_SECONDS:
+                result = waiter.wait(PAYMENT_STREAM_HEARTBEAT_SECONDS)
+                if result:
+                    status = result
+                    break
+                waited += PAYMENT_STREAM_HEARTBEAT_SECONDS
+                self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+            
+            self.wfile.write(f"event: status\ndata: {json_dumps(status)}\n\n".encode())
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            print(f"Payment status stream for {checkout_request_id} closed by client")
+        finally:
+            unsubscribe_payment_status(waiter)
+    
     def do_GET(self):
         parsed_url = urllib.parse.urlparse(self.path)
         path = parsed_url.path
@@ -230,9 +312,20 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
         # Handle static files (images, CSS, JS, etc.)
         if path.startswith('/static/'):
             file_path = os.path.join(os.path.dirname(__file__), path[1:])
+            
+            # Uploaded images can be requested at a width (?w=640); the resized
+            # WebP variant is served to browsers that accept WebP. Both answers
+            # share the URL, so caches must key them on Accept.
+            width = parse_qs(parsed_url.query).get('w', [None])[0]
+            if width and 'image/webp' in self.headers.get('Accept', ''):
+                variant_path = get_variant_path(path, width)
+                if variant_path:
+                    self.serve_static_file(variant_path, VARIANT_CACHE_CONTROL, vary='Accept')
+                    return
+            
             # Debugging info
             print(f"Serving static file: {file_path}")
-            self.serve_static_file(file_path)
+            self.serve_static_file(file_path, vary='Accept' if width else None)
             return
         
         # Handle placeholder.svg specifically
@@ -250,6 +343,28 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
             self.wfile.write(json_dumps(response).encode())
             return
         
+        # Handle GET /artworks/search?color= (must come before /artworks/{id})
+        elif path == '/artworks/search':
+            query_params = parse_qs(parsed_url.query)
+            response = search_artworks_by_color(
+                query_params.get('color', [None])[0],
+                query_params.get('limit', [24])[0]
+            )
+            
+            if "error" in response:
+                self._set_response(503 if response["error"] == "Colour search is not available" else 400)
+            else:
+                self._set_response()
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
+        # Handle GET /artworks/facets (must come before /artworks/{id})
+        elif path == '/artworks/facets':
+            response = get_artwork_facets(parse_qs(parsed_url.query))
+            self._set_response()
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
         # Handle GET /artworks/{id}
         elif path.startswith('/artworks/') and len(path.split('/')) == 3:
             artwork_id = path.split('/')[2]
@@ -258,6 +373,72 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
             self.wfile.write(json_dumps(response).encode())
             return
         
+        # Handle GET /artworks/{id}/similar?k=
+        elif path.startswith('/artworks/') and path.endswith('/similar') and len(path.split('/')) == 4:
+            artwork_id = path.split('/')[2]
+            response = get_similar_artworks(artwork_id, parse_qs(parsed_url.query).get('k', [4])[0])
+            
+            if "error" in response:
+                if response["error"] == "Artwork not found":
+                    self._set_response(404)
+                elif response["error"] == "Similar artworks are not available":
+                    self._set_response(503)
+                else:
+                    self._set_response(400)
+            else:
+                self._set_response()
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
+        # Handle GET /search?q= over artworks and exhibitions
+        elif path == '/search':
+            query_params = parse_qs(parsed_url.query)
+            response = search_catalog(
+                query_params.get('q', [None])[0],
+                query_params.get('type', [None])[0],
+                query_params.get('limit', [20])[0],
+                query_params.get('page', [1])[0]
+            )
+            
+            self._set_response(400 if "error" in response else 200)
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
+        # Handle GET /autocomplete?prefix= for the search box
+        elif path == '/autocomplete':
+            query_params = parse_qs(parsed_url.query)
+            response = get_autocomplete(
+                query_params.get('prefix', [''])[0],
+                query_params.get('limit', [8])[0],
+                query_params.get('type', [None])[0]
+            )
+            
+            self._set_response(400 if "error" in response else 200)
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
+        # Handle GET /recommendations?k= (personalized when signed in)
+        elif path == '/recommendations':
+            # A missing or expired token gets the general recommendations
+            token = extract_auth_token(self.headers.get('Authorization', ''))
+            payload = verify_token(token) if token else None
+            user_id = None
+            if isinstance(payload, dict) and "error" not in payload:
+                # Artist and admin ids come from other tables than the order
+                # history, so only customers get personalized results
+                if not payload.get("is_admin") and not payload.get("is_artist"):
+                    user_id = payload.get("sub")
+            
+            k = parse_qs(parsed_url.query).get('k', [6])[0]
+            response = get_recommendations(user_id, k)
+            
+            if "error" in response:
+                self._set_response(503 if response["error"] == "Recommendations are not available" else 400)
+            else:
+                self._set_response()
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
         # Handle GET /exhibitions
         elif path == '/exhibitions':
             response = get_all_exhibitions()
@@ -265,6 +446,26 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
             self.wfile.write(json_dumps(response).encode())
             return
         
+        # Handle GET /exhibitions/calendar?from=&to= (must come before /exhibitions/{id})
+        elif path == '/exhibitions/calendar':
+            query_params = parse_qs(parsed_url.query)
+            response = get_exhibition_calendar(
+                query_params.get('from', [None])[0],
+                query_params.get('to', [None])[0]
+            )
+            
+            self._set_response(400 if "error" in response else 200)
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
+        # Handle GET /exhibitions/on?date= (must come before /exhibitions/{id})
+        elif path == '/exhibitions/on':
+            response = get_exhibitions_on(parse_qs(parsed_url.query).get('date', [None])[0])
+            
+            self._set_response(400 if "error" in response else 200)
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
         # Handle GET /exhibitions/{id}
         elif path.startswith('/exhibitions/') and len(path.split('/')) == 3:
             exhibition_id = path.split('/')[2]
@@ -356,10 +557,63 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
                 self.wfile.write(json_dumps({"error": "Admin access required"}).encode())
                 return
             
-            # Get tickets from database
-            from db_operations import get_all_tickets
-            response = get_all_tickets()
-            self._set_response()
+            # One page of the ticket ledger, filtered by the query string
+            query_params = parse_qs(parsed_url.query)
+            response = get_ticket_ledger(
+                exhibition_id=query_params.get('exhibitionId', [None])[0],
+                status=query_params.get('status', [None])[0],
+                date_from=query_params.get('from', [None])[0],
+                date_to=query_params.get('to', [None])[0],
+                page=query_params.get('page', [1])[0],
+                page_size=query_params.get('pageSize', [50])[0]
+            )
+            
+            if "error" in response:
+                self._set_response(400 if response["error"].startswith("Invalid") else 500)
+            else:
+                self._set_response()
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
+        # Handle GET /uploads/{id}: bytes received so far by a resumable upload
+        elif path.startswith('/uploads/') and len(path.split('/')) == 3:
+            payload = self.get_uploader()
+            if payload is None:
+                return
+            
+            response = get_upload_status(path.split('/')[2], payload.get("sub"), payload.get("is_admin", False))
+            self.send_upload_response(response)
+            return
+        
+        # Handle GET /tickets/occupancy (admin only)
+        elif path == '/tickets/occupancy':
+            auth_header = self.headers.get('Authorization', '')
+            
+            # Verify admin access
+            token = extract_auth_token(auth_header)
+            if not token:
+                self._set_response(401)
+                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
+                return
+            
+            payload = verify_token(token)
+            if isinstance(payload, dict) and "error" in payload:
+                self._set_response(401)
+                self.wfile.write(json_dumps({"error": payload["error"]}).encode())
+                return
+            
+            if not payload.get("is_admin", False):
+                self._set_response(403)
+                self.wfile.write(json_dumps({"error": "Admin access required"}).encode())
+                return
+            
+            query_params = parse_qs(parsed_url.query)
+            response = get_exhibition_occupancy(query_params.get('exhibitionId', [None])[0])
+            
+            if "error" in response:
+                self._set_response(400 if response["error"].startswith("Invalid") else 500)
+            else:
+                self._set_response()
             self.wfile.write(json_dumps(response).encode())
             return
         
@@ -466,18 +720,56 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
             print(f"Processing generate ticket request for booking {booking_id}")
             auth_header = self.headers.get('Authorization', '')
             
-            # Generate ticket
-            response = generate_ticket(booking_id, auth_header)
+            token = extract_auth_token(auth_header)
+            if not token:
+                self._set_response(401)
+                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
+                return
             
-            if "error" in response:
+            payload = verify_token(token)
+            if isinstance(payload, dict) and "error" in payload:
                 self._set_response(401)
-                self.wfile.write(json_dumps({"error": response["error"]}).encode())
+                self.wfile.write(json_dumps({"error": payload["error"]}).encode())
+                return
+            
+            # Render the ticket PDF, or reuse the cached render
+            response = generate_ticket(booking_id, int(payload.get("sub")), payload.get("is_admin", False))
+            
+            if "error" in response:
+                status_codes = {
+                    "Ticket not found": 404,
+                    "You do not have access to this ticket": 403,
+                    "Failed to render ticket": 500,
+                    "Database connection failed": 500
+                }
+                self._set_response(status_codes.get(response["error"], 400))
+                self.wfile.write(json_dumps(response).encode())
                 return
             
             self._set_response()
             self.wfile.write(json_dumps(response).encode())
             return
         
+        # Handle GET /mpesa/status/{checkoutRequestId}/stream (Server-Sent Events)
+        elif path.startswith('/mpesa/status/') and path.endswith('/stream') and len(path.split('/')) == 5:
+            checkout_request_id = path.split('/')[3]
+            self.stream_payment_status(checkout_request_id)
+            return
+        
+        # Handle GET /mpesa/status/{checkoutRequestId} (stored status only)
+        elif path.startswith('/mpesa/status/') and len(path.split('/')) == 4:
+            checkout_request_id = path.split('/')[3]
+            response = check_transaction_status(checkout_request_id)
+            
+            if "error" in response:
+                self._set_response(404 if response["error"] == "Transaction not found" else 400)
+                self.wfile.write(json_dumps(response).encode())
+                return
+            
+            self._set_response(200)
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
         # Default 404 response
         self._set_response(404)
         self.wfile.write(json_dumps({"error": "Resource not found"}).encode())
@@ -501,8 +793,10 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
                 post_data = json.loads(self.rfile.read(content_length).decode('utf-8'))
                 print(f"Parsed JSON data: {post_data}")
             elif "multipart/form-data" in content_type:
-                # For multipart form data (like file uploads), will be handled in specific endpoints
-                print("Multipart form data detected, will handle in endpoint")
+                # File parts are streamed to the media store as they arrive
+                post_data = self.read_multipart_body(content_type, content_length)
+                if post_data is None:
+                    return
             else:
                 # Handle plain form data (url-encoded)
                 form_data = self.rfile.read(content_length).decode('utf-8')
@@ -780,10 +1074,61 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
             self.wfile.write(json_dumps(response).encode())
             return
         
+        # Start a resumable image upload (admin or artist)
+        elif path == '/uploads':
+            payload = self.get_uploader()
+            if payload is None:
+                return
+            
+            response = create_upload_session(payload.get("sub"), post_data.get('size'), post_data.get('contentType'))
+            self.send_upload_response(response, 201)
+            return
+        
+        # Finalize a resumable upload into the media store
+        elif path.startswith('/uploads/') and path.endswith('/complete') and len(path.split('/')) == 4:
+            payload = self.get_uploader()
+            if payload is None:
+                return
+            
+            response = finalize_upload(path.split('/')[2], payload.get("sub"), payload.get("is_admin", False))
+            self.send_upload_response(response)
+            return
+        
+        # Check in a ticket at the exhibition entrance (admin only)
+        elif path == '/tickets/check-in':
+            auth_header = self.headers.get('Authorization', '')
+            token = extract_auth_token(auth_header)
+            if not token:
+                self._set_response(401)
+                self.wfile.write(json_dumps({"error": "Authentication required"}).encode())
+                return
+            
+            payload = verify_token(token)
+            if isinstance(payload, dict) and "error" in payload:
+                self._set_response(401)
+                self.wfile.write(json_dumps({"error": payload["error"]}).encode())
+                return
+            
+            if not payload.get("is_admin", False):
+                self._set_response(403)
+                self.wfile.write(json_dumps({"error": "Admin access required"}).encode())
+                return
+            
+            response = check_in_ticket(post_data.get('ticketCode'), post_data.get('exhibitionId'))
+            
+            if "error" in response:
+                status_codes = {"bad_request": 400, "invalid": 404, "used": 409, "wrong_exhibition": 409, "unpaid": 402, "cancelled": 410}
+                self._set_response(status_codes.get(response.get("reason"), 500))
+            else:
+                self._set_response(200)
+            
+            self.wfile.write(json_dumps(response).encode())
+            return
+        
         # New M-Pesa STK Push endpoint
         elif path == '/mpesa/stk-push':
             print("Processing M-Pesa STK Push request")
-            response = handle_stk_push_request(post_data)
+            response = handle_checkout_request(post_data)
             
             if "error" in response:
                 self._set_response(400)
@@ -797,15 +1142,19 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
         # M-Pesa callback endpoint
         elif path == '/mpesa/callback':
             print("Processing M-Pesa callback")
-            response = handle_mpesa_callback(post_data)
             
-            if "error" in response:
-                self._set_response(400)
-                self.wfile.write(json_dumps(response).encode())
+            # Journal the callback and acknowledge at once; workers apply it
+            try:
+                entry_id = append_callback(post_data)
+            except Exception as e:
+                print(f"Error journaling M-Pesa callback: {e}")
+                self._set_response(500)
+                self.wfile.write(json_dumps({"ResultCode": 1, "ResultDesc": "Rejected"}).encode())
                 return
             
+            print(f"Journaled M-Pesa callback as entry {entry_id}")
             self._set_response(200)
-            self.wfile.write(json_dumps(response).encode())
+            self.wfile.write(json_dumps({"ResultCode": 0, "ResultDesc": "Accepted"}).encode())
             return
             
         # M-Pesa transaction status check endpoint
@@ -829,13 +1178,24 @@ class RequestHandler(http.server.BaseHTTPRequestHandler):
         self.wfile.write(json_dumps({"error": "Resource not found"}).encode())
     
     def do_PUT(self):
+        # Resumable upload chunks are raw bytes, copied to disk as they arrive
+        upload_path = urllib.parse.urlparse(self.path).path
+        if upload_path.startswith('/uploads/') and len(upload_path.split('/')) == 3:
+            self.put_upload_chunk(upload_path.split('/')[2])
+            return
+        
         # Get content length
         content_length = int(self.headers.get('Content-Length', 0))
         
-        # Parse JSON data
+        # Parse JSON data, or multipart form data with file uploads
         post_data = {}
         if content_length > 0:
-            post_data = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            if "multipart/form-data" in self.headers.get('Content-Type', ''):
+                post_data = self.read_multipart_body(self.headers.get('Content-Type', ''), content_length)
+                if post_data is None:
+                    return
+            else:
+                post_data = json.loads(self.rfile.read(content_length).decode('utf-8'))
         
         # Process based on path
         path = self.path
@@ -1063,9 +1423,45 @@ def main():
     create_placeholder_svg()
     create_default_exhibition_image()
     
+    # Settle pending M-Pesa payments in the background
+    start_callback_workers()
+    start_payment_reconciler()
+    
+    # Release checkout holds that were never paid for
+    start_hold_sweeper()
+    
+    # Keep paid tickets in memory for door check-in
+    start_ticket_index()
+    
+    # Quarantine and then delete uploads no row refers to any more
+    start_media_gc()
+    
+    # Colour features of artwork images for /artworks/search
+    start_feature_index()
+    
+    # Item-item similarity index and preference profiles for /recommendations
+    start_recommendation_engine()
+    
+    # Feature matrix of available artworks for /artworks/{id}/similar
+    start_similar_index()
+    
+    # Inverted index of artworks and exhibitions for /search
+    start_search_index()
+    
+    # Titles, artists and mediums for /autocomplete
+    start_autocomplete_index()
+    
+    # Bitmaps of artworks per filter value for /artworks/facets
+    start_facet_index()
+    
+    # Date index for /exhibitions/calendar and the daily exhibition status job
+    start_exhibition_calendar()
+    
     # Create an HTTP server
     print(f"Starting server on port {PORT}...")
     httpd = socketserver.ThreadingTCPServer(("", PORT), RequestHandler)
+    # Don't let open payment status streams block shutdown
+    httpd.daemon_threads = True
     print(f"Server running on port {PORT}")
     
     try:
@@ -1073,6 +1469,20 @@ def main():
     except KeyboardInterrupt:
         print("\nShutting down server...")
     finally:
+        stop_payment_reconciler()
+        stop_callback_workers()
+        stop_hold_sweeper()
+        stop_ticket_index()
+        stop_ticket_renderer()
+        stop_derivative_workers()
+        stop_media_gc()
+        stop_feature_workers()
+        stop_recommendation_engine()
+        stop_similar_index()
+        stop_search_index()
+        stop_autocomplete_index()
+        stop_facet_index()
+        stop_exhibition_calendar()
         httpd.server_close()
         print("Server closed")
 
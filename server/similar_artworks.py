@@ -0,0 +1,179 @@
+import sys
+import json
+import argparse
+import threading
+from database import get_db_connection, dict_from_row
+from artwork import get_artwork, get_artworks_by_ids
+from artwork_similarity import attribute_arrays, attribute_similarity, encode_attributes
+from catalog_index import CatalogIndex
+import catalog_events
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("Warning: NumPy is not installed, similar artworks are disabled")
+
+DEFAULT_SIMILAR = 4
+MAX_SIMILAR = 50
+
+# The encoded attributes of available artworks, one array per attribute as
+# artwork_similarity.attribute_arrays builds them, in the order of ids
+_index_lock = threading.Lock()
+_snapshot = {"ids": [], "positions": {}, "attributes": None}
+# Code of every artist and medium seen; only ever grows, so the codes in the
+# snapshot stay valid as artworks are added
+_artist_codes = {}
+_medium_codes = {}
+
+def _encode(artwork):
+    # Caller holds _index_lock, since unseen artists and mediums get a code
+    return encode_attributes(artwork, _artist_codes, _medium_codes)
+
+def _replace_snapshot(ids, attributes):
+    # Caller holds _index_lock
+    global _snapshot
+    _snapshot = {
+        "ids": ids,
+        "positions": {artwork_id: position for position, artwork_id in enumerate(ids)},
+        "attributes": attributes,
+    }
+
+def load_similar_index():
+    """Encode the attributes of every available artwork"""
+    if np is None:
+        return False
+
+    connection = get_db_connection()
+    if connection is None:
+        print("Error loading similar artworks index: Database connection failed")
+        return False
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT id, artist, artist_id, medium, price, year FROM artworks
+        WHERE status = 'available'
+        """
+        cursor.execute(query)
+        rows = [dict_from_row(row, cursor) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error loading similar artworks index: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    with _index_lock:
+        _replace_snapshot([str(row["id"]) for row in rows], attribute_arrays([_encode(row) for row in rows]))
+
+    print(f"Loaded similar artworks index of {len(rows)} artworks")
+    return True
+
+def _set_artwork(artwork):
+    """Insert or replace one available artwork"""
+    artwork_id = str(artwork["id"])
+    with _index_lock:
+        encoded = _encode(artwork)
+        ids = list(_snapshot["ids"])
+        position = _snapshot["positions"].get(artwork_id)
+        if _snapshot["attributes"] is None:
+            ids.append(artwork_id)
+            attributes = attribute_arrays([encoded])
+        elif position is None:
+            ids.append(artwork_id)
+            attributes = tuple(np.append(column, column.dtype.type(value))
+                               for column, value in zip(_snapshot["attributes"], encoded))
+        else:
+            attributes = tuple(column.copy() for column in _snapshot["attributes"])
+            for column, value in zip(attributes, encoded):
+                column[position] = value
+        _replace_snapshot(ids, attributes)
+
+def _remove_artwork(artwork_id):
+    """Drop an artwork that was sold or deleted"""
+    with _index_lock:
+        position = _snapshot["positions"].get(artwork_id)
+        if position is None:
+            return
+        keep = np.arange(len(_snapshot["ids"])) != position
+        _replace_snapshot(
+            [i for i in _snapshot["ids"] if i != artwork_id],
+            tuple(column[keep] for column in _snapshot["attributes"]),
+        )
+
+def find_similar(artwork, k=DEFAULT_SIMILAR):
+    """Ids of the k available artworks most similar to an artwork, best first
+
+    Scores the artwork against every available one at once, with the same
+    attribute similarity the recommendations use.
+    """
+    snapshot = _snapshot
+    if not snapshot["ids"]:
+        return []
+    with _index_lock:
+        encoded = _encode(artwork)
+
+    scores = attribute_similarity(encoded, snapshot["attributes"])
+    position = snapshot["positions"].get(str(artwork["id"]))
+    if position is not None:
+        scores[position] = -np.inf
+        k = min(k, len(scores) - 1)
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [snapshot["ids"][i] for i in top]
+
+def get_similar_artworks(artwork_id, k=DEFAULT_SIMILAR):
+    """Handle /artworks/{id}/similar: available artworks like the given one"""
+    if np is None:
+        return {"error": "Similar artworks are not available"}
+    try:
+        k = min(MAX_SIMILAR, max(1, int(k)))
+    except (TypeError, ValueError):
+        return {"error": "k must be a number"}
+
+    _index.ensure_loaded()
+    # The artwork itself may be sold and so not in the matrix
+    artwork = get_artwork(artwork_id)
+    if "error" in artwork:
+        return artwork
+
+    return get_artworks_by_ids(find_similar(artwork, k))
+
+def _on_catalog_change(kind, action, item_id, item):
+    if kind != catalog_events.ARTWORK:
+        return
+    if action in (catalog_events.SOLD, catalog_events.DELETED):
+        _remove_artwork(item_id)
+    elif item and action in (catalog_events.CREATED, catalog_events.UPDATED):
+        if item.get("status", "available") == "available":
+            _set_artwork({**item, "id": item_id})
+        else:
+            _remove_artwork(item_id)
+
+_index = CatalogIndex(load_similar_index, _on_catalog_change)
+
+def start_similar_index():
+    """Load the feature matrix and keep it current as the catalog changes"""
+    if np is None:
+        return
+    _index.start()
+
+def stop_similar_index():
+    _index.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find available artworks similar to an artwork")
+    parser.add_argument("artwork_id")
+    parser.add_argument("-k", type=int, default=DEFAULT_SIMILAR)
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit(1)
+    print(json.dumps(get_similar_artworks(args.artwork_id, args.k), indent=2, default=str))
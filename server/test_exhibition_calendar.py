@@ -0,0 +1,106 @@
+import random
+from datetime import date, timedelta
+import catalog_events
+import exhibition_calendar
+from catalog_index import CatalogIndex
+from exhibition_calendar import find_overlapping, load_calendar_index, status_on
+import pytest
+
+class FakeExhibitions:
+    """Just enough of a connection for load_calendar_index"""
+
+    def __init__(self, intervals):
+        self.rows = [(exhibition_id, start, end) for exhibition_id, (start, end) in intervals.items()]
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=()):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def index_of(monkeypatch):
+    """Load the calendar from {id: (start, end)} rows for one test"""
+    # A fresh index, the module's own restored after the test
+    monkeypatch.setattr(exhibition_calendar, "_snapshot", exhibition_calendar._snapshot)
+    monkeypatch.setattr(exhibition_calendar, "_intervals", {})
+    monkeypatch.setattr(exhibition_calendar, "_index",
+                        CatalogIndex(load_calendar_index, exhibition_calendar._on_catalog_change))
+
+    def load(intervals):
+        monkeypatch.setattr(exhibition_calendar, "get_db_connection", lambda: FakeExhibitions(intervals))
+        assert load_calendar_index()
+    return load
+
+def brute_force(intervals, first_day, last_day):
+    # The index orders by start date, then end date, then id
+    matches = [(start, end, exhibition_id) for exhibition_id, (start, end) in intervals.items()
+               if start <= last_day and end >= first_day]
+    return [exhibition_id for _, _, exhibition_id in sorted(matches)]
+
+def random_intervals(rng, count):
+    origin = date(2025, 1, 1)
+    intervals = {}
+    for exhibition_id in range(1, count + 1):
+        start = origin + timedelta(days=rng.randint(0, 730))
+        intervals[str(exhibition_id)] = (start, start + timedelta(days=rng.choice([0, 1, 7, 30, 90, 400])))
+    return intervals
+
+@pytest.mark.parametrize("count", [1, 2, 3, 17, 64, 1000])
+def test_find_overlapping_matches_brute_force(index_of, count):
+    rng = random.Random(count)
+    intervals = random_intervals(rng, count)
+    index_of(intervals)
+    for _ in range(300):
+        first_day = date(2024, 12, 1) + timedelta(days=rng.randint(0, 800))
+        last_day = first_day + timedelta(days=rng.choice([0, 0, 1, 6, 30, 365]))
+        assert find_overlapping(first_day, last_day) == brute_force(intervals, first_day, last_day)
+
+def test_range_ends_are_inclusive(index_of):
+    index_of({"a": (date(2025, 3, 1), date(2025, 3, 10))})
+    assert find_overlapping(date(2025, 3, 10), date(2025, 3, 20)) == ["a"]
+    assert find_overlapping(date(2025, 2, 20), date(2025, 3, 1)) == ["a"]
+    assert find_overlapping(date(2025, 3, 11), date(2025, 3, 20)) == []
+    assert find_overlapping(date(2025, 2, 20), date(2025, 2, 28)) == []
+
+def test_empty_index(index_of):
+    index_of({})
+    assert find_overlapping(date(2025, 1, 1), date(2025, 12, 31)) == []
+
+def test_catalog_changes_update_the_index(index_of):
+    index_of({"1": (date(2025, 3, 1), date(2025, 3, 10))})
+    moved = {"startDate": "2025-05-01", "endDate": "2025-05-31", "status": "upcoming"}
+    exhibition_calendar._on_catalog_change(catalog_events.EXHIBITION, catalog_events.UPDATED, "1", moved)
+    exhibition_calendar._on_catalog_change(
+        catalog_events.EXHIBITION, catalog_events.CREATED, "2",
+        {"startDate": "2025-03-05", "endDate": "2025-05-05", "status": "upcoming"}
+    )
+    assert find_overlapping(date(2025, 3, 1), date(2025, 3, 10)) == ["2"]
+    assert find_overlapping(date(2025, 5, 1), date(2025, 5, 1)) == ["2", "1"]
+
+    exhibition_calendar._on_catalog_change(catalog_events.EXHIBITION, catalog_events.DELETED, "2", None)
+    assert find_overlapping(date(2025, 1, 1), date(2025, 12, 31)) == ["1"]
+
+def test_failed_load_is_not_retried_on_every_request(index_of, monkeypatch):
+    attempts = []
+    monkeypatch.setattr(exhibition_calendar, "get_db_connection", lambda: attempts.append(1))
+    monkeypatch.setattr(exhibition_calendar, "get_exhibitions_by_ids", lambda ids: {"exhibitions": []})
+    for _ in range(5):
+        assert exhibition_calendar.get_exhibitions_on("2025-03-01") == {"date": "2025-03-01", "exhibitions": []}
+    assert len(attempts) == 1
+
+def test_status_on():
+    start, end = date(2025, 3, 1), date(2025, 3, 10)
+    assert status_on(start, end, date(2025, 2, 28)) == "upcoming"
+    assert status_on(start, end, start) == "ongoing"
+    assert status_on(start, end, end) == "ongoing"
+    assert status_on(start, end, date(2025, 3, 11)) == "past"
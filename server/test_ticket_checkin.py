@@ -0,0 +1,94 @@
+import random
+import string
+import ticket_checkin
+from ticket_checkin import BloomFilter, BLOOM_MIN_CAPACITY, ticket_code_candidates
+from ticket_codes import encode_ticket_code
+import pytest
+
+def test_bloom_filter_has_no_false_negatives():
+    codes = [encode_ticket_code(booking_id) for booking_id in range(1, 5001)]
+    bloom = BloomFilter(len(codes))
+    for code in codes:
+        bloom.add(code)
+    assert all(code in bloom for code in codes)
+    assert bloom.count == len(codes)
+
+def test_bloom_filter_false_positive_rate_is_near_target():
+    bloom = BloomFilter(5000, false_positive_rate=0.01)
+    for booking_id in range(1, 5001):
+        bloom.add(encode_ticket_code(booking_id))
+    others = [encode_ticket_code(booking_id) for booking_id in range(100001, 110001)]
+    false_positives = sum(code in bloom for code in others)
+    # Expected about 1%; allow for variance
+    assert false_positives < len(others) * 0.03
+
+def test_empty_bloom_filter_contains_nothing():
+    bloom = BloomFilter(0)
+    assert bloom.capacity == BLOOM_MIN_CAPACITY
+    assert encode_ticket_code(1) not in bloom
+
+def test_keyed_codes_match_in_their_issued_form():
+    code = encode_ticket_code(31337)
+    assert ticket_code_candidates(code) == [code]
+    assert ticket_code_candidates(f" {code.lower()} ")[-1] == code
+    assert ticket_code_candidates(code.replace("-", ""))[-1] == code
+
+def test_old_codes_are_tried_as_typed_first():
+    rng = random.Random(35)
+    for _ in range(1000):
+        code = "TKT-" + "".join(rng.choices(string.ascii_uppercase + string.digits, k=8))
+        assert ticket_code_candidates(code.lower())[0] == code
+
+class FakeBookings:
+    """Just enough of a connection for load_ticket_index and index_paid_booking"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.on_load = None
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=()):
+        if "WHERE id = %s" in query:
+            self.result = [(row[1], row[2]) for row in self.rows if row[0] == params[0]]
+        else:
+            result = list(self.rows)
+            if self.on_load:
+                # A payment committed after the rows were read
+                on_load, self.on_load = self.on_load, None
+                on_load()
+            self.result = result
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def bookings(monkeypatch):
+    fake = FakeBookings([(1, 7, encode_ticket_code(1), "active")])
+    monkeypatch.setattr(ticket_checkin, "get_db_connection", lambda: fake)
+    # Restore the module's index after the test
+    for name in ("_index_loaded", "_bloom", "_active_codes", "_code_exhibitions", "_used_codes"):
+        monkeypatch.setattr(ticket_checkin, name, getattr(ticket_checkin, name))
+    monkeypatch.setattr(ticket_checkin, "_index_loaded", False)
+    return fake
+
+def test_ticket_paid_during_a_reload_is_kept(bookings):
+    def pay():
+        bookings.rows.append((2, 7, encode_ticket_code(2), "active"))
+        ticket_checkin.index_paid_booking(2)
+
+    bookings.on_load = pay
+    assert ticket_checkin.load_ticket_index()
+    assert encode_ticket_code(1) in ticket_checkin._bloom
+    assert encode_ticket_code(2) in ticket_checkin._bloom
+    assert ticket_checkin._code_exhibitions[encode_ticket_code(2)] == 7
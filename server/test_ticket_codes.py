@@ -0,0 +1,53 @@
+import random
+from ticket_codes import (
+    CODE_ALPHABET, CODE_LENGTH, MAX_BOOKING_ID, TICKET_CODE_PREFIX,
+    encode_ticket_code, decode_ticket_code, permute, unpermute,
+)
+import pytest
+
+def sample_booking_ids():
+    rng = random.Random(34)
+    return list(range(1, 2000)) + [rng.randint(1, MAX_BOOKING_ID) for _ in range(2000)] + [MAX_BOOKING_ID]
+
+def test_codes_round_trip():
+    for booking_id in sample_booking_ids():
+        assert decode_ticket_code(encode_ticket_code(booking_id)) == booking_id
+
+def test_codes_are_unique():
+    codes = [encode_ticket_code(booking_id) for booking_id in sample_booking_ids()]
+    assert len(set(codes)) == len(set(sample_booking_ids()))
+
+def test_permutation_is_inverted():
+    for value in (0, 1, 12345, MAX_BOOKING_ID):
+        assert unpermute(permute(value)) == value
+
+def test_code_format():
+    code = encode_ticket_code(42)
+    prefix, body = code.split("-")
+    assert prefix == TICKET_CODE_PREFIX
+    assert len(body) == CODE_LENGTH
+    assert all(char in CODE_ALPHABET for char in body)
+
+def test_decode_ignores_case_hyphens_and_look_alikes():
+    code = encode_ticket_code(987654)
+    assert decode_ticket_code(code.lower()) == 987654
+    assert decode_ticket_code(code.replace("-", "")) == 987654
+    assert decode_ticket_code(f"  {code}  ") == 987654
+    body = code.split("-")[1]
+    # O, I and L are read as 0, 1 and 1
+    typed = body.replace("0", "O").replace("1", "I")
+    assert decode_ticket_code(f"{TICKET_CODE_PREFIX}-{typed}") == 987654
+
+@pytest.mark.parametrize("bad_char", ["U", "!", "*", "#", " "])
+def test_decode_rejects_characters_outside_the_alphabet(bad_char):
+    body = encode_ticket_code(1234).split("-")[1]
+    assert decode_ticket_code(f"{TICKET_CODE_PREFIX}-{bad_char}{body[1:]}") is None
+
+@pytest.mark.parametrize("code", [None, "", "TKT-", "TKT-1234567", "TKT-123456789", "not a code"])
+def test_decode_rejects_malformed_codes(code):
+    assert decode_ticket_code(code) is None
+
+@pytest.mark.parametrize("booking_id", [0, -1, MAX_BOOKING_ID + 1])
+def test_encode_rejects_out_of_range_ids(booking_id):
+    with pytest.raises(ValueError):
+        encode_ticket_code(booking_id)
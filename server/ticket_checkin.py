@@ -0,0 +1,346 @@
+import math
+import hashlib
+import threading
+from database import get_db_connection
+from ticket_codes import encode_ticket_code, decode_ticket_code
+from ticket_ledger import record_occupancy
+
+# Target false-positive rate of the Bloom prefilter; a false positive only
+# costs the database round trip the filter would otherwise have saved
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+
+# Smallest number of codes the prefilter is sized for
+BLOOM_MIN_CAPACITY = 1024
+
+# The index is rebuilt from the database this often, picking up tickets paid
+# or checked in outside this process (e.g. by a journal replay)
+INDEX_REFRESH_SECONDS = 300
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings
+
+    Membership tests never give false negatives, so a code the filter has not
+    seen is certainly not an active ticket.
+    """
+
+    def __init__(self, capacity, false_positive_rate=BLOOM_FALSE_POSITIVE_RATE):
+        self.capacity = max(capacity, BLOOM_MIN_CAPACITY)
+        self.size = int(math.ceil(-self.capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+_index_lock = threading.Lock()
+_index_loaded = False
+_bloom = BloomFilter(0)
+# exhibition_id -> {ticket_code: booking_id} for paid tickets not yet used
+_active_codes = {}
+# ticket_code -> exhibition_id for every active code, to spot wrong-gate scans
+_code_exhibitions = {}
+# ticket_code -> exhibition_id for paid tickets already checked in
+_used_codes = {}
+
+# Reloads run one at a time. While one runs, tickets paid or checked in are
+# also recorded here and replayed onto the reloaded index, since its rows may
+# have been read before they were committed.
+_load_lock = threading.Lock()
+_changes_during_reload = None
+
+_stop_event = threading.Event()
+_refresh_thread = None
+
+def ticket_code_candidates(ticket_code):
+    """The codes a typed or scanned ticket code may be stored as, likeliest first
+
+    Codes issued before the keyed codes are stored as typed; almost any of
+    them also decodes to some booking id, so the code as typed comes first.
+    The issued form of the decoded id forgives case, hyphens and look-alike
+    characters in keyed codes.
+    """
+    typed = (ticket_code or "").strip().upper()
+    if not typed:
+        return []
+    candidates = [typed]
+    booking_id = decode_ticket_code(typed)
+    if booking_id is not None:
+        issued = encode_ticket_code(booking_id)
+        if issued != typed:
+            candidates.append(issued)
+    return candidates
+
+def load_ticket_index():
+    """Rebuild the in-memory index of paid tickets from the database
+
+    Used tickets stay in the index so a second scan is answered from memory.
+    """
+    global _changes_during_reload
+    with _load_lock:
+        with _index_lock:
+            _changes_during_reload = []
+        try:
+            return _load_ticket_index()
+        finally:
+            with _index_lock:
+                _changes_during_reload = None
+
+def _load_ticket_index():
+    # Caller holds _load_lock
+    global _index_loaded, _bloom, _active_codes, _code_exhibitions, _used_codes
+
+    connection = get_db_connection()
+    if connection is None:
+        print("Error loading ticket index: Database connection failed")
+        return False
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT id, exhibition_id, ticket_code, status FROM exhibition_bookings
+        WHERE status IN ('active', 'used') AND payment_status = 'completed' AND ticket_code IS NOT NULL
+        """
+        cursor.execute(query)
+        rows = cursor.fetchall()
+    except Exception as e:
+        print(f"Error loading ticket index: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    # Leave room for tickets sold before the next rebuild
+    bloom = BloomFilter(len(rows) * 2)
+    active_codes = {}
+    code_exhibitions = {}
+    used_codes = {}
+    for booking_id, exhibition_id, ticket_code, status in rows:
+        bloom.add(ticket_code)
+        if status == 'used':
+            used_codes[ticket_code] = exhibition_id
+        else:
+            active_codes.setdefault(exhibition_id, {})[ticket_code] = booking_id
+            code_exhibitions[ticket_code] = exhibition_id
+
+    with _index_lock:
+        _bloom = bloom
+        _active_codes = active_codes
+        _code_exhibitions = code_exhibitions
+        _used_codes = used_codes
+        for change in _changes_during_reload:
+            change()
+        _index_loaded = True
+
+    print(f"Loaded {len(rows)} paid tickets into the check-in index")
+    return True
+
+def ensure_ticket_index():
+    """Load the index on first use"""
+    if not _index_loaded:
+        load_ticket_index()
+    return _index_loaded
+
+def _record_change(change):
+    """Apply a change to the index, and again after a reload in progress
+
+    Caller holds _index_lock.
+    """
+    if _changes_during_reload is not None:
+        _changes_during_reload.append(change)
+    if _index_loaded:
+        change()
+
+def add_ticket(exhibition_id, booking_id, ticket_code):
+    """Add a newly paid ticket to the index"""
+    with _index_lock:
+        # Before the first load, only a load in progress needs to hear of it
+        _record_change(lambda: _add_ticket(exhibition_id, booking_id, ticket_code))
+
+def _add_ticket(exhibition_id, booking_id, ticket_code):
+    # Caller holds _index_lock
+    global _bloom
+    if _bloom.count >= _bloom.capacity:
+        # Resize so the false-positive rate stays near its target
+        bloom = BloomFilter(_bloom.capacity * 2)
+        for code in list(_code_exhibitions) + list(_used_codes):
+            bloom.add(code)
+        _bloom = bloom
+    _bloom.add(ticket_code)
+    _active_codes.setdefault(exhibition_id, {})[ticket_code] = booking_id
+    _code_exhibitions[ticket_code] = exhibition_id
+
+def index_paid_booking(booking_id):
+    """Add a booking to the index once its payment has been committed"""
+    if not _index_loaded and _changes_during_reload is None:
+        return
+
+    connection = get_db_connection()
+    if connection is None:
+        return
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT exhibition_id, ticket_code FROM exhibition_bookings
+        WHERE id = %s AND status = 'active' AND payment_status = 'completed'
+        """
+        cursor.execute(query, (booking_id,))
+        row = cursor.fetchone()
+        if row and row[1]:
+            add_ticket(row[0], booking_id, row[1])
+    except Exception as e:
+        print(f"Error indexing booking {booking_id}: {e}")
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def _mark_used(exhibition_id, ticket_code):
+    with _index_lock:
+        _record_change(lambda: _set_used(exhibition_id, ticket_code))
+
+def _set_used(exhibition_id, ticket_code):
+    # Caller holds _index_lock
+    codes = _active_codes.get(exhibition_id)
+    if codes:
+        codes.pop(ticket_code, None)
+    _code_exhibitions.pop(ticket_code, None)
+    _used_codes[ticket_code] = exhibition_id
+
+def check_in_ticket(ticket_code, exhibition_id=None):
+    """Validate a ticket at the door and mark it used
+
+    Codes the prefilter or the index can rule out are answered from memory.
+    Everything else is settled by one conditional update, so a ticket scanned
+    at two gates at once is admitted only once. Errors carry a "reason" of
+    bad_request, invalid, used, wrong_exhibition, unpaid or cancelled.
+    """
+    candidates = ticket_code_candidates(ticket_code)
+    if not candidates:
+        return {"error": "Ticket code is required", "reason": "bad_request"}
+
+    try:
+        exhibition_id = int(exhibition_id) if exhibition_id else None
+    except (TypeError, ValueError):
+        return {"error": "Invalid exhibition ID", "reason": "bad_request"}
+
+    if ensure_ticket_index():
+        with _index_lock:
+            known = next((code for code in candidates if code in _code_exhibitions or code in _used_codes), None)
+            if known is not None:
+                candidates = [known]
+                indexed_exhibition = _code_exhibitions.get(known, _used_codes.get(known))
+                already_used = known in _used_codes
+            else:
+                # The prefilter has no false negatives, so this only narrows
+                candidates = [code for code in candidates if code in _bloom]
+                indexed_exhibition, already_used = None, False
+
+        if indexed_exhibition is not None and exhibition_id is not None and indexed_exhibition != exhibition_id:
+            return {"error": "Ticket is for a different exhibition", "reason": "wrong_exhibition"}
+        if already_used:
+            return {"error": "Ticket has already been used", "reason": "used"}
+        if not candidates:
+            return {"error": "Invalid ticket", "reason": "invalid"}
+
+    connection = get_db_connection()
+    if connection is None:
+        return {"error": "Database connection failed"}
+
+    cursor = connection.cursor()
+    ticket_code = candidates[0]
+
+    try:
+        if len(candidates) > 1:
+            # Settle which form of the code was issued
+            cursor.execute("SELECT ticket_code FROM exhibition_bookings WHERE ticket_code IN (%s, %s)", candidates)
+            stored = {row[0] for row in cursor.fetchall()}
+            ticket_code = next((code for code in candidates if code in stored), ticket_code)
+
+        query = """
+        UPDATE exhibition_bookings SET status = 'used'
+        WHERE ticket_code = %s AND status = 'active' AND payment_status = 'completed'
+        """
+        params = [ticket_code]
+        if exhibition_id is not None:
+            query += " AND exhibition_id = %s"
+            params.append(exhibition_id)
+        cursor.execute(query, params)
+        checked_in = cursor.rowcount == 1
+
+        # Served by the unique index on ticket_code
+        query = """
+        SELECT eb.id, eb.exhibition_id, e.title as exhibition_title, eb.user_id,
+               eb.ticket_code, eb.slots, eb.status, eb.payment_status
+        FROM exhibition_bookings eb
+        JOIN exhibitions e ON eb.exhibition_id = e.id
+        WHERE eb.ticket_code = %s
+        """
+        cursor.execute(query, (ticket_code,))
+        row = cursor.fetchone()
+        ticket = dict(zip([col[0] for col in cursor.description], row)) if row else None
+
+        if checked_in:
+            record_occupancy(cursor, ticket["exhibition_id"], used_slots=ticket["slots"])
+        connection.commit()
+    except Exception as e:
+        print(f"Error checking in ticket {ticket_code}: {e}")
+        return {"error": str(e)}
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    if checked_in:
+        _mark_used(ticket["exhibition_id"], ticket_code)
+        return {"success": True, "ticket": ticket}
+
+    if ticket is None:
+        return {"error": "Invalid ticket", "reason": "invalid"}
+    if exhibition_id is not None and ticket["exhibition_id"] != exhibition_id:
+        return {"error": "Ticket is for a different exhibition", "reason": "wrong_exhibition"}
+    if ticket["status"] == "used":
+        _mark_used(ticket["exhibition_id"], ticket_code)
+        return {"error": "Ticket has already been used", "reason": "used", "ticket": ticket}
+    if ticket["status"] == "cancelled":
+        return {"error": "Ticket has been cancelled", "reason": "cancelled", "ticket": ticket}
+    return {"error": "Ticket has not been paid for", "reason": "unpaid", "ticket": ticket}
+
+def _run_refresher():
+    while not _stop_event.wait(INDEX_REFRESH_SECONDS):
+        try:
+            load_ticket_index()
+        except Exception as e:
+            print(f"Error refreshing ticket index: {e}")
+
+def start_ticket_index():
+    """Load the check-in index and keep it refreshed in the background"""
+    global _refresh_thread
+    if _refresh_thread and _refresh_thread.is_alive():
+        return _refresh_thread
+
+    load_ticket_index()
+    _stop_event.clear()
+    _refresh_thread = threading.Thread(target=_run_refresher, name="ticket-index-refresher", daemon=True)
+    _refresh_thread.start()
+    return _refresh_thread
+
+def stop_ticket_index():
+    """Signal the ticket index refresher thread to stop"""
+    _stop_event.set()
@@ -0,0 +1,83 @@
+import os
+import hmac
+import hashlib
+from middleware import SECRET_KEY
+
+# Ticket codes are the booking id run through a keyed permutation, so two
+# bookings can never share a code and issuing one needs no uniqueness check.
+# Rotating the key changes every code that has not been stored yet.
+TICKET_CODE_SECRET = os.environ.get('TICKET_CODE_SECRET', SECRET_KEY)
+
+TICKET_CODE_PREFIX = 'TKT'
+
+# Crockford base32: no I, L, O or U, so codes survive being read aloud or retyped
+CODE_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+CODE_LENGTH = 8
+
+# 8 base32 characters carry 40 bits, split into two 20-bit Feistel halves
+HALF_BITS = 20
+HALF_MASK = (1 << HALF_BITS) - 1
+MAX_BOOKING_ID = (1 << (2 * HALF_BITS)) - 1
+FEISTEL_ROUNDS = 4
+
+_round_key = hmac.new(TICKET_CODE_SECRET.encode(), digestmod=hashlib.sha256)
+
+# Characters people commonly type in place of the Crockford ones
+_DECODE_MAP = {char: value for value, char in enumerate(CODE_ALPHABET)}
+_DECODE_MAP.update({'O': 0, 'I': 1, 'L': 1})
+
+def _round(half, round_number):
+    """Feistel round function: the keyed HMAC of one half, cut to 20 bits"""
+    mac = _round_key.copy()
+    mac.update(bytes([round_number]) + half.to_bytes(3, 'big'))
+    return int.from_bytes(mac.digest()[:3], 'big') & HALF_MASK
+
+def permute(value):
+    """Map a 40-bit number to another, one to one"""
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for round_number in range(FEISTEL_ROUNDS):
+        left, right = right, left ^ _round(right, round_number)
+    return (left << HALF_BITS) | right
+
+def unpermute(value):
+    """Invert permute()"""
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for round_number in reversed(range(FEISTEL_ROUNDS)):
+        left, right = right ^ _round(left, round_number), left
+    return (left << HALF_BITS) | right
+
+def encode_ticket_code(booking_id):
+    """Return the ticket code for a booking id, e.g. TKT-7ZK3M0QD"""
+    if not 0 < booking_id <= MAX_BOOKING_ID:
+        raise ValueError(f"Booking id {booking_id} is out of range for ticket codes")
+
+    value = permute(booking_id)
+    chars = []
+    for _ in range(CODE_LENGTH):
+        chars.append(CODE_ALPHABET[value & 31])
+        value >>= 5
+    return f"{TICKET_CODE_PREFIX}-{''.join(reversed(chars))}"
+
+def decode_ticket_code(ticket_code):
+    """Return the booking id a ticket code was issued for, or None
+
+    Case, hyphens and the usual look-alike characters are ignored, so a code
+    read off a printed ticket decodes the same as the original.
+    """
+    if not ticket_code:
+        return None
+
+    code = ticket_code.strip().upper().replace('-', '')
+    if code.startswith(TICKET_CODE_PREFIX):
+        code = code[len(TICKET_CODE_PREFIX):]
+    if len(code) != CODE_LENGTH:
+        return None
+
+    value = 0
+    for char in code:
+        if char not in _DECODE_MAP:
+            return None
+        value = (value << 5) | _DECODE_MAP[char]
+
+    booking_id = unpermute(value)
+    return booking_id if booking_id > 0 else None
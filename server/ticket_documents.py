@@ -0,0 +1,226 @@
+import os
+import json
+import hashlib
+from database import get_db_connection
+from worker_pool import WorkerPool
+
+try:
+    import qrcode
+except ImportError:
+    qrcode = None
+    print("Warning: qrcode is not installed, tickets will be rendered without a QR code")
+
+# Rendered tickets live under the static path, sharded by digest
+TICKETS_DIR = os.path.join(os.path.dirname(__file__), "static", "tickets")
+
+# Bump when the layout changes so old renders are not served for new tickets
+RENDER_VERSION = 1
+
+# Worker processes rendering tickets
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+
+# How long a request waits for its ticket to be rendered
+RENDER_TIMEOUT_SECONDS = 30
+
+# A6 landscape, in PDF points
+PAGE_WIDTH = 420
+PAGE_HEIGHT = 298
+
+_pool = WorkerPool(RENDER_WORKERS)
+# digest -> Future for renders in progress, so concurrent downloads of the
+# same ticket share one render; guarded by _pool.lock
+_in_flight = {}
+
+def get_ticket_details(booking_id):
+    """Load what is printed on a ticket"""
+    connection = get_db_connection()
+    if connection is None:
+        return {"error": "Database connection failed"}
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT eb.id, eb.user_id, u.name as holder_name, eb.ticket_code, eb.slots,
+               eb.status, eb.payment_status, e.title as exhibition_title,
+               e.location, e.start_date, e.end_date
+        FROM exhibition_bookings eb
+        JOIN users u ON eb.user_id = u.id
+        JOIN exhibitions e ON eb.exhibition_id = e.id
+        WHERE eb.id = %s
+        """
+        cursor.execute(query, (booking_id,))
+        row = cursor.fetchone()
+        if not row:
+            return {"error": "Ticket not found"}
+        return dict(zip([col[0] for col in cursor.description], row))
+    except Exception as e:
+        print(f"Error getting ticket {booking_id}: {e}")
+        return {"error": str(e)}
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def get_ticket_fields(ticket):
+    """The printed fields of a ticket, as plain strings"""
+    return {
+        "ticket_code": ticket["ticket_code"],
+        "exhibition_title": ticket["exhibition_title"],
+        "location": ticket["location"],
+        "dates": f"{ticket['start_date']} to {ticket['end_date']}",
+        "holder_name": ticket["holder_name"] or "",
+        "admits": f"Admits {ticket['slots']}",
+        "booking_id": str(ticket["id"]),
+    }
+
+def get_render_digest(fields):
+    """Digest of everything that goes into a rendered ticket
+
+    The same ticket always renders to the same bytes, so the digest of the
+    inputs addresses the output.
+    """
+    canonical = json.dumps({"version": RENDER_VERSION, "qr": qrcode is not None, "fields": fields}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def get_ticket_path(digest):
+    """Sharded location of a rendered ticket, e.g. static/tickets/ab/cd/abcd....pdf"""
+    return os.path.join(TICKETS_DIR, digest[:2], digest[2:4], f"{digest}.pdf")
+
+def get_ticket_url(digest):
+    return f"/static/tickets/{digest[:2]}/{digest[2:4]}/{digest}.pdf"
+
+def _pdf_text(value):
+    """Escape a string for a PDF literal using the standard Latin-1 fonts"""
+    text = value.encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _qr_matrix(data):
+    if qrcode is None:
+        return None
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+def render_ticket_pdf(fields):
+    """Render a one-page ticket PDF and return its bytes
+
+    The PDF is written by hand: standard Helvetica fonts, and the QR code drawn
+    as filled squares, so no PDF library is needed.
+    """
+    commands = []
+
+    # Border and tear line
+    commands.append("0.5 w 12 12 396 274 re S")
+    commands.append("[4 3] 0 d 262 20 m 262 278 l S [] 0 d")
+
+    lines = [
+        ("F2", 16, 28, 250, fields["exhibition_title"][:32]),
+        ("F1", 11, 28, 226, fields["location"][:44]),
+        ("F1", 11, 28, 208, fields["dates"]),
+        ("F1", 11, 28, 176, fields["holder_name"][:44]),
+        ("F1", 11, 28, 158, fields["admits"]),
+        ("F2", 14, 28, 48, fields["ticket_code"]),
+        ("F1", 8, 28, 32, f"Booking {fields['booking_id']} - present this ticket at the entrance"),
+    ]
+    for font, size, x, y, text in lines:
+        commands.append(f"BT /{font} {size} Tf {x} {y} Td ({_pdf_text(text)}) Tj ET")
+
+    matrix = _qr_matrix(fields["ticket_code"])
+    if matrix:
+        size = 128
+        module = size / len(matrix)
+        left, top = 273, 85 + size
+        squares = []
+        for row_index, row in enumerate(matrix):
+            for column_index, dark in enumerate(row):
+                if dark:
+                    x = left + column_index * module
+                    y = top - (row_index + 1) * module
+                    squares.append(f"{x:.2f} {y:.2f} {module:.2f} {module:.2f} re")
+        commands.append("0 g " + " ".join(squares) + " f")
+    else:
+        commands.append(f"BT /F2 12 Tf 276 150 Td ({_pdf_text(fields['ticket_code'])}) Tj ET")
+
+    content = "\n".join(commands).encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+         f"/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>").encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+        f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream",
+    ]
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+def _render_to_file(fields, path):
+    """Worker process entry point: render a ticket and publish it atomically"""
+    pdf = render_ticket_pdf(fields)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(pdf)
+    os.replace(temp_path, path)
+    return path
+
+def render_ticket(fields):
+    """Return the static URL of a rendered ticket, rendering it if needed"""
+    digest = get_render_digest(fields)
+    path = get_ticket_path(digest)
+    if os.path.exists(path):
+        return get_ticket_url(digest)
+
+    with _pool.lock:
+        future = _in_flight.get(digest)
+        if future is None:
+            future = _pool.submit(_render_to_file, fields, path)
+            _in_flight[digest] = future
+            future.add_done_callback(lambda _: _in_flight.pop(digest, None))
+
+    future.result(timeout=RENDER_TIMEOUT_SECONDS)
+    return get_ticket_url(digest)
+
+def generate_ticket(booking_id, user_id, is_admin=False):
+    """Render the ticket for a paid booking and return its download URL"""
+    try:
+        booking_id = int(booking_id)
+    except (TypeError, ValueError):
+        return {"error": "Invalid booking ID"}
+
+    ticket = get_ticket_details(booking_id)
+    if "error" in ticket:
+        return ticket
+
+    if not is_admin and ticket["user_id"] != user_id:
+        return {"error": "You do not have access to this ticket"}
+    if ticket["payment_status"] != "completed":
+        return {"error": "Ticket is not paid for yet"}
+    if ticket["status"] == "cancelled":
+        return {"error": "Ticket has been cancelled"}
+
+    try:
+        url = render_ticket(get_ticket_fields(ticket))
+    except Exception as e:
+        print(f"Error rendering ticket {booking_id}: {e}")
+        return {"error": "Failed to render ticket"}
+
+    return {"success": True, "ticketUrl": url, "ticketCode": ticket["ticket_code"]}
+
+def stop_ticket_renderer():
+    """Shut down the render worker processes"""
+    _pool.stop()
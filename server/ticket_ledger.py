@@ -0,0 +1,211 @@
+import sys
+import json
+import argparse
+from datetime import datetime, timedelta
+from collections import defaultdict
+from database import get_db_connection
+from inventory import run_in_transaction
+
+# Ledger pages are bounded so the admin views never pull every booking
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+TICKET_STATUSES = ('active', 'used', 'cancelled')
+
+def record_occupancy(cursor, exhibition_id, sold_tickets=0, sold_slots=0, used_slots=0, cancelled_slots=0, revenue=0):
+    """Adjust the occupancy counters of an exhibition using the caller's transaction
+
+    Every change to a booking's payment or ticket status adjusts the counters
+    in the same transaction, so they always agree with exhibition_bookings.
+    """
+    query = """
+    INSERT INTO exhibition_occupancy
+    (exhibition_id, sold_tickets, sold_slots, used_slots, cancelled_slots, revenue)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        sold_tickets = sold_tickets + VALUES(sold_tickets),
+        sold_slots = sold_slots + VALUES(sold_slots),
+        used_slots = used_slots + VALUES(used_slots),
+        cancelled_slots = cancelled_slots + VALUES(cancelled_slots),
+        revenue = revenue + VALUES(revenue)
+    """
+    cursor.execute(query, (exhibition_id, sold_tickets, sold_slots, used_slots, cancelled_slots, revenue))
+
+def record_booking_sold(cursor, booking_id, reinstated=False):
+    """Count a booking whose payment just completed
+
+    A reinstated booking had been cancelled when its hold expired, so it moves
+    from the cancelled count to the sold count.
+    """
+    cursor.execute("SELECT exhibition_id, slots, total_amount FROM exhibition_bookings WHERE id = %s", (booking_id,))
+    row = cursor.fetchone()
+    if not row:
+        return
+
+    exhibition_id, slots, total_amount = row
+    record_occupancy(
+        cursor,
+        exhibition_id,
+        sold_tickets=1,
+        sold_slots=slots,
+        cancelled_slots=-slots if reinstated else 0,
+        revenue=total_amount
+    )
+
+def record_bookings_cancelled(cursor, bookings):
+    """Count cancelled bookings, given as (exhibition_id, slots) pairs"""
+    slots_by_exhibition = defaultdict(int)
+    for exhibition_id, slots in bookings:
+        slots_by_exhibition[exhibition_id] += slots
+
+    for exhibition_id, slots in slots_by_exhibition.items():
+        record_occupancy(cursor, exhibition_id, cancelled_slots=slots)
+
+def rebuild_occupancy(cursor):
+    """Recompute every exhibition's occupancy counters from its bookings"""
+    cursor.execute("DELETE FROM exhibition_occupancy")
+    cursor.execute("""
+    INSERT INTO exhibition_occupancy
+    (exhibition_id, sold_tickets, sold_slots, used_slots, cancelled_slots, revenue)
+    SELECT exhibition_id,
+           SUM(payment_status = 'completed' AND status <> 'cancelled'),
+           SUM(IF(payment_status = 'completed' AND status <> 'cancelled', slots, 0)),
+           SUM(IF(payment_status = 'completed' AND status = 'used', slots, 0)),
+           SUM(IF(status = 'cancelled', slots, 0)),
+           SUM(IF(payment_status = 'completed' AND status <> 'cancelled', total_amount, 0))
+    FROM exhibition_bookings
+    GROUP BY exhibition_id
+    """)
+    return cursor.rowcount
+
+def parse_ledger_date(value):
+    """Parse a YYYY-MM-DD filter value"""
+    return datetime.strptime(value, "%Y-%m-%d")
+
+def get_ticket_ledger(exhibition_id=None, status=None, date_from=None, date_to=None, page=1, page_size=DEFAULT_PAGE_SIZE):
+    """Get one page of tickets, newest first, with optional filters
+
+    Dates are YYYY-MM-DD and both ends are inclusive.
+    """
+    try:
+        page = max(1, int(page))
+        page_size = min(MAX_PAGE_SIZE, max(1, int(page_size)))
+        conditions = []
+        params = []
+        if exhibition_id:
+            conditions.append("eb.exhibition_id = %s")
+            params.append(int(exhibition_id))
+        if status:
+            if status not in TICKET_STATUSES:
+                return {"error": f"Invalid status: {status}"}
+            conditions.append("eb.status = %s")
+            params.append(status)
+        if date_from:
+            conditions.append("eb.booking_date >= %s")
+            params.append(parse_ledger_date(date_from))
+        if date_to:
+            conditions.append("eb.booking_date < %s")
+            params.append(parse_ledger_date(date_to) + timedelta(days=1))
+    except ValueError as e:
+        return {"error": f"Invalid filter: {e}"}
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    connection = get_db_connection()
+    if connection is None:
+        return {"error": "Database connection failed"}
+
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM exhibition_bookings eb {where}", params)
+        total = cursor.fetchone()[0]
+
+        query = f"""
+        SELECT eb.id, eb.user_id, u.name as user_name, eb.exhibition_id,
+               e.title as exhibition_title, e.image_url as exhibition_image_url,
+               eb.booking_date, eb.ticket_code, eb.slots, eb.status,
+               eb.total_amount, eb.payment_status
+        FROM exhibition_bookings eb
+        JOIN users u ON eb.user_id = u.id
+        JOIN exhibitions e ON eb.exhibition_id = e.id
+        {where}
+        ORDER BY eb.booking_date DESC, eb.id DESC
+        LIMIT %s OFFSET %s
+        """
+        cursor.execute(query, params + [page_size, (page - 1) * page_size])
+        tickets = [dict(zip([col[0] for col in cursor.description], row)) for row in cursor.fetchall()]
+
+        return {"tickets": tickets, "page": page, "pageSize": page_size, "total": total}
+    except Exception as e:
+        print(f"Error getting ticket ledger: {e}")
+        return {"error": str(e)}
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def get_exhibition_occupancy(exhibition_id=None):
+    """Get the occupancy counters of every exhibition, or of one"""
+    if exhibition_id:
+        try:
+            exhibition_id = int(exhibition_id)
+        except ValueError:
+            return {"error": "Invalid exhibition ID"}
+
+    connection = get_db_connection()
+    if connection is None:
+        return {"error": "Database connection failed"}
+
+    cursor = connection.cursor()
+
+    try:
+        query = """
+        SELECT e.id as exhibition_id, e.title as exhibition_title, e.total_slots,
+               COALESCE(o.sold_tickets, 0) as sold_tickets,
+               COALESCE(o.sold_slots, 0) as sold_slots,
+               COALESCE(o.used_slots, 0) as used_slots,
+               COALESCE(o.cancelled_slots, 0) as cancelled_slots,
+               e.available_slots as remaining_slots,
+               COALESCE(o.revenue, 0) as revenue
+        FROM exhibitions e
+        LEFT JOIN exhibition_occupancy o ON o.exhibition_id = e.id
+        """
+        params = ()
+        if exhibition_id:
+            query += " WHERE e.id = %s"
+            params = (exhibition_id,)
+        query += " ORDER BY e.start_date DESC"
+        cursor.execute(query, params)
+        occupancy = [dict(zip([col[0] for col in cursor.description], row)) for row in cursor.fetchall()]
+
+        totals = {}
+        for key in ("sold_tickets", "sold_slots", "used_slots", "cancelled_slots", "remaining_slots", "revenue"):
+            totals[key] = sum(row[key] for row in occupancy)
+
+        return {"occupancy": occupancy, "totals": totals}
+    except Exception as e:
+        print(f"Error getting exhibition occupancy: {e}")
+        return {"error": str(e)}
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the exhibition occupancy counters")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("show", help="Show occupancy per exhibition")
+    subparsers.add_parser("rebuild", help="Recompute occupancy from exhibition_bookings")
+
+    args = parser.parse_args()
+
+    if args.command == "show":
+        print(json.dumps(get_exhibition_occupancy(), indent=2, default=str))
+    elif args.command == "rebuild":
+        result = run_in_transaction(rebuild_occupancy)
+        print(f"Rebuilt occupancy: {result}")
+    else:
+        parser.print_help()
+        sys.exit(1)
@@ -0,0 +1,254 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from media_store import TEMP_DIR, EXTENSIONS_BY_TYPE, store_file
+
+# Resumable upload sessions: the received bytes and a small JSON record per
+# session. Kept under the media temp dir so finalizing is a rename.
+SESSIONS_DIR = os.path.join(TEMP_DIR, "sessions")
+
+# Largest image accepted through a resumable upload
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+
+# Chunk size suggested to clients; any chunk size up to this is accepted
+CHUNK_BYTES = 4 * 1024 * 1024
+
+# Bytes copied from the socket to disk per step
+WRITE_BUFFER_BYTES = 64 * 1024
+
+# Sessions untouched for this long are discarded
+SESSION_TTL_SECONDS = 24 * 60 * 60
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# upload_id -> Lock, so two requests never append to the same session at once
+_session_locks = {}
+_session_locks_lock = threading.Lock()
+
+def _get_lock(upload_id):
+    with _session_locks_lock:
+        lock = _session_locks.get(upload_id)
+        if lock is None:
+            lock = _session_locks[upload_id] = threading.Lock()
+        return lock
+
+def _data_path(upload_id):
+    return os.path.join(SESSIONS_DIR, f"{upload_id}.part")
+
+def _meta_path(upload_id):
+    return os.path.join(SESSIONS_DIR, f"{upload_id}.json")
+
+def _write_meta(upload_id, meta):
+    temp_path = f"{_meta_path(upload_id)}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(temp_path, _meta_path(upload_id))
+
+def _load_session(upload_id, user_id, is_admin=False):
+    """Load a session record, or return an error dict with a reason"""
+    if not upload_id or not _UPLOAD_ID.match(str(upload_id)):
+        return {"error": "Invalid upload ID", "reason": "bad_request"}
+    try:
+        with open(_meta_path(upload_id)) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return {"error": "Upload not found", "reason": "not_found"}
+    if not is_admin and meta["user_id"] != str(user_id):
+        return {"error": "You do not have access to this upload", "reason": "forbidden"}
+    return meta
+
+def _session_status(upload_id, meta):
+    if meta.get("url"):
+        offset = meta["size"]
+    else:
+        try:
+            offset = os.path.getsize(_data_path(upload_id))
+        except FileNotFoundError:
+            offset = 0
+    return {
+        "uploadId": upload_id,
+        "size": meta["size"],
+        "offset": offset,
+        "complete": bool(meta.get("url")),
+        "url": meta.get("url"),
+    }
+
+def create_upload_session(user_id, size, content_type=None):
+    """Start a resumable upload of an image of the given size"""
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return {"error": "Upload size is required"}
+    if size <= 0:
+        return {"error": "Upload size must be positive"}
+    if size > MAX_UPLOAD_BYTES:
+        return {"error": f"Upload exceeds the {MAX_UPLOAD_BYTES} byte limit"}
+    if content_type and content_type.lower() not in EXTENSIONS_BY_TYPE:
+        return {"error": f"Unsupported content type: {content_type}"}
+
+    expire_upload_sessions()
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+
+    upload_id = uuid.uuid4().hex
+    open(_data_path(upload_id), "wb").close()
+    _write_meta(upload_id, {
+        "user_id": str(user_id),
+        "size": size,
+        "content_type": content_type,
+        "created_at": time.time(),
+    })
+
+    status = _session_status(upload_id, _load_session(upload_id, user_id))
+    status["chunkSize"] = CHUNK_BYTES
+    return status
+
+def get_upload_status(upload_id, user_id, is_admin=False):
+    """How many bytes of an upload have been received"""
+    meta = _load_session(upload_id, user_id, is_admin)
+    if "error" in meta:
+        return meta
+    return _session_status(upload_id, meta)
+
+def write_upload_chunk(upload_id, user_id, offset, stream, length, is_admin=False):
+    """Append a chunk read from stream at the given offset
+
+    The chunk is accepted only if offset is where the received bytes end, so
+    a retried chunk is never written twice. Bytes received before the
+    connection dropped are kept, and the returned offset tells the client
+    where to resume. Errors carry a "reason" of bad_request, not_found,
+    forbidden, conflict or too_large, and the current offset when known.
+    """
+    meta = _load_session(upload_id, user_id, is_admin)
+    if "error" in meta:
+        return meta
+
+    try:
+        offset = int(offset)
+        length = int(length)
+    except (TypeError, ValueError):
+        return {"error": "Upload offset and length are required", "reason": "bad_request"}
+    if length <= 0 or length > CHUNK_BYTES:
+        return {"error": f"Chunks must be 1 to {CHUNK_BYTES} bytes", "reason": "too_large"}
+
+    lock = _get_lock(upload_id)
+    if not lock.acquire(blocking=False):
+        return dict(_session_status(upload_id, meta), error="Another chunk is being written", reason="conflict")
+
+    try:
+        status = _session_status(upload_id, meta)
+        if status["complete"] or offset != status["offset"]:
+            return dict(status, error="Offset does not match the received bytes", reason="conflict")
+        if offset + length > meta["size"]:
+            return dict(status, error="Chunk runs past the declared upload size", reason="too_large")
+
+        remaining = length
+        with open(_data_path(upload_id), "ab") as f:
+            try:
+                while remaining > 0:
+                    data = stream.read(min(WRITE_BUFFER_BYTES, remaining))
+                    if not data:
+                        break
+                    f.write(data)
+                    remaining -= len(data)
+            finally:
+                f.flush()
+                os.fsync(f.fileno())
+
+        status = _session_status(upload_id, meta)
+        if remaining > 0:
+            return dict(status, error="Chunk ended early", reason="bad_request")
+        return status
+    finally:
+        lock.release()
+
+def finalize_upload(upload_id, user_id, is_admin=False):
+    """Move a fully received upload into the media store and return its URL
+
+    Finalizing twice returns the same URL, so a client that lost the first
+    response can simply retry.
+    """
+    meta = _load_session(upload_id, user_id, is_admin)
+    if "error" in meta:
+        return meta
+
+    with _get_lock(upload_id):
+        meta = _load_session(upload_id, user_id, is_admin)
+        if meta.get("url"):
+            return {"success": True, "url": meta["url"]}
+
+        status = _session_status(upload_id, meta)
+        if status["offset"] != meta["size"]:
+            return dict(status, error=f"Upload is incomplete: {status['offset']} of {meta['size']} bytes received", reason="conflict")
+
+        try:
+            url = store_file(_data_path(upload_id))
+        except ValueError as e:
+            print(f"Rejected upload {upload_id}: {e}")
+            return {"error": str(e), "reason": "bad_request"}
+        except OSError as e:
+            print(f"Error finalizing upload {upload_id}: {e}")
+            return {"error": "Failed to store upload"}
+
+        # Keep the record so retries and later attachment find the URL
+        meta["url"] = url
+        meta["completed_at"] = time.time()
+        _write_meta(upload_id, meta)
+        return {"success": True, "url": url}
+
+def get_pending_upload_urls():
+    """Media URLs of finalized uploads whose sessions have not expired
+
+    The garbage collector keeps these, since the artwork they are meant for
+    may not have been saved yet.
+    """
+    urls = []
+    try:
+        entries = list(os.scandir(SESSIONS_DIR))
+    except FileNotFoundError:
+        return urls
+
+    for entry in entries:
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            with open(entry.path) as f:
+                url = json.load(f).get("url")
+        except (OSError, ValueError):
+            continue
+        if url:
+            urls.append(url)
+    return urls
+
+def expire_upload_sessions(now=None):
+    """Delete sessions not touched for SESSION_TTL_SECONDS"""
+    now = now or time.time()
+    removed = 0
+    try:
+        entries = list(os.scandir(SESSIONS_DIR))
+    except FileNotFoundError:
+        return 0
+
+    for entry in entries:
+        if not entry.name.endswith(".json"):
+            continue
+        upload_id = entry.name[:-len(".json")]
+        try:
+            touched = max(entry.stat().st_mtime, os.path.getmtime(_data_path(upload_id))
+                          if os.path.exists(_data_path(upload_id)) else 0)
+            if now - touched < SESSION_TTL_SECONDS:
+                continue
+            for path in (_data_path(upload_id), entry.path):
+                if os.path.exists(path):
+                    os.remove(path)
+            with _session_locks_lock:
+                _session_locks.pop(upload_id, None)
+            removed += 1
+        except OSError as e:
+            print(f"Error expiring upload {upload_id}: {e}")
+
+    if removed:
+        print(f"Expired {removed} upload sessions")
+    return removed
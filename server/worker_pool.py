@@ -0,0 +1,30 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+class WorkerPool:
+    """Worker processes for CPU-bound jobs, started on first use
+
+    Decoding, rendering and hashing must not hold the GIL of the request
+    threads, so they run here. lock may also be held by the owner while it
+    checks which jobs are already queued; it is reentrant, so submit can be
+    called with it held.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.lock = threading.RLock()
+        self._executor = None
+
+    def submit(self, fn, *args):
+        """Run fn(*args) in a worker process; returns its Future"""
+        with self.lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor.submit(fn, *args)
+
+    def stop(self, wait=False):
+        """Shut down the worker processes; the next submit starts new ones"""
+        with self.lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -3,7 +3,7 @@ import React from 'react';
 import { Link } from 'react-router-dom';
 import { Artwork } from '@/types';
 import { formatPrice } from '@/utils/formatters';
-import { createImageSrc, handleImageError } from '@/utils/imageUtils';
+import { createImageSrc, createImageSrcSet, createPlaceholderStyle, handleImageError } from '@/utils/imageUtils';
 import { Button } from '@/components/ui/button';
 import { AspectRatio } from '@/components/ui/aspect-ratio';
 import { Ban } from 'lucide-react';
@@ -26,6 +26,10 @@ const ArtworkCard = ({ artwork }: ArtworkCardProps) => {
         <AspectRatio ratio={3/4}>
           <img
             src={imageUrl}
+            srcSet={createImageSrcSet(artwork.image_variants)}
+            sizes="(min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw"
+            loading="lazy"
+            style={createPlaceholderStyle(artwork.image_variants)}
             alt={artwork.title}
             className="w-full h-full object-cover"
             onError={(e) => {
@@ -15,7 +15,7 @@ import {
 import { Input } from "@/components/ui/input";
 import { Textarea } from "@/components/ui/textarea";
 import { useToast } from "@/hooks/use-toast";
-import { ArtworkData } from "@/services/api";
+import { ArtworkData, uploadImageResumable } from "@/services/api";
 import { ImageUp, Loader2 } from "lucide-react";
 
 const MAX_FILE_SIZE = 5000000; // 5MB
@@ -52,6 +52,9 @@ const ArtworkForm: React.FC<ArtworkFormProps> = ({
     initialData?.imageUrl || null
   );
   const [imageFile, setImageFile] = useState<File | null>(null);
+  // Upload of imageFile, kept so a failed save doesn't send the image again
+  const [uploadId, setUploadId] = useState<string | null>(null);
+  const [uploadProgress, setUploadProgress] = useState<number | null>(null);
   
   const defaultValues = initialData || {
     title: "",
@@ -100,6 +103,7 @@ const ArtworkForm: React.FC<ArtworkFormProps> = ({
     }
     
     setImageFile(file);
+    setUploadId(null);
     
     // Create preview
     const reader = new FileReader();
@@ -112,14 +116,9 @@ const ArtworkForm: React.FC<ArtworkFormProps> = ({
   const handleSubmit = async (values: ArtworkFormValues) => {
     try {
       // If no image was uploaded or changed, use the existing image
-      let imageUrl = initialData?.imageUrl || "";
+      const imageUrl = initialData?.imageUrl || "";
       
-      if (imageFile) {
-        // Use the local preview data URL as the imageUrl
-        imageUrl = previewImage || "";
-      }
-      
-      if (!imageUrl && !imageFile && !initialData?.imageUrl) {
+      if (!imageFile && !imageUrl) {
         toast({
           variant: "destructive",
           title: "Image Required",
@@ -128,10 +127,32 @@ const ArtworkForm: React.FC<ArtworkFormProps> = ({
         return;
       }
       
-      // Include the image URL in the submission data
+      // Send a new image in chunks; the server attaches it by uploadId
+      let imageUploadId = uploadId;
+      if (imageFile && !imageUploadId) {
+        setUploadProgress(0);
+        try {
+          imageUploadId = await uploadImageResumable(imageFile, (sent, total) =>
+            setUploadProgress(Math.round((sent / total) * 100))
+          );
+        } catch (error) {
+          toast({
+            variant: "destructive",
+            title: "Upload Failed",
+            description: "Could not upload the image. Please try again.",
+          });
+          console.error("Upload error:", error);
+          return;
+        } finally {
+          setUploadProgress(null);
+        }
+        setUploadId(imageUploadId);
+      }
+      
       onSubmit({
         ...values,
         imageUrl,
+        ...(imageUploadId ? { uploadId: imageUploadId } : {}),
         price: values.price // Price in KSh
       } as ArtworkData);
     } catch (error) {
@@ -214,7 +235,11 @@ const ArtworkForm: React.FC<ArtworkFormProps> = ({
               <input type="file" className="hidden" onChange={handleImageChange} accept="image/*" />
             </label>
             
-            {previewImage && (
+            {uploadProgress !== null ? (
+              <p className="text-sm text-gray-500 mt-2">
+                Uploading image... {uploadProgress}%
+              </p>
+            ) : previewImage && (
               <p className="text-sm text-gray-500 mt-2">
                 Click above to change the image
               </p>
@@ -303,11 +328,16 @@ const ArtworkForm: React.FC<ArtworkFormProps> = ({
         />
         
         <div className="flex justify-end gap-2 pt-4">
-          <Button type="button" variant="outline" onClick={onCancel} disabled={isSubmitting}>
+          <Button type="button" variant="outline" onClick={onCancel} disabled={isSubmitting || uploadProgress !== null}>
             Cancel
           </Button>
-          <Button type="submit" disabled={isSubmitting}>
-            {isSubmitting ? (
+          <Button type="submit" disabled={isSubmitting || uploadProgress !== null}>
+            {uploadProgress !== null ? (
+              <>
+                <Loader2 className="mr-2 h-4 w-4 animate-spin" />
+                Uploading...
+              </>
+            ) : isSubmitting ? (
               <>
                 <Loader2 className="mr-2 h-4 w-4 animate-spin" />
                 {initialData ? "Updating..." : "Creating..."}
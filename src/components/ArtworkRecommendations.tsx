@@ -4,11 +4,10 @@ import { Link } from 'react-router-dom';
 import { ArrowRight, Sparkles, User, ShoppingCart } from 'lucide-react';
 import { Button } from '@/components/ui/button';
 import ArtworkCard from '@/components/ArtworkCard';
-import { getAllArtworks } from '@/services/api';
+import { getRecommendations } from '@/services/api';
 import { Artwork } from '@/types';
 import { useToast } from '@/hooks/use-toast';
 import { useAuth } from '@/contexts/AuthContext';
-import { RecommendationEngine } from '@/services/recommendationService';
 
 const ArtworkRecommendations = () => {
   const [recommendedArtworks, setRecommendedArtworks] = useState<Artwork[]>([]);
@@ -22,39 +21,14 @@ const ArtworkRecommendations = () => {
     const fetchAndGenerateRecommendations = async () => {
       try {
         setLoading(true);
-        const allArtworks = await getAllArtworks();
-        console.log("Fetched artworks for recommendations:", allArtworks.length);
+        // One small response: ranked on the server from the user's orders,
+        // or the most purchased artworks for guests
+        const { artworks, personalized } = await getRecommendations(3);
+        console.log("Fetched recommendations:", artworks.length, personalized ? "(personalized)" : "");
         
-        let recommendations: Artwork[] = [];
-        let personalized = false;
-        let noPurchases = false;
-        
-        // Generate personalized recommendations if user is authenticated
-        if (isAuthenticated && currentUser?.id) {
-          console.log("Generating personalized recommendations for user:", currentUser.id);
-          recommendations = await RecommendationEngine.generatePersonalizedRecommendations(
-            currentUser.id, 
-            allArtworks, 
-            3
-          );
-          
-          if (recommendations.length === 0) {
-            console.log("No personalized recommendations - user has no purchase history");
-            noPurchases = true;
-          } else {
-            personalized = true;
-          }
-        }
-        
-        // Fallback to general recommendations only for non-authenticated users
-        if (!isAuthenticated && recommendations.length === 0) {
-          console.log("Generating general recommendations for non-authenticated user");
-          recommendations = RecommendationEngine.generateSimilarArtworkRecommendations(
-            allArtworks[0] || {} as Artwork, 
-            allArtworks, 
-            3
-          );
-        }
+        // Signed-in users without purchases don't get the general picks
+        const noPurchases = isAuthenticated && !!currentUser?.id && !personalized;
+        const recommendations: Artwork[] = noPurchases ? [] : artworks;
         
         setRecommendedArtworks(recommendations);
         setIsPersonalized(personalized);
@@ -3,7 +3,7 @@ import React from 'react';
 import { Link } from 'react-router-dom';
 import { Exhibition } from '@/types';
 import { formatPrice, formatDateRange } from '@/utils/formatters';
-import { createImageSrc, handleImageError } from '@/utils/imageUtils';
+import { createImageSrc, createImageSrcSet, createPlaceholderStyle, handleImageError } from '@/utils/imageUtils';
 import { Button } from '@/components/ui/button';
 import { AspectRatio } from '@/components/ui/aspect-ratio';
 import { MapPin, Calendar, Ban } from 'lucide-react';
@@ -21,6 +21,10 @@ const ExhibitionCard = ({ exhibition }: ExhibitionCardProps) => {
         <AspectRatio ratio={16/9}>
           <img
             src={createImageSrc(exhibition.imageUrl)}
+            srcSet={createImageSrcSet(exhibition.imageVariants)}
+            sizes="(min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw"
+            loading="lazy"
+            style={createPlaceholderStyle(exhibition.imageVariants)}
             alt={exhibition.title}
             className="w-full h-full object-cover"
             onError={handleImageError}
@@ -0,0 +1,14 @@
+import * as React from "react"
+
+// The value once it has stopped changing for delay ms, so typing sends one
+// request instead of one per keystroke
+export function useDebounce<T>(value: T, delay = 250) {
+  const [debounced, setDebounced] = React.useState(value)
+
+  React.useEffect(() => {
+    const timer = setTimeout(() => setDebounced(value), delay)
+    return () => clearTimeout(timer)
+  }, [value, delay])
+
+  return debounced
+}
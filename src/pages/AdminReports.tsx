@@ -6,7 +6,7 @@ import { Button } from "@/components/ui/button";
 import { Badge } from "@/components/ui/badge";
 import { FileText, Download, TrendingUp, Users, Calendar, ShoppingBag, Ticket } from 'lucide-react';
 import { useToast } from "@/hooks/use-toast";
-import { getAllArtworks, getAllExhibitions, getAllTickets, authFetch } from '@/services/api';
+import { getAllArtworks, getAllExhibitions, getAllTickets, getTicketOccupancy, authFetch } from '@/services/api';
 import { format } from 'date-fns';
 
 const AdminReports = () => {
@@ -24,11 +24,23 @@ const AdminReports = () => {
     queryFn: getAllExhibitions,
   });
 
-  const { data: ticketsData } = useQuery({
-    queryKey: ['tickets'],
-    queryFn: getAllTickets,
+  const { data: occupancyData } = useQuery({
+    queryKey: ['tickets', 'occupancy'],
+    queryFn: getTicketOccupancy,
   });
 
+  // The ticket report is the only place that needs every booking, so page through the ledger on demand
+  const fetchAllTickets = async () => {
+    const tickets: any[] = [];
+    for (let page = 1; ; page++) {
+      const response = await getAllTickets({ page, pageSize: 200 });
+      tickets.push(...(response?.tickets || []));
+      if (!response?.tickets?.length || tickets.length >= (response.total || 0)) {
+        return tickets;
+      }
+    }
+  };
+
   const { data: ordersData } = useQuery({
     queryKey: ['orders'],
     queryFn: async () => {
@@ -101,22 +113,23 @@ const AdminReports = () => {
           break;
 
         case 'tickets':
-          const ticketData = ticketsData?.tickets?.map((ticket: any) => ({
+          const allTickets = await fetchAllTickets();
+          const ticketData = allTickets.map((ticket: any) => ({
             user_name: ticket.user_name,
             exhibition_title: ticket.exhibition_title,
             booking_date: format(new Date(ticket.booking_date), 'yyyy-MM-dd'),
             slots: ticket.slots,
             status: ticket.status,
             total_amount: ticket.total_amount,
-          })) || [];
+          }));
           generateCSV(ticketData, 'tickets_report', ['User Name', 'Exhibition Title', 'Booking Date', 'Slots', 'Status', 'Total Amount']);
           break;
 
         case 'financial':
           const totalSales = ordersData?.orders?.reduce((sum: number, order: any) => 
             order.payment_status === 'completed' ? sum + (order.total_amount || 0) : sum, 0) || 0;
-          const totalTickets = ticketsData?.tickets?.reduce((sum: number, ticket: any) => 
-            sum + (ticket.total_amount || 0), 0) || 0;
+          const totalTickets = occupancyData?.totals?.revenue || 0;
+          const ticketsSold = occupancyData?.totals?.sold_tickets || 0;
           
           const financialData = [
             {
@@ -128,13 +141,13 @@ const AdminReports = () => {
             {
               category: 'Exhibition Tickets',
               total_revenue: totalTickets,
-              count: ticketsData?.tickets?.length || 0,
+              count: ticketsSold,
               report_date: format(new Date(), 'yyyy-MM-dd'),
             },
             {
               category: 'Total Revenue',
               total_revenue: totalSales + totalTickets,
-              count: (ordersData?.orders?.length || 0) + (ticketsData?.tickets?.length || 0),
+              count: (ordersData?.orders?.length || 0) + ticketsSold,
               report_date: format(new Date(), 'yyyy-MM-dd'),
             }
           ];
@@ -189,7 +202,7 @@ const AdminReports = () => {
       description: 'Exhibition ticket bookings and attendance data',
       icon: Ticket,
       color: 'bg-orange-500',
-      dataCount: ticketsData?.tickets?.length || 0,
+      dataCount: occupancyData?.totals?.sold_tickets || 0,
     },
     {
       id: 'financial',
@@ -197,7 +210,7 @@ const AdminReports = () => {
       description: 'Revenue analysis from sales and ticket bookings',
       icon: TrendingUp,
       color: 'bg-red-500',
-      dataCount: ((ordersData?.orders?.length || 0) + (ticketsData?.tickets?.length || 0)),
+      dataCount: ((ordersData?.orders?.length || 0) + (occupancyData?.totals?.sold_tickets || 0)),
     },
   ];
 
@@ -261,7 +274,7 @@ const AdminReports = () => {
               <div className="text-sm text-gray-600">Active Exhibitions</div>
             </div>
             <div className="text-center">
-              <div className="text-3xl font-bold text-orange-600">{ticketsData?.tickets?.length || 0}</div>
+              <div className="text-3xl font-bold text-orange-600">{occupancyData?.totals?.sold_tickets || 0}</div>
               <div className="text-sm text-gray-600">Tickets Booked</div>
             </div>
           </div>
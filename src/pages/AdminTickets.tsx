@@ -34,12 +34,15 @@ interface Ticket {
   payment_status: 'pending' | 'completed' | 'failed';
 }
 
+const TICKETS_PAGE_SIZE = 50;
+
 const AdminTickets = () => {
   const navigate = useNavigate();
   const { toast } = useToast();
   const [selectedTicket, setSelectedTicket] = useState<Ticket | null>(null);
   const [generatingTicket, setGeneratingTicket] = useState<string | null>(null);
   const [searchTerm, setSearchTerm] = useState('');
+  const [page, setPage] = useState(1);
 
   useEffect(() => {
     if (!isAdmin()) {
@@ -51,8 +54,8 @@ const AdminTickets = () => {
   }, [navigate]);
 
   const { data, isLoading, error } = useQuery({
-    queryKey: ['tickets'],
-    queryFn: getAllTickets,
+    queryKey: ['tickets', page],
+    queryFn: () => getAllTickets({ page, pageSize: TICKETS_PAGE_SIZE }),
   });
 
   // Log tickets data and preload images when data is available
@@ -297,6 +300,7 @@ const AdminTickets = () => {
   }
 
   const tickets = data?.tickets || [];
+  const totalPages = Math.max(1, Math.ceil((data?.total || 0) / TICKETS_PAGE_SIZE));
 
   return (
     <div className="container mx-auto py-8 px-4">
@@ -305,7 +309,16 @@ const AdminTickets = () => {
       <div className="grid gap-6 md:grid-cols-[1fr_1fr]">
         <Card className="p-4">
           <div className="flex items-center justify-between mb-4">
-            <h2 className="text-xl font-semibold">All Tickets ({filteredTickets.length})</h2>
+            <h2 className="text-xl font-semibold">All Tickets ({data?.total ?? filteredTickets.length})</h2>
+            <div className="flex items-center gap-2">
+              <Button variant="outline" size="sm" disabled={page <= 1} onClick={() => setPage(page - 1)}>
+                Previous
+              </Button>
+              <span className="text-sm text-gray-500">Page {page} of {totalPages}</span>
+              <Button variant="outline" size="sm" disabled={page >= totalPages} onClick={() => setPage(page + 1)}>
+                Next
+              </Button>
+            </div>
           </div>
           
           {/* Search Bar */}
@@ -8,7 +8,7 @@ import { useAuth } from '@/contexts/AuthContext';
 import { useToast } from '@/hooks/use-toast';
 import ArtworkCard from '@/components/ArtworkCard';
 import { Artwork } from '@/types';
-import { getArtwork, getAllArtworks } from '@/services/api';
+import { getArtwork } from '@/services/api';
 import { RecommendationEngine } from '@/services/recommendationService';
 import { Ban, Sparkles } from 'lucide-react';
 
@@ -31,13 +31,8 @@ const ArtworkDetail = () => {
         console.log("Artwork data received:", data);
         setArtwork(data);
         
-        // Fetch all artworks to get intelligent recommendations
-        const allArtworks = await getAllArtworks();
-        const recommendations = RecommendationEngine.generateSimilarArtworkRecommendations(
-          data, 
-          allArtworks, 
-          4
-        );
+        // Ranked on the server; only the similar artworks are sent
+        const recommendations = await RecommendationEngine.generateSimilarArtworkRecommendations(id, 4);
         
         setRelatedArtworks(recommendations);
       } catch (error) {
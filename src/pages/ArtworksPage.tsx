@@ -6,15 +6,51 @@ import { Label } from '@/components/ui/label';
 import { Slider } from '@/components/ui/slider';
 import { formatPrice } from '@/utils/formatters';
 import { Search, Sparkles, User } from 'lucide-react';
-import { getAllArtworks } from '@/services/api';
+import { getAllArtworks, getArtworkFacets, getAutocompleteSuggestions, searchArtworksByColor, searchCatalog } from '@/services/api';
 import { Artwork } from '@/types';
 import { useToast } from '@/hooks/use-toast';
+import { useDebounce } from '@/hooks/use-debounce';
 import { Button } from '@/components/ui/button';
 import { useAuth } from '@/contexts/AuthContext';
 import { RecommendationEngine } from '@/services/recommendationService';
 
+// Facets offered as filters, with their headings; counts come from /artworks/facets
+const FACET_LABELS: Record<string, string> = {
+  medium: 'Medium',
+  status: 'Availability',
+};
+
+// Colours offered by the colour filter; names are sent, the server knows them
+const COLOR_SWATCHES: Record<string, string> = {
+  red: '#c0392b', orange: '#e67e22', yellow: '#f1c40f', green: '#27ae60',
+  blue: '#2e6fd8', purple: '#8e44ad', pink: '#e84393', brown: '#8b5a2b',
+  gold: '#d4af37', black: '#000000', white: '#ffffff',
+};
+
+interface FacetValue {
+  value: string;
+  count: number;
+  selected: boolean;
+}
+
+// The value an artwork has for a facet, as the server counts it
+const facetValue = (artwork: Artwork, facet: string) =>
+  facet === 'medium' ? (artwork.medium || '').trim() : artwork.status || 'available';
+
 const ArtworksPage = () => {
   const [searchTerm, setSearchTerm] = useState('');
+  // Artworks matching the search term, best first, from /search
+  const [searchResults, setSearchResults] = useState<Artwork[] | null>(null);
+  const [searching, setSearching] = useState(false);
+  const debouncedSearchTerm = useDebounce(searchTerm.trim());
+  // Titles, artists and mediums completing what has been typed
+  const [suggestions, setSuggestions] = useState<{ text: string; type: string }[]>([]);
+  const [showSuggestions, setShowSuggestions] = useState(false);
+  const [selectedFacets, setSelectedFacets] = useState<Record<string, string[]>>({});
+  const [facetCounts, setFacetCounts] = useState<Record<string, FacetValue[]>>({});
+  // Artworks best matching the chosen colours, from /artworks/search?color=
+  const [colors, setColors] = useState<string[]>([]);
+  const [colorResults, setColorResults] = useState<Artwork[] | null>(null);
   const [priceRange, setPriceRange] = useState([0, 100000]);
   const [artworks, setArtworks] = useState<Artwork[]>([]);
   const [loading, setLoading] = useState(true);
@@ -58,6 +94,136 @@ const ArtworksPage = () => {
     fetchArtworks();
   }, [toast]);
 
+  useEffect(() => {
+    if (!debouncedSearchTerm) {
+      setSearchResults(null);
+      return;
+    }
+
+    let cancelled = false;
+    setSearching(true);
+    searchCatalog(debouncedSearchTerm, { type: 'artwork', limit: 100 })
+      .then((data) => {
+        if (cancelled) return;
+        // Results are summaries; show the full records where we have them
+        const byId = new Map(artworks.map((artwork) => [artwork.id, artwork]));
+        setSearchResults((data.results || []).map((result: Artwork) => byId.get(result.id) || result));
+      })
+      .catch(() => {
+        if (cancelled) return;
+        setSearchResults([]);
+        toast({
+          title: "Error",
+          description: "Search failed. Please try again.",
+          variant: "destructive",
+        });
+      })
+      .finally(() => {
+        if (!cancelled) setSearching(false);
+      });
+
+    return () => {
+      cancelled = true;
+    };
+  }, [debouncedSearchTerm, artworks, toast]);
+
+  useEffect(() => {
+    if (!debouncedSearchTerm) {
+      setSuggestions([]);
+      return;
+    }
+
+    let cancelled = false;
+    getAutocompleteSuggestions(debouncedSearchTerm)
+      .then((data) => {
+        if (!cancelled) setSuggestions(data);
+      })
+      .catch(() => {
+        // Suggestions are a convenience; the search itself still works
+        if (!cancelled) setSuggestions([]);
+      });
+
+    return () => {
+      cancelled = true;
+    };
+  }, [debouncedSearchTerm]);
+
+  useEffect(() => {
+    let cancelled = false;
+    getArtworkFacets(selectedFacets)
+      .then((data) => {
+        if (!cancelled) setFacetCounts(data.facets || {});
+      })
+      .catch(() => {
+        // Without counts the facet filters are simply not shown
+        if (!cancelled) setFacetCounts({});
+      });
+
+    return () => {
+      cancelled = true;
+    };
+  }, [selectedFacets, artworks]);
+
+  useEffect(() => {
+    if (!colors.length) {
+      setColorResults(null);
+      return;
+    }
+
+    let cancelled = false;
+    searchArtworksByColor(colors, 100)
+      .then((data) => {
+        if (!cancelled) setColorResults(data);
+      })
+      .catch(() => {
+        if (cancelled) return;
+        setColors([]);
+        toast({
+          title: "Error",
+          description: "Colour search is not available right now.",
+          variant: "destructive",
+        });
+      });
+
+    return () => {
+      cancelled = true;
+    };
+  }, [colors, toast]);
+
+  const toggleColor = (color: string) => {
+    setColors((current) => (current.includes(color) ? current.filter((c) => c !== color) : [...current, color]));
+  };
+
+  const toggleFacetValue = (facet: string, value: string) => {
+    setSelectedFacets((current) => {
+      const values = current[facet] || [];
+      const next = { ...current, [facet]: values.includes(value) ? values.filter((v) => v !== value) : [...values, value] };
+      if (!next[facet].length) {
+        delete next[facet];
+      }
+      return next;
+    });
+  };
+
+  const chooseSuggestion = (text: string) => {
+    setSearchTerm(text);
+    setShowSuggestions(false);
+  };
+
+  // Colour matches or search results in rank order (both: colour order, among
+  // the search results), or every artwork. Then the price range and one of
+  // the selected values of every facet must match.
+  const searchIds = searchResults && new Set(searchResults.map((artwork) => artwork.id));
+  const rankedArtworks = colorResults
+    ? colorResults.filter((artwork) => !searchIds || searchIds.has(artwork.id))
+    : searchResults ?? artworks;
+  const filteredArtworks = rankedArtworks.filter(
+    (artwork) =>
+      artwork.price >= priceRange[0] &&
+      artwork.price <= priceRange[1] &&
+      Object.entries(selectedFacets).every(([facet, values]) => values.includes(facetValue(artwork, facet)))
+  );
+
   // Generate personalized recommendations
   const generateRecommendations = async () => {
     if (artworks.length === 0) return;
@@ -71,11 +237,7 @@ const ArtworksPage = () => {
       
       if (isAuthenticated && currentUser?.id) {
         console.log("Generating personalized recommendations");
-        recommendations = await RecommendationEngine.generatePersonalizedRecommendations(
-          currentUser.id, 
-          artworks, 
-          6
-        );
+        recommendations = await RecommendationEngine.generatePersonalizedRecommendations(6);
         
         if (recommendations.length === 0) {
           console.log("User has no purchase history");
@@ -91,16 +253,8 @@ const ArtworksPage = () => {
         }
       } else {
         console.log("Generating general recommendations");
-        // Filter by current search and price criteria for non-authenticated users
-        const filteredForRecommendations = artworks.filter(artwork => {
-          const matchesSearch = searchTerm.trim() === '' || 
-            artwork.title.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            artwork.artist.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            artwork.description.toLowerCase().includes(searchTerm.toLowerCase());
-          
-          const matchesPrice = artwork.price >= priceRange[0] && artwork.price <= priceRange[1];
-          return matchesSearch && matchesPrice && artwork.status === 'available';
-        });
+        // Pick from the current search and price criteria for non-authenticated users
+        const filteredForRecommendations = filteredArtworks.filter(artwork => artwork.status === 'available');
         
         recommendations = filteredForRecommendations
           .sort(() => 0.5 - Math.random())
@@ -128,18 +282,6 @@ const ArtworksPage = () => {
     }
   };
 
-  // Filter artworks based on search term and price range
-  const filteredArtworks = artworks.filter((artwork) => {
-    const matchesSearch = 
-      artwork.title.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      artwork.artist.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      artwork.description.toLowerCase().includes(searchTerm.toLowerCase());
-    
-    const matchesPrice = artwork.price >= priceRange[0] && artwork.price <= priceRange[1];
-    
-    return matchesSearch && matchesPrice;
-  });
-
   return (
     <div className="py-12 px-4 md:px-6 bg-secondary min-h-screen">
       <div className="container mx-auto">
@@ -181,17 +323,94 @@ const ArtworksPage = () => {
                 <div className="relative">
                   <Input
                     id="search"
-                    placeholder="Search by title, artist, or description..."
+                    placeholder="Search by title, artist, medium or description..."
                     value={searchTerm}
-                    onChange={(e) => setSearchTerm(e.target.value)}
+                    onChange={(e) => {
+                      setSearchTerm(e.target.value);
+                      setShowSuggestions(true);
+                    }}
+                    onFocus={() => setShowSuggestions(true)}
+                    onBlur={() => setShowSuggestions(false)}
+                    onKeyDown={(e) => e.key === 'Escape' && setShowSuggestions(false)}
+                    autoComplete="off"
                     className="pr-10"
                   />
                   <Search className="absolute right-3 top-1/2 transform -translate-y-1/2 h-5 w-5 text-gray-400" />
+                  {showSuggestions && searchTerm.trim() && suggestions.length > 0 && (
+                    <ul className="absolute z-10 mt-1 w-full bg-white border rounded-md shadow-lg overflow-hidden">
+                      {suggestions.map((suggestion) => (
+                        <li key={`${suggestion.type}-${suggestion.text}`}>
+                          <button
+                            type="button"
+                            // Keeps the input focused, so its blur does not close the list first
+                            onMouseDown={(e) => e.preventDefault()}
+                            onClick={() => chooseSuggestion(suggestion.text)}
+                            className="w-full flex justify-between px-3 py-2 text-left hover:bg-secondary"
+                          >
+                            <span>{suggestion.text}</span>
+                            <span className="text-xs text-gray-500 capitalize">{suggestion.type}</span>
+                          </button>
+                        </li>
+                      ))}
+                    </ul>
+                  )}
                 </div>
               </div>
             </div>
           </div>
           
+          {/* Colours */}
+          <div className="mt-6">
+            <Label className="text-lg font-medium mb-3 block">Colour</Label>
+            <div className="flex flex-wrap items-center gap-2">
+              {Object.entries(COLOR_SWATCHES).map(([name, hex]) => (
+                <button
+                  key={name}
+                  type="button"
+                  title={name}
+                  aria-label={`Colour ${name}`}
+                  aria-pressed={colors.includes(name)}
+                  onClick={() => toggleColor(name)}
+                  className={`h-8 w-8 rounded-full border ${colors.includes(name) ? 'ring-2 ring-gold ring-offset-2' : 'border-gray-300'}`}
+                  style={{ backgroundColor: hex }}
+                />
+              ))}
+              {colors.length > 0 && (
+                <Button type="button" size="sm" variant="ghost" onClick={() => setColors([])}>
+                  Clear
+                </Button>
+              )}
+            </div>
+          </div>
+          
+          {/* Facets */}
+          {Object.keys(FACET_LABELS).some((facet) => facetCounts[facet]?.length) && (
+            <div className="mt-6 grid md:grid-cols-2 gap-6">
+              {Object.entries(FACET_LABELS).map(([facet, label]) =>
+                facetCounts[facet]?.length ? (
+                  <div key={facet}>
+                    <Label className="text-lg font-medium mb-3 block">{label}</Label>
+                    <div className="flex flex-wrap gap-2">
+                      {facetCounts[facet].map(({ value, count, selected }) => (
+                        <Button
+                          key={value}
+                          type="button"
+                          size="sm"
+                          variant={selected ? 'default' : 'outline'}
+                          onClick={() => toggleFacetValue(facet, value)}
+                          className={`capitalize ${selected ? 'bg-gold hover:bg-gold-dark text-white' : ''}`}
+                          disabled={!count && !selected}
+                        >
+                          {value} ({count})
+                        </Button>
+                      ))}
+                    </div>
+                  </div>
+                ) : null
+              )}
+            </div>
+          )}
+          
           {/* Recommendations Button */}
           <div className="mt-6 flex justify-center">
             <Button 
@@ -240,7 +459,7 @@ const ArtworksPage = () => {
         {/* Results */}
         <div className="mb-6">
           <p className="text-gray-600">
-            {loading ? "Loading artworks..." : `Showing ${filteredArtworks.length} artworks`}
+            {loading ? "Loading artworks..." : searching ? "Searching..." : `Showing ${filteredArtworks.length} artworks`}
           </p>
         </div>
         
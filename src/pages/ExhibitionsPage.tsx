@@ -4,9 +4,10 @@ import ExhibitionCard from '@/components/ExhibitionCard';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
-import { Search } from 'lucide-react';
+import { CalendarDays, Search } from 'lucide-react';
+import { Button } from '@/components/ui/button';
 import { Exhibition } from '@/types';
-import { getAllExhibitions } from '@/services/api';
+import { getAllExhibitions, getExhibitionCalendar, getExhibitionsOn } from '@/services/api';
 import { useToast } from '@/hooks/use-toast';
 
 const ExhibitionsPage = () => {
@@ -14,6 +15,11 @@ const ExhibitionsPage = () => {
   const [statusFilter, setStatusFilter] = useState('all');
   const [exhibitions, setExhibitions] = useState<Exhibition[]>([]);
   const [loading, setLoading] = useState(true);
+  // Only exhibitions open on some day between the dates (YYYY-MM-DD), or today
+  const [fromDate, setFromDate] = useState('');
+  const [toDate, setToDate] = useState('');
+  const [openToday, setOpenToday] = useState(false);
+  const [openIds, setOpenIds] = useState<Set<string> | null>(null);
   const { toast } = useToast();
   
   useEffect(() => {
@@ -37,7 +43,45 @@ const ExhibitionsPage = () => {
     fetchExhibitions();
   }, [toast]);
 
-  // Filter exhibitions based on search term and status filter
+  useEffect(() => {
+    if (!openToday && !fromDate && !toDate) {
+      setOpenIds(null);
+      return;
+    }
+
+    let cancelled = false;
+    const request = openToday ? getExhibitionsOn() : getExhibitionCalendar(fromDate || undefined, toDate || undefined);
+    request
+      .then((data: Exhibition[]) => {
+        if (!cancelled) setOpenIds(new Set(data.map((exhibition) => exhibition.id)));
+      })
+      .catch(() => {
+        if (cancelled) return;
+        setOpenIds(null);
+        toast({
+          title: "Error",
+          description: "Could not load exhibitions for those dates. Until must not be before From, and a range can span at most a year.",
+          variant: "destructive",
+        });
+      });
+
+    return () => {
+      cancelled = true;
+    };
+  }, [fromDate, toDate, openToday, toast]);
+
+  const changeDate = (setDate: (value: string) => void, value: string) => {
+    setOpenToday(false);
+    setDate(value);
+  };
+
+  const showOpenToday = () => {
+    setFromDate('');
+    setToDate('');
+    setOpenToday(!openToday);
+  };
+
+  // Filter exhibitions based on search term, status filter and dates
   const filteredExhibitions = exhibitions.filter((exhibition) => {
     const matchesSearch = 
       exhibition.title.toLowerCase().includes(searchTerm.toLowerCase()) ||
@@ -45,8 +89,9 @@ const ExhibitionsPage = () => {
       exhibition.description.toLowerCase().includes(searchTerm.toLowerCase());
     
     const matchesStatus = statusFilter === 'all' || exhibition.status === statusFilter;
+    const matchesDates = !openIds || openIds.has(exhibition.id);
     
-    return matchesSearch && matchesStatus;
+    return matchesSearch && matchesStatus && matchesDates;
   });
 
   return (
@@ -95,6 +140,28 @@ const ExhibitionsPage = () => {
               </div>
             </div>
           </div>
+          
+          {/* Dates */}
+          <div className="mt-6 grid md:grid-cols-[1fr_1fr_auto] gap-6 items-end">
+            <div>
+              <Label htmlFor="from-date" className="text-lg font-medium mb-3 block">Open From</Label>
+              <Input id="from-date" type="date" value={fromDate} onChange={(e) => changeDate(setFromDate, e.target.value)} />
+            </div>
+            <div>
+              <Label htmlFor="to-date" className="text-lg font-medium mb-3 block">Until</Label>
+              <Input id="to-date" type="date" value={toDate} min={fromDate || undefined}
+                     onChange={(e) => changeDate(setToDate, e.target.value)} />
+            </div>
+            <Button
+              type="button"
+              variant={openToday ? 'default' : 'outline'}
+              onClick={showOpenToday}
+              className={`flex items-center gap-2 ${openToday ? 'bg-gold hover:bg-gold-dark text-white' : ''}`}
+            >
+              <CalendarDays className="h-4 w-4" />
+              Open Today
+            </Button>
+          </div>
         </div>
         
         {/* Results */}
@@ -6,7 +6,7 @@ import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
 import { formatPrice } from '@/utils/formatters';
 import { useToast } from '@/hooks/use-toast';
-import { initiateSTKPush, checkTransactionStatus, finalizeOrder } from '@/utils/mpesa';
+import { initiateSTKPush, checkTransactionStatus, subscribeToTransactionStatus, finalizeOrder } from '@/utils/mpesa';
 import { DollarSign, Loader2 } from 'lucide-react';
 import { useAuth } from '@/contexts/AuthContext';
 
@@ -34,8 +34,6 @@ const Payment = () => {
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [paymentStatus, setPaymentStatus] = useState<'pending' | 'processing' | 'success' | 'failed'>('pending');
   const [checkoutRequestId, setCheckoutRequestId] = useState('');
-  const [checkingStatus, setCheckingStatus] = useState(false);
-  const [statusCheckAttempts, setStatusCheckAttempts] = useState(0);
 
   useEffect(() => {
     // Get order details from localStorage
@@ -55,24 +53,15 @@ const Payment = () => {
     }
   }, [navigate]);
 
-  // Effect to check payment status
+  // Effect to wait for the payment status pushed by the server
   useEffect(() => {
-    let statusCheckInterval: number | null = null;
+    if (!checkoutRequestId || paymentStatus !== 'processing') {
+      return;
+    }
     
-    const checkStatus = async () => {
-      if (!checkoutRequestId || paymentStatus !== 'processing' || checkingStatus) {
-        return;
-      }
-      
-      setCheckingStatus(true);
-      
+    const handleStatus = async (statusResponse: any) => {
       try {
-        const statusResponse = await checkTransactionStatus(checkoutRequestId);
-        
-        if (statusResponse.ResultCode === "0") {
-          // Payment successful
-          clearInterval(statusCheckInterval as number);
-          
+        if (statusResponse.status === 'completed') {
           // Update payment status
           setPaymentStatus('success');
           
@@ -100,36 +89,46 @@ const Payment = () => {
               throw new Error("Failed to finalize order");
             }
           }
-        } else if (statusResponse.errorCode === "500.001.1001") {
-          // Transaction still in process, continue checking
-          setStatusCheckAttempts(prev => prev + 1);
-          
-          // After 10 attempts (about 50 seconds), give up
-          if (statusCheckAttempts >= 10) {
-            clearInterval(statusCheckInterval as number);
-            setPaymentStatus('failed');
-            toast({
-              title: "Payment timeout",
-              description: "We couldn't confirm your payment. Please try again or contact support.",
-              variant: "destructive"
-            });
-          }
+        } else if (statusResponse.status === 'pending') {
+          // The stream timed out before M-Pesa settled the payment
+          setPaymentStatus('failed');
+          toast({
+            title: "Payment timeout",
+            description: "We couldn't confirm your payment. Please try again or contact support.",
+            variant: "destructive"
+          });
         } else {
           // Payment failed or cancelled
-          clearInterval(statusCheckInterval as number);
           setPaymentStatus('failed');
           toast({
             title: "Payment failed",
-            description: statusResponse.ResultDesc || "There was an issue with your payment. Please try again.",
+            description: statusResponse.message || "There was an issue with your payment. Please try again.",
             variant: "destructive"
           });
         }
       } catch (error) {
-        console.error('Error checking payment status:', error);
+        console.error('Error handling payment status:', error);
+        setPaymentStatus('failed');
+        toast({
+          title: "Error checking payment",
+          description: "We couldn't verify your payment status. Please check your M-Pesa messages.",
+          variant: "destructive"
+        });
+      }
+    };
+    
+    const unsubscribe = subscribeToTransactionStatus(
+      checkoutRequestId,
+      handleStatus,
+      async (error) => {
+        console.error('Payment status stream error:', error);
         
-        // After 10 attempts, give up
-        if (statusCheckAttempts >= 10) {
-          clearInterval(statusCheckInterval as number);
+        // Fall back to a single status check before giving up
+        try {
+          const statusResponse = await checkTransactionStatus(checkoutRequestId);
+          await handleStatus(statusResponse);
+        } catch (checkError) {
+          console.error('Error checking payment status:', checkError);
           setPaymentStatus('failed');
           toast({
             title: "Error checking payment",
@@ -137,25 +136,11 @@ const Payment = () => {
             variant: "destructive"
           });
         }
-      } finally {
-        setCheckingStatus(false);
       }
-    };
-    
-    if (checkoutRequestId && paymentStatus === 'processing') {
-      // Check status immediately
-      checkStatus();
-      
-      // Then check every 5 seconds
-      statusCheckInterval = window.setInterval(checkStatus, 5000);
-    }
+    );
     
-    return () => {
-      if (statusCheckInterval) {
-        clearInterval(statusCheckInterval);
-      }
-    };
-  }, [checkoutRequestId, paymentStatus, checkingStatus, statusCheckAttempts, order, currentUser, navigate, phoneNumber, toast]);
+    return unsubscribe;
+  }, [checkoutRequestId, paymentStatus, order, currentUser, navigate, phoneNumber, toast]);
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
@@ -224,8 +209,7 @@ const Payment = () => {
         throw new Error(response.error);
       }
       
-      setCheckoutRequestId(response.CheckoutRequestID || response.checkoutRequestId);
-      setStatusCheckAttempts(0);
+      setCheckoutRequestId(response.checkoutHandle || response.CheckoutRequestID || response.checkoutRequestId);
       
       toast({
         title: "Payment initiated",
@@ -249,7 +233,6 @@ const Payment = () => {
     setPaymentStatus('pending');
     setIsSubmitting(false);
     setCheckoutRequestId('');
-    setStatusCheckAttempts(0);
   };
 
   if (!order) {
@@ -6,7 +6,7 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { useNavigate } from 'react-router-dom';
 import { formatPrice, formatDate } from '@/utils/formatters';
 import { CalendarIcon, MapPinIcon, UserIcon, PhoneIcon, MailIcon, Loader2, Sparkles, ShoppingCart } from 'lucide-react';
-import { authFetch, getAllArtworks } from '@/services/api';
+import { authFetch } from '@/services/api';
 import { useToast } from '@/hooks/use-toast';
 import { RecommendationEngine } from '@/services/recommendationService';
 import ArtworkCard from '@/components/ArtworkCard';
@@ -130,12 +130,7 @@ const Profile = () => {
     console.log('Loading personalized recommendations');
     setLoadingRecommendations(true);
     try {
-      const allArtworks = await getAllArtworks();
-      const recommendations = await RecommendationEngine.generatePersonalizedRecommendations(
-        currentUser.id,
-        allArtworks,
-        6
-      );
+      const recommendations = await RecommendationEngine.generatePersonalizedRecommendations(6);
       
       if (recommendations.length === 0) {
         // Check if user has any orders to determine if they have no purchase history
@@ -37,6 +37,7 @@ export interface ArtworkData {
   description: string;
   price: number;
   imageUrl: string;
+  uploadId?: string; // From uploadImageResumable; replaces imageUrl
   dimensions?: string;
   medium?: string;
   year?: number;
@@ -397,11 +398,12 @@ export const authFetch = async (url: string, options: RequestInit = {}): Promise
     throw new Error('No authentication token found');
   }
   
-  // Ensure correct Authorization header format
-  const headers = {
+  // Ensure correct Authorization header format. Multipart bodies need the
+  // browser to set Content-Type so it includes the boundary.
+  const headers: Record<string, string> = {
     'Authorization': `Bearer ${token}`,
-    'Content-Type': 'application/json',
-    ...(options.headers || {}),
+    ...(options.body instanceof FormData ? {} : { 'Content-Type': 'application/json' }),
+    ...((options.headers as Record<string, string>) || {}),
   };
   
   try {
@@ -466,12 +468,79 @@ export const authFetch = async (url: string, options: RequestInit = {}): Promise
   }
 };
 
+// Send records with a new image as multipart/form-data, so the image goes
+// over the wire as binary instead of base64 inside JSON
+const toRequestBody = (data: object): BodyInit => {
+  const imageUrl = (data as { imageUrl?: string }).imageUrl;
+  if (!imageUrl || !imageUrl.startsWith('data:')) {
+    return JSON.stringify(data);
+  }
+
+  const [header, base64Data] = imageUrl.split(',', 2);
+  const mimeType = header.slice('data:'.length).split(';')[0] || 'application/octet-stream';
+  const binary = atob(base64Data);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+
+  const formData = new FormData();
+  Object.entries(data).forEach(([key, value]) => {
+    if (key !== 'imageUrl' && value !== undefined && value !== null) {
+      formData.append(key, String(value));
+    }
+  });
+  formData.append('image', new Blob([bytes], { type: mimeType }), 'image');
+  return formData;
+};
+
+// Upload a large image in chunks that survive dropped connections. After a
+// failed chunk the server is asked how much it has, and only the missing
+// bytes are sent again. Pass the returned uploadId to createArtwork or
+// updateArtwork in place of imageUrl.
+export const uploadImageResumable = async (
+  file: Blob,
+  onProgress?: (sent: number, total: number) => void,
+  maxRetries = 5
+): Promise<string> => {
+  const session = await authFetch('/uploads', {
+    method: 'POST',
+    body: JSON.stringify({ size: file.size, contentType: file.type }),
+  });
+  const uploadId: string = session.uploadId;
+  const chunkSize: number = session.chunkSize;
+  let offset: number = session.offset;
+  let retries = 0;
+
+  while (offset < file.size) {
+    try {
+      const result = await authFetch(`/uploads/${uploadId}`, {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/octet-stream', 'Upload-Offset': String(offset) },
+        body: file.slice(offset, offset + chunkSize),
+      });
+      offset = result.offset;
+      retries = 0;
+      onProgress?.(offset, file.size);
+    } catch (error) {
+      if (++retries > maxRetries) {
+        throw error;
+      }
+      const status = await authFetch(`/uploads/${uploadId}`);
+      offset = status.offset;
+    }
+  }
+
+  await authFetch(`/uploads/${uploadId}/complete`, { method: 'POST' });
+  return uploadId;
+};
+
 // Create a new artwork (admin or artist)
 export const createArtwork = async (artworkData: ArtworkData) => {
   console.log('Creating artwork with data:', artworkData);
   return await authFetch('/artworks', {
     method: 'POST',
-    body: JSON.stringify(artworkData),
+    body: toRequestBody(artworkData),
   });
 };
 
@@ -480,7 +549,7 @@ export const updateArtwork = async (id: string, artworkData: ArtworkData) => {
   console.log(`Updating artwork ${id} with data:`, artworkData);
   return await authFetch(`/artworks/${id}`, {
     method: 'PUT',
-    body: JSON.stringify(artworkData),
+    body: toRequestBody(artworkData),
   });
 };
 
@@ -497,7 +566,7 @@ export const createExhibition = async (exhibitionData: ExhibitionData) => {
   console.log('Creating exhibition with data:', exhibitionData);
   return await authFetch('/exhibitions', {
     method: 'POST',
-    body: JSON.stringify(exhibitionData),
+    body: toRequestBody(exhibitionData),
   });
 };
 
@@ -506,7 +575,7 @@ export const updateExhibition = async (id: string, exhibitionData: ExhibitionDat
   console.log(`Updating exhibition ${id} with data:`, exhibitionData);
   return await authFetch(`/exhibitions/${id}`, {
     method: 'PUT',
-    body: JSON.stringify(exhibitionData),
+    body: toRequestBody(exhibitionData),
   });
 };
 
@@ -547,6 +616,141 @@ export const getArtwork = async (id: string) => {
   }
 };
 
+// Search artworks by colour, e.g. ['#1e3a8a', 'gold']; best matches first
+export const searchArtworksByColor = async (colors: string[], limit = 24) => {
+  try {
+    const params = new URLSearchParams({ color: colors.join(','), limit: String(limit) });
+    const response = await fetch(`${API_URL}/artworks/search?${params}`);
+    if (!response.ok) {
+      throw new Error('Failed to search artworks by colour');
+    }
+    const data = await response.json();
+    return data.artworks || [];
+  } catch (error) {
+    console.error('Error searching artworks by colour:', error);
+    throw error;
+  }
+};
+
+// Recommended artworks: personalized from the signed-in user's orders, or the
+// most purchased ones (personalized: false) for guests and first-time buyers
+export const getRecommendations = async (k = 6) => {
+  try {
+    const token = getToken();
+    const response = await fetch(`${API_URL}/recommendations?k=${k}`, {
+      headers: token ? { 'Authorization': `Bearer ${token}` } : {},
+    });
+    if (!response.ok) {
+      throw new Error('Failed to fetch recommendations');
+    }
+    const data = await response.json();
+    return { artworks: data.artworks || [], personalized: !!data.personalized };
+  } catch (error) {
+    console.error('Error fetching recommendations:', error);
+    throw error;
+  }
+};
+
+// Available artworks most like the given one, best first
+export const getSimilarArtworks = async (id: string, k = 4) => {
+  try {
+    const response = await fetch(`${API_URL}/artworks/${id}/similar?k=${k}`);
+    if (!response.ok) {
+      throw new Error('Failed to fetch similar artworks');
+    }
+    const data = await response.json();
+    return data.artworks || [];
+  } catch (error) {
+    console.error('Error fetching similar artworks:', error);
+    throw error;
+  }
+};
+
+// Full-text search over artworks and exhibitions, best matches first.
+// type narrows the results to 'artwork' or 'exhibition'.
+export const searchCatalog = async (query: string, options: { type?: 'artwork' | 'exhibition'; limit?: number; page?: number } = {}) => {
+  try {
+    const params = new URLSearchParams({ q: query });
+    if (options.type) params.set('type', options.type);
+    if (options.limit) params.set('limit', String(options.limit));
+    if (options.page) params.set('page', String(options.page));
+    const response = await fetch(`${API_URL}/search?${params}`);
+    if (!response.ok) {
+      throw new Error('Failed to search the catalog');
+    }
+    return await response.json();
+  } catch (error) {
+    console.error('Error searching the catalog:', error);
+    throw error;
+  }
+};
+
+// Title, artist and medium suggestions for what has been typed so far
+export const getAutocompleteSuggestions = async (prefix: string, limit = 8) => {
+  try {
+    const params = new URLSearchParams({ prefix, limit: String(limit) });
+    const response = await fetch(`${API_URL}/autocomplete?${params}`);
+    if (!response.ok) {
+      throw new Error('Failed to fetch suggestions');
+    }
+    const data = await response.json();
+    return data.suggestions || [];
+  } catch (error) {
+    console.error('Error fetching suggestions:', error);
+    throw error;
+  }
+};
+
+// Artwork counts per filter value (medium, status, price, decade, artist)
+// for the selected filters, e.g. { medium: ['Oil'], status: ['available'] }
+export const getArtworkFacets = async (selected: Record<string, string[]> = {}) => {
+  try {
+    const params = new URLSearchParams();
+    Object.entries(selected).forEach(([facet, values]) => values.forEach(value => params.append(facet, value)));
+    const response = await fetch(`${API_URL}/artworks/facets?${params}`);
+    if (!response.ok) {
+      throw new Error('Failed to fetch artwork facets');
+    }
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching artwork facets:', error);
+    throw error;
+  }
+};
+
+// Exhibitions open on any day between two dates (YYYY-MM-DD), by start date
+export const getExhibitionCalendar = async (from?: string, to?: string) => {
+  try {
+    const params = new URLSearchParams();
+    if (from) params.set('from', from);
+    if (to) params.set('to', to);
+    const response = await fetch(`${API_URL}/exhibitions/calendar?${params}`);
+    if (!response.ok) {
+      throw new Error('Failed to fetch the exhibition calendar');
+    }
+    const data = await response.json();
+    return data.exhibitions || [];
+  } catch (error) {
+    console.error('Error fetching the exhibition calendar:', error);
+    throw error;
+  }
+};
+
+// Exhibitions open on a date (YYYY-MM-DD), today if omitted
+export const getExhibitionsOn = async (date?: string) => {
+  try {
+    const response = await fetch(`${API_URL}/exhibitions/on${date ? `?date=${date}` : ''}`);
+    if (!response.ok) {
+      throw new Error('Failed to fetch exhibitions for the date');
+    }
+    const data = await response.json();
+    return data.exhibitions || [];
+  } catch (error) {
+    console.error('Error fetching exhibitions for the date:', error);
+    throw error;
+  }
+};
+
 // Get all artist's artworks
 export const getArtistArtworks = async () => {
   try {
@@ -667,9 +871,30 @@ export const bookExhibition = async (bookingData: any) => {
   });
 };
 
-// Get all tickets (admin only)
-export const getAllTickets = async () => {
-  return await authFetch('/tickets');
+// Get one page of the ticket ledger (admin only)
+export interface TicketLedgerParams {
+  page?: number;
+  pageSize?: number;
+  exhibitionId?: string;
+  status?: 'active' | 'used' | 'cancelled';
+  from?: string;
+  to?: string;
+}
+
+export const getAllTickets = async (params: TicketLedgerParams = {}) => {
+  const query = new URLSearchParams();
+  Object.entries(params).forEach(([key, value]) => {
+    if (value !== undefined && value !== '') {
+      query.set(key, String(value));
+    }
+  });
+  const queryString = query.toString();
+  return await authFetch(`/tickets${queryString ? `?${queryString}` : ''}`);
+};
+
+// Get per-exhibition ticket occupancy counters (admin only)
+export const getTicketOccupancy = async () => {
+  return await authFetch('/tickets/occupancy');
 };
 
 // Get all orders (admin only)
@@ -7,6 +7,15 @@ export interface User {
   isAdmin: boolean;
 }
 
+// Resized WebP variants of an uploaded image, keyed by width
+export interface ImageVariants {
+  width: number;
+  height: number;
+  srcset: string;
+  variants: Record<string, string>;
+  placeholder: string; // Tiny blurred preview as a data URL
+}
+
 export interface Artwork {
   id: string;
   title: string;
@@ -15,6 +24,7 @@ export interface Artwork {
   price: number;
   imageUrl: string;
   image_url?: string; // Add optional image_url property for API compatibility
+  image_variants?: ImageVariants | null;
   dimensions?: string;
   medium?: string;
   year?: number;
@@ -30,6 +40,7 @@ export interface Exhibition {
   endDate: string;
   ticketPrice: number;
   imageUrl: string;
+  imageVariants?: ImageVariants | null;
   totalSlots: number;
   availableSlots: number;
   status: 'upcoming' | 'ongoing' | 'past';
@@ -2,6 +2,7 @@
 /**
  * Utility functions for processing and displaying images
  */
+import { ImageVariants } from '@/types';
 
 // Collection of default exhibition images to use randomly
 const defaultExhibitionImages = [
@@ -74,6 +75,33 @@ export const getValidImageUrl = (url: string | undefined): string => {
   return url;
 };
 
+// Build a srcSet of the server's resized variants, so the browser downloads
+// only the width it displays
+export const createImageSrcSet = (variants: ImageVariants | null | undefined): string | undefined => {
+  if (!variants || !variants.srcset) {
+    return undefined;
+  }
+  return variants.srcset
+    .split(', ')
+    .map((entry) => {
+      const [url, width] = entry.split(' ');
+      return `${getValidImageUrl(url)} ${width}`;
+    })
+    .join(', ');
+};
+
+// Blurred preview shown while the image loads
+export const createPlaceholderStyle = (variants: ImageVariants | null | undefined): React.CSSProperties | undefined => {
+  if (!variants || !variants.placeholder) {
+    return undefined;
+  }
+  return {
+    backgroundImage: `url(${variants.placeholder})`,
+    backgroundSize: 'cover',
+    backgroundPosition: 'center',
+  };
+};
+
 // Create a component-ready image URL with fallback
 export const createImageSrc = (url: string | undefined, defaultImage = "/static/placeholder.svg"): string => {
   try {
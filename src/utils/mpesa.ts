@@ -50,7 +50,9 @@ export const initiateSTKPush = async (
       orderId,
       userId,
       accountReference,
-      callbackUrl: CALLBACK_URL
+      callbackUrl: CALLBACK_URL,
+      // Acknowledge the order straight away; the STK Push is sent in the background
+      async: true
     };
     
     console.log('STK Push request body:', requestBody);
@@ -105,6 +107,36 @@ export const checkTransactionStatus = async (checkoutRequestId: string): Promise
   }
 };
 
+// Function to subscribe to the final status of a transaction.
+// The server pushes a single "status" event once the payment completes or fails,
+// so the payment page no longer needs to poll. Returns an unsubscribe function.
+export const subscribeToTransactionStatus = (
+  checkoutRequestId: string,
+  onStatus: (status: any) => void,
+  onError: (error: Error) => void
+): (() => void) => {
+  const source = new EventSource(`${API_URL}/mpesa/status/${checkoutRequestId}/stream`);
+  
+  source.addEventListener('status', (event) => {
+    source.close();
+    try {
+      const statusData = JSON.parse((event as MessageEvent).data);
+      console.log('Transaction status event:', statusData);
+      onStatus(statusData);
+    } catch (error) {
+      onError(error instanceof Error ? error : new Error('Invalid status event'));
+    }
+  });
+  
+  source.onerror = () => {
+    // Don't let EventSource reconnect; the stream ends after its single event
+    source.close();
+    onError(new Error('Lost connection while waiting for payment status'));
+  };
+  
+  return () => source.close();
+};
+
 // Function to finalize order after payment
 export const finalizeOrder = async (
   checkoutRequestId: string,